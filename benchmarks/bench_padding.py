@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Padding benchmark: the original `b'\\x00' * n` implementation against each mode of
+storage.pad_file_to_exact_size. Reports MB/s of padding written and peak Python
+heap use while padding (tracemalloc).
+
+    python benchmarks/bench_padding.py [--repeat 5] [--json results.json]
+"""
+import argparse, json, os, statistics, sys, tempfile, time, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from storage import pad_file_to_exact_size, padded_size, PADDING_MODES
+
+MB = 1024 * 1024
+
+# (label, starting size)
+CASES = [
+    ("1 KB -> 1 MB", 1024),
+    ("1.5 MB -> 2 MB", int(1.5 * MB)),
+    ("11 MB -> 15 MB", 11 * MB),
+    ("201 MB -> 205 MB", 201 * MB),
+]
+
+
+def legacy_pad(path: Path, target_bytes: int):
+    """
+    The implementation before padding modes existed.
+    """
+    current = path.stat().st_size
+    if current < target_bytes:
+        with open(path, "ab") as f:
+            f.write(b'\x00' * (target_bytes - current))
+
+
+def make_file(path: Path, size: int):
+    with open(path, "wb") as f:
+        chunk = os.urandom(MB)
+        remaining = size
+        while remaining > 0:
+            f.write(chunk[:min(MB, remaining)])
+            remaining -= MB
+
+
+def run_case(pad, path: Path, size: int, repeat: int) -> dict:
+    target = padded_size(size)
+    timings, peaks = [], []
+    for _ in range(repeat):
+        make_file(path, size)
+        os.sync()
+        tracemalloc.start()
+        start = time.perf_counter()
+        pad(path, target)
+        fd = os.open(path, os.O_RDONLY)
+        os.fsync(fd)
+        os.close(fd)
+        timings.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert path.stat().st_size == target
+    seconds = statistics.median(timings)
+    return {
+        "padding_bytes": target - size,
+        "seconds": seconds,
+        "mb_per_s": (target - size) / MB / seconds if seconds else float("inf"),
+        "peak_heap_bytes": max(peaks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    implementations = {"legacy": legacy_pad}
+    for mode in PADDING_MODES:
+        implementations[mode] = lambda p, t, mode=mode: pad_file_to_exact_size(p, t, mode=mode)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.ezra"
+        print(f"{'case':<18} {'impl':<10} {'MB/s':>10} {'peak heap':>12}")
+        for label, size in CASES:
+            for name, pad in implementations.items():
+                r = run_case(pad, path, size, args.repeat)
+                results.append({"case": label, "impl": name, **r})
+                print(f"{label:<18} {name:<10} {r['mb_per_s']:>10.1f} {r['peak_heap_bytes'] / 1024:>10.1f} KB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the server hot paths, with no server or network.
+
+Stages:
+    hash          poseidon_hash of a 31-byte secret
+    verify        verify_proof on the corpus proofs (needs real proofs and snarkjs)
+    disk_write    writing a container to the staging file, as /upload does
+    padding       pad_file_reasonably in the configured PADDING_MODE
+    encoding      base64 + JSON of a container, the /download JSON body
+    poseidon      POST /poseidon through the Flask test client
+    upload        POST /upload through the Flask test client
+    download      POST /download, JSON and binary responses
+    cleanup       ExpirySweeper.sweep_all over a batch of expired uploads
+
+Each stage runs in a fresh interpreter, so its peak RSS is its own. Reports ops/s, MB/s,
+p50/p99 latency and peak RSS per stage and container size. The database and uploads go
+to a temporary directory.
+
+    python benchmarks/bench_server.py --json bench.json
+    python benchmarks/bench_server.py --stage upload --stage download --sizes 1K,8M
+    python benchmarks/bench_server.py --json new.json --compare bench.json
+
+The corpus (secrets, file ids, proofs and containers) comes from a fixed seed and is
+written to --corpus, so runs on different commits measure the same input. The proofs are
+real Groth16 proofs if snarkjs and server/static/poseidon_preimage.zkey are available.
+Otherwise they are synthetic, the verify stage is skipped, and /download runs with
+verification stubbed out. The results record which was used.
+"""
+import argparse, base64, json, multiprocessing, os, platform, random, resource, shutil
+import statistics, subprocess, sys, tempfile, time
+from pathlib import Path
+from unittest.mock import patch
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server'))
+sys.path.insert(0, SERVER_DIR)
+
+STAGES = ("hash", "verify", "disk_write", "padding", "encoding", "poseidon", "upload", "download", "cleanup")
+# Stages measured once per container size
+SIZED_STAGES = {"disk_write", "padding", "encoding", "upload", "download"}
+DEFAULT_SIZES = "1K,64K,1M,8M"
+CLEANUP_BATCH = 100
+
+WASM_PATH = Path(SERVER_DIR) / "static" / "poseidon_preimage.wasm"
+ZKEY_PATH = Path(SERVER_DIR) / "static" / "poseidon_preimage.zkey"
+
+FAKE_PROOF = {
+    "pi_a": ["1", "2", "1"],
+    "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+    "pi_c": ["5", "6", "1"],
+    "protocol": "groth16",
+    "curve": "bn128"
+}
+
+PROVE_SCRIPT = """
+const snarkjs = require("snarkjs");
+const [wasm, zkey] = process.argv.slice(1);
+(async () => {
+    const inputs = JSON.parse(require("fs").readFileSync(0, "utf8"));
+    const out = [];
+    for (const input of inputs) {
+        const { proof, publicSignals } = await snarkjs.groth16.fullProve(input, wasm, zkey);
+        out.push({ proof, public: publicSignals });
+    }
+    process.stdout.write(JSON.stringify(out));
+    process.exit(0);
+})().catch(e => { console.error(e); process.exit(1); });
+"""
+
+
+def parse_size(text: str) -> int:
+    units = {"K": 1024, "M": 1024 * 1024}
+    text = text.strip().upper()
+    return int(text[:-1]) * units[text[-1]] if text[-1] in units else int(text)
+
+
+def size_label(size: int) -> str:
+    for unit, factor in (("M", 1024 * 1024), ("K", 1024)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+# Corpus
+
+def prove(secrets: list, file_ids: list):
+    """
+    Real proofs for (secret, file_id) pairs, or None if the toolchain is missing.
+    """
+    from zk_utils import node_env
+    if not (WASM_PATH.exists() and ZKEY_PATH.exists()):
+        return None
+    inputs = [{"x": str(s), "expected": f} for s, f in zip(secrets, file_ids)]
+    try:
+        result = subprocess.run(
+            ["node", "-e", PROVE_SCRIPT, str(WASM_PATH), str(ZKEY_PATH)],
+            input=json.dumps(inputs), capture_output=True, text=True, env=node_env(), timeout=600
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        print(f"[!] Proof generation failed, using synthetic proofs: {result.stderr.strip()[:200]}")
+        return None
+    return json.loads(result.stdout)
+
+
+def build_corpus(corpus_dir: Path, count: int, sizes: list, seed: int) -> dict:
+    """
+    Load the corpus from corpus_dir, generating whatever is missing.
+    """
+    from zk_utils import poseidon_hash
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    index_path = corpus_dir / "corpus.json"
+    corpus = None
+    if index_path.exists():
+        with open(index_path) as f:
+            corpus = json.load(f)
+        if corpus["seed"] != seed or len(corpus["entries"]) < count:
+            corpus = None
+
+    if corpus is None:
+        rng = random.Random(seed)
+        secrets = [int.from_bytes(rng.randbytes(31), "big") for _ in range(count)]
+        file_ids = [poseidon_hash(s) for s in secrets]
+        proofs = prove(secrets, file_ids)
+        corpus = {
+            "seed": seed,
+            "proofs": "real" if proofs else "synthetic",
+            "entries": [
+                {
+                    "secret_b64": base64.b64encode(s.to_bytes(31, "big")).decode(),
+                    "file_id": file_id,
+                    "proof": proofs[i]["proof"] if proofs else FAKE_PROOF,
+                    "public": proofs[i]["public"] if proofs else [file_id],
+                }
+                for i, (s, file_id) in enumerate(zip(secrets, file_ids))
+            ],
+        }
+        with open(index_path, "w") as f:
+            json.dump(corpus, f)
+
+    containers = {}
+    for size in sizes:
+        path = corpus_dir / f"container-{size_label(size)}.bin"
+        if not path.exists() or path.stat().st_size != size:
+            rng = random.Random(f"{seed}-{size}")
+            with open(path, "wb") as f:
+                f.write(rng.randbytes(size))
+        containers[size] = str(path)
+    corpus["containers"] = containers
+    corpus["entries"] = corpus["entries"][:count]
+    return corpus
+
+
+# Stages. Each takes the run context and returns [(seconds, bytes processed)], one per op.
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def read_container(ctx) -> bytes:
+    with open(ctx["container"], "rb") as f:
+        return f.read()
+
+
+def stage_hash(ctx):
+    from zk_utils import poseidon_hash
+    secrets = [int.from_bytes(base64.b64decode(e["secret_b64"]), "big") for e in ctx["entries"]]
+    return [(timed(poseidon_hash, s), 0) for s in secrets]
+
+
+def stage_verify(ctx):
+    from zk_utils import verify_proof, ZK_VERIFIER, get_verifier_pool
+    if ZK_VERIFIER == "worker":
+        get_verifier_pool().warm_up()
+    samples = []
+    for e in ctx["entries"]:
+        start = time.perf_counter()
+        assert verify_proof(e["proof"], e["public"]), "corpus proof failed to verify"
+        samples.append((time.perf_counter() - start, 0))
+    return samples
+
+
+def stage_disk_write(ctx):
+    data = read_container(ctx)
+    path = Path(ctx["workdir"]) / "staged.part"
+
+    def write():
+        with open(path, "wb") as f:
+            f.write(data)
+    samples = [(timed(write), len(data)) for _ in ctx["entries"]]
+    path.unlink()
+    return samples
+
+
+def stage_padding(ctx):
+    from storage import pad_file_reasonably
+    from app import PADDING_MODE
+    path = Path(ctx["workdir"]) / "padded.ezra"
+    samples = []
+    for _ in ctx["entries"]:
+        shutil.copyfile(ctx["container"], path)
+        start = time.perf_counter()
+        size = pad_file_reasonably(path, PADDING_MODE)
+        # MB/s counts the padding added, as in bench_padding.py
+        samples.append((time.perf_counter() - start, path.stat().st_size - size))
+    path.unlink()
+    return samples
+
+
+def stage_encoding(ctx):
+    data = read_container(ctx)
+    return [(timed(lambda: json.dumps({"ciphertext": base64.b64encode(data).decode()})), len(data))
+            for _ in ctx["entries"]]
+
+
+def isolate_paths(workdir: Path):
+    """
+    Point the upload directory and database at workdir. Must run before anything imports
+    app, metadata or sweeper, since they read these paths at import time.
+    """
+    import paths
+    paths.UPLOAD_DIR = workdir / "uploads"
+    paths.DB_DIR = workdir / "db"
+    paths.DB_PATH = paths.DB_DIR / "expirations.db"
+
+
+def bench_app(ctx):
+    from app import create_app
+    return create_app({"TESTING": True}).test_client()
+
+
+def upload_form(entry: dict, data: bytes, delete_after_download: bool = False) -> dict:
+    import io
+    return {
+        "file": (io.BytesIO(data), "blob.ezra"),
+        "secret": entry["secret_b64"],
+        "zk_proof": json.dumps(entry["proof"]),
+        "zk_public": json.dumps(entry["public"]),
+        "expire_hours": "1",
+        "delete_after_download": "true" if delete_after_download else "false",
+    }
+
+
+def stage_poseidon(ctx):
+    client = bench_app(ctx)
+    samples = []
+    for e in ctx["entries"]:
+        start = time.perf_counter()
+        response = client.post("/poseidon", json={"secret_b64": e["secret_b64"]})
+        samples.append((time.perf_counter() - start, 0))
+        assert response.status_code == 200, response.data
+    return samples
+
+
+def stage_upload(ctx):
+    client = bench_app(ctx)
+    data = read_container(ctx)
+    samples = []
+    for e in ctx["entries"]:
+        form = upload_form(e, data)
+        start = time.perf_counter()
+        response = client.post("/upload", data=form, content_type="multipart/form-data")
+        samples.append((time.perf_counter() - start, len(data)))
+        assert response.status_code == 200, response.data
+    return samples
+
+
+def stage_download(ctx):
+    from app import app_state
+    client = bench_app(ctx)
+    proof_cache = app_state(client.application).proof_cache
+    data = read_container(ctx)
+    for e in ctx["entries"]:
+        response = client.post("/upload", data=upload_form(e, data), content_type="multipart/form-data")
+        assert response.status_code == 200, response.data
+
+    samples = {"json": [], "binary": []}
+    for e in ctx["entries"]:
+        body = {"proof": e["proof"], "public": e["public"]}
+        for kind, accept in (("json", "application/json"), ("binary", "application/octet-stream")):
+            # Every request pays for verification; retries hitting the cache are a different workload
+            proof_cache.clear()
+            start = time.perf_counter()
+            response = client.post("/download", json=body, headers={"Accept": accept})
+            length = len(response.get_data())
+            samples[kind].append((time.perf_counter() - start, len(data)))
+            assert response.status_code == 200 and length >= len(data), response.status_code
+    return samples
+
+
+def stage_cleanup(ctx):
+    from app import app_state
+    from paths import upload_path, UPLOAD_DIR as upload_dir
+    from sweeper import ExpirySweeper
+    store = app_state(bench_app(ctx).application).store
+    sweeper = ExpirySweeper(store, upload_dir, batch_size=CLEANUP_BATCH)
+    samples = []
+    for round_ in range(max(1, len(ctx["entries"]) // 10)):
+        now = int(time.time())
+        for i in range(CLEANUP_BATCH):
+            file_id = f"bench-{round_}-{i}"
+            path = upload_path(file_id, upload_dir=upload_dir)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"\0" * 1024)
+            store.record_file(file_id, now - 1, False, 1024)
+        start = time.perf_counter()
+        removed = sweeper.sweep_all(now)
+        elapsed = time.perf_counter() - start
+        assert removed == CLEANUP_BATCH, removed
+        # One sample per file, so ops/s reads as files swept per second
+        samples.extend([(elapsed / removed, 0)] * removed)
+    return samples
+
+
+STAGE_FUNCS = {name: globals()[f"stage_{name}"] for name in STAGES}
+
+
+def summarize(samples: list) -> dict:
+    seconds = sorted(s for s, _ in samples)
+    total = sum(seconds)
+    nbytes = sum(b for _, b in samples)
+
+    def percentile(p):
+        return seconds[min(len(seconds) - 1, int(p * len(seconds)))] * 1000
+
+    return {
+        "ops": len(seconds),
+        "ops_per_s": len(seconds) / total if total else None,
+        "mb_per_s": nbytes / (1024 * 1024) / total if total and nbytes else None,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "mean_ms": statistics.mean(seconds) * 1000,
+    }
+
+
+def run_stage(name: str, ctx: dict, conn):
+    """
+    Child process entry point: run one stage and send back its summaries.
+    """
+    # The server's per-request log lines would be timed along with the work
+    sys.stdout = open(os.devnull, "w")
+    try:
+        isolate_paths(Path(ctx["workdir"]))
+        os.environ["SWEEPER_ENABLED"] = "0"
+        # Every request comes from one client, which the rate limits would throttle
+        os.environ["ADMISSION_ENABLED"] = "0"
+        if ctx["stub_verifier"]:
+            patch("zk_utils.verify_proof", return_value=True).start()
+            patch("app.verify_proof", return_value=True).start()
+        samples = STAGE_FUNCS[name](ctx)
+        groups = samples if isinstance(samples, dict) else {None: samples}
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux
+        conn.send([
+            {"variant": variant, **summarize(s), "peak_rss_kb": rss} for variant, s in groups.items()
+        ])
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_in_child(name: str, ctx: dict):
+    mp = multiprocessing.get_context("spawn")
+    parent, child = mp.Pipe(duplex=False)
+    proc = mp.Process(target=run_stage, args=(name, ctx, child))
+    proc.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {"error": f"stage process exited with code {proc.join() or proc.exitcode}"}
+    proc.join()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=SERVER_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def verifier_available() -> bool:
+    from zk_utils import verify_proof, ZKEngineError
+    try:
+        verify_proof(FAKE_PROOF, ["1"])
+        return True
+    except (ZKEngineError, OSError):
+        return False
+
+
+def result_key(r: dict) -> tuple:
+    return (r["stage"], r.get("size"), r.get("variant"))
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"]}
+    print(f"\nAgainst {baseline_path} (p50 and ops/s, new / old):")
+    for r in results:
+        old = baseline.get(result_key(r))
+        if old is None or not old.get("ops_per_s") or "skipped" in r:
+            continue
+        label = " ".join(str(k) for k in result_key(r) if k is not None)
+        print(f"  {label:<28} p50 {r['p50_ms'] / old['p50_ms']:>6.2f}x   ops/s {r['ops_per_s'] / old['ops_per_s']:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stage", choices=STAGES, action="append", help="default: all")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"container sizes (default {DEFAULT_SIZES})")
+    parser.add_argument("--iterations", type=int, default=30, help="ops per stage and size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--corpus", type=Path, help="corpus directory, kept between runs (default: temporary)")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Earlier --json results to compare against")
+    args = parser.parse_args()
+
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    stages = args.stage or STAGES
+
+    with tempfile.TemporaryDirectory(prefix="ezra-bench-") as tmp:
+        corpus = build_corpus(args.corpus or Path(tmp) / "corpus", args.iterations, sizes, args.seed)
+        real_proofs = corpus["proofs"] == "real"
+        verifier = real_proofs and verifier_available()
+        print(f"[BENCH] {len(corpus['entries'])} {corpus['proofs']} proofs, "
+              f"verifier {'available' if verifier else 'stubbed'}")
+
+        results = []
+        print(f"{'stage':<12} {'size':>5} {'variant':<7} {'ops/s':>10} {'MB/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'peak RSS':>10}")
+        for name in stages:
+            if name == "verify" and not verifier:
+                results.append({"stage": name, "skipped": "needs real proofs and snarkjs"})
+                print(f"{name:<12} skipped (needs real proofs and snarkjs)")
+                continue
+            for size in (sizes if name in SIZED_STAGES else [None]):
+                workdir = Path(tempfile.mkdtemp(dir=tmp))
+                ctx = {
+                    "entries": corpus["entries"],
+                    "container": corpus["containers"][size] if size else None,
+                    "workdir": str(workdir),
+                    "stub_verifier": not verifier,
+                }
+                summaries = run_in_child(name, ctx)
+                shutil.rmtree(workdir, ignore_errors=True)
+                if isinstance(summaries, dict):
+                    print(f"[!] {name}: {summaries['error']}")
+                    results.append({"stage": name, "size": size, **summaries})
+                    continue
+                for s in summaries:
+                    r = {"stage": name, **({"size": size} if size else {}), **s}
+                    if r["variant"] is None:
+                        del r["variant"]
+                    results.append(r)
+                    print(f"{name:<12} {size_label(size) if size else '-':>5} {s['variant'] or '-':<7} "
+                          f"{s['ops_per_s']:>10.1f} {s['mb_per_s'] or 0:>9.1f} {s['p50_ms']:>9.3f} "
+                          f"{s['p99_ms']:>9.3f} {s['peak_rss_kb'] / 1024:>7.1f} MB")
+
+    if args.json:
+        from zk_utils import ZK_VERIFIER
+        meta = {
+            "commit": git_commit(),
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "proofs": corpus["proofs"],
+            "verifier": ZK_VERIFIER if verifier else "stub",
+            "padding_mode": os.getenv("PADDING_MODE", "fallocate"),
+        }
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for a running EZRA server, or one it starts itself.
+
+Each client thread holds one keep-alive connection and sends requests back to back for
+--duration seconds. Reports requests/s and p50/p99 latency per scenario.
+
+    # Start gunicorn with 4 processes x 8 threads on a free port and load it
+    python benchmarks/load_test.py --spawn gunicorn --processes 4 --threads 8
+
+    # The asyncio server (async_app.py) under Hypercorn with 2 worker processes
+    python benchmarks/load_test.py --spawn hypercorn --processes 2
+
+    # The single-process Flask development server, for comparison
+    python benchmarks/load_test.py --spawn flask
+
+    # An already running server
+    python benchmarks/load_test.py --url http://127.0.0.1:5001
+
+Scenarios: page (GET /about), poseidon (POST /poseidon) and upload (POST /upload of a
+64 KB container). /download is not covered since it needs real proofs and snarkjs.
+Uploads made by the test are removed from the database and disk afterwards.
+"""
+import argparse, base64, http.client, json, os, signal, socket, statistics, subprocess, sys, threading, time
+from urllib.parse import urlsplit
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server'))
+sys.path.insert(0, SERVER_DIR)
+
+SCENARIOS = ("page", "poseidon", "upload")
+UPLOAD_SIZE = 64 * 1024
+UPLOAD_PREFIX = "loadtest-"
+BOUNDARY = "ezraloadtestboundary"
+
+FAKE_PROOF = {
+    "pi_a": ["1", "2", "1"],
+    "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+    "pi_c": ["5", "6", "1"],
+    "protocol": "groth16",
+    "curve": "bn128"
+}
+
+
+def multipart(fields: dict, file_bytes: bytes) -> bytes:
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="blob.ezra"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode() + file_bytes + b"\r\n"
+    )
+    parts.append(f"--{BOUNDARY}--\r\n".encode())
+    return b"".join(parts)
+
+
+def build_request(scenario: str, client: int, n: int):
+    """
+    (method, path, body, headers) for the n-th request of a client.
+    """
+    if scenario == "page":
+        return "GET", "/about", None, {}
+    if scenario == "poseidon":
+        body = json.dumps({"secret_b64": base64.b64encode(os.urandom(31)).decode()}).encode()
+        return "POST", "/poseidon", body, {"Content-Type": "application/json"}
+    file_id = f"{UPLOAD_PREFIX}{client}-{n}"
+    body = multipart({
+        "secret": base64.b64encode(os.urandom(32)).decode(),
+        "zk_proof": json.dumps(FAKE_PROOF),
+        "zk_public": json.dumps([file_id]),
+        "expire_hours": "1",
+        "delete_after_download": "false",
+    }, os.urandom(UPLOAD_SIZE))
+    return "POST", "/upload", body, {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+def client_loop(host, port, scenario, client, deadline, latencies, errors, uploaded):
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    n = 0
+    while time.perf_counter() < deadline:
+        method, path, body, headers = build_request(scenario, client, n)
+        n += 1
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            errors.append(response.status)
+        elif scenario == "upload":
+            uploaded.append(f"{UPLOAD_PREFIX}{client}-{n - 1}")
+    conn.close()
+
+
+def run_scenario(url: str, scenario: str, concurrency: int, duration: float) -> dict:
+    target = urlsplit(url)
+    latencies, errors, uploaded = [], [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client_loop, args=(target.hostname, target.port, scenario, i, deadline, latencies, errors, uploaded))
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else None
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "req_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else None,
+        "uploaded": uploaded,
+    }
+
+
+def remove_uploads(file_ids: list):
+    from metadata import store
+    from paths import upload_file_paths
+    for file_id in file_ids:
+        for path in upload_file_paths(file_id):
+            path.unlink(missing_ok=True)
+    store.delete_files(file_ids)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(kind: str, processes: int, threads: int):
+    port = free_port()
+    env = {**os.environ, "EZRA_BIND": f"127.0.0.1:{port}", "EZRA_PROCESSES": str(processes),
+           "EZRA_THREADS": str(threads), "STATS_ENABLED": "0"}
+    if kind == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"]
+    elif kind == "hypercorn":
+        command = [sys.executable, "-m", "hypercorn", "--bind", f"127.0.0.1:{port}",
+                   "--workers", str(processes), "async_app:app"]
+    else:
+        command = [sys.executable, "-c", f"from wsgi import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    proc = subprocess.Popen(command, cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return proc, url
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Load an already running server")
+    parser.add_argument("--spawn", choices=("gunicorn", "hypercorn", "flask"), default="gunicorn")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=32, help="client threads")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="default: all")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    proc = None
+    url = args.url
+    if url is None:
+        proc, url = spawn_server(args.spawn, args.processes, args.threads)
+
+    results = []
+    try:
+        print(f"{'scenario':<10} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for scenario in args.scenario or SCENARIOS:
+            r = run_scenario(url, scenario, args.concurrency, args.duration)
+            remove_uploads(r.pop("uploaded"))
+            results.append(r)
+            print(f"{scenario:<10} {r['concurrency']:>7} {r['req_per_s']:>9.1f} "
+                  f"{r['p50_ms'] or 0:>8.1f} {r['p99_ms'] or 0:>8.1f} {r['errors']:>7}")
+    finally:
+        if proc is not None:
+            # SIGTERM lets gunicorn drain in-flight requests
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=180)
+
+    if args.json:
+        server = {"url": url} if args.url else {"server": args.spawn, "processes": args.processes, "threads": args.threads}
+        with open(args.json, "w") as f:
+            json.dump({"server": server, "cpus": os.cpu_count(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -47,4 +47,10 @@ mkdir -p artifacts
 cp "$BUILD_DIR/verification_key.json" artifacts/
 cp "$BUILD_DIR/poseidon_preimage.zkey" artifacts/
 
+echo "Writing the browser's Poseidon constants to server/static/poseidon_constants.js"
+python3 server/poseidon.py
+
+echo "Writing content-hashed artifact copies to server/static/zk/"
+python3 server/zk_assets.py --prune
+
 echo "Build complete and distributed to server/"
\ No newline at end of file
@@ -0,0 +1,196 @@
+# Admission control for the expensive endpoints
+#
+# /poseidon, /poseidon/batch, /download and /verify/batch end in the hashing or
+# verification engines, and a burst of them used to queue without limit. Two layers shed
+# the excess early and cheaply, before it reaches an engine:
+#
+#   Token buckets: one per client (keyed on a salted hash of its address) and one shared.
+#     A request spends a token from each. An empty client bucket answers 429, an empty global
+#     bucket 503. Both carry a Retry-After of when the next token arrives.
+#   Engine gates: each engine runs at most `concurrency` calls at once (the verifier pool's
+#     size), with at most `queue_size` more waiting up to ADMISSION_QUEUE_TIMEOUT seconds
+#     for a slot. Past that a request gets 503 with a Retry-After estimated from the recent
+#     service time.
+#
+# Limits are per process: with EZRA_PROCESSES workers, the totals are that many times higher.
+# Client state is an LRU of at most MAX_TRACKED_CLIENTS buckets and never leaves memory.
+
+import hashlib
+import math
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") != "0"
+# Requests per second and burst size; a rate of 0 disables that bucket
+ADMISSION_CLIENT_RATE = float(os.getenv("ADMISSION_CLIENT_RATE", 10))
+ADMISSION_CLIENT_BURST = float(os.getenv("ADMISSION_CLIENT_BURST", 30))
+ADMISSION_GLOBAL_RATE = float(os.getenv("ADMISSION_GLOBAL_RATE", 100))
+ADMISSION_GLOBAL_BURST = float(os.getenv("ADMISSION_GLOBAL_BURST", 200))
+# Calls allowed to wait for each engine, and for how long
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 16))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
+# Header carrying the client address when behind a reverse proxy (e.g. X-Forwarded-For);
+# empty uses the connection's address. Only set it if the proxy overwrites the header.
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "")
+
+MAX_TRACKED_CLIENTS = 10000
+# Routes that spend tokens
+LIMITED_ROUTES = frozenset({"/poseidon", "/poseidon/batch", "/download", "/verify/batch"})
+
+
+class Overloaded(Exception):
+    """
+    A request refused by admission control. `status` is 429 or 503, `reason` a metric label.
+    """
+    def __init__(self, status: int, reason: str, retry_after: float, message: str):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.message = message
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = now
+
+    def take(self, now: float, cost: float = 1.0) -> float:
+        """
+        Spend `cost` tokens. Returns 0 on success, else the seconds until they're available.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def refund(self, cost: float = 1.0):
+        self.tokens = min(self.burst, self.tokens + cost)
+
+
+class RateLimiter:
+    def __init__(self, client_rate: float = ADMISSION_CLIENT_RATE, client_burst: float = ADMISSION_CLIENT_BURST,
+                 global_rate: float = ADMISSION_GLOBAL_RATE, global_burst: float = ADMISSION_GLOBAL_BURST,
+                 max_clients: int = MAX_TRACKED_CLIENTS, clock=time.monotonic):
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max(1, max_clients)
+        self.clock = clock
+        self._global = TokenBucket(global_rate, global_burst, clock()) if global_rate > 0 else None
+        self._clients = OrderedDict()  # client key -> TokenBucket, least recently seen first
+        self._lock = threading.Lock()
+        # Keys are hashed so raw addresses are never kept, salted so they can't be reversed
+        self._salt = secrets.token_bytes(16)
+
+    def client_key(self, address: str) -> bytes:
+        return hashlib.blake2b((address or "").encode(), key=self._salt, digest_size=8).digest()
+
+    def check(self, address: str):
+        """
+        Spend a token for a request from `address`. Raises Overloaded if either bucket is empty.
+        """
+        key = self.client_key(address) if self.client_rate > 0 else None
+        with self._lock:
+            now = self.clock()
+            bucket = None
+            if key is not None:
+                bucket = self._clients.get(key)
+                if bucket is None:
+                    bucket = self._clients[key] = TokenBucket(self.client_rate, self.client_burst, now)
+                    if len(self._clients) > self.max_clients:
+                        self._clients.popitem(last=False)
+                else:
+                    self._clients.move_to_end(key)
+                wait = bucket.take(now)
+                if wait:
+                    raise Overloaded(429, "client_rate", wait, "Too many requests, slow down")
+            if self._global is not None:
+                wait = self._global.take(now)
+                if wait:
+                    if bucket is not None:
+                        bucket.refund()  # the client wasn't served, so it keeps its token
+                    raise Overloaded(503, "global_rate", wait, "Server busy, try again shortly")
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            if self._global is not None:
+                self._global.tokens = self._global.burst
+
+
+class EngineGate:
+    """
+    At most `concurrency` calls inside an engine and `queue_size` waiting for it.
+    """
+    def __init__(self, name: str, concurrency: int, queue_size: int = ADMISSION_QUEUE_SIZE,
+                 timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.capacity = self.concurrency + max(0, queue_size)
+        self.timeout = timeout
+        self.admitted = 0  # inside the engine or waiting for it
+        self.avg_seconds = 0.0  # moving average of the time spent inside the engine
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+
+    def queue_depth(self) -> int:
+        return max(0, self.admitted - self.concurrency)
+
+    def saturated(self) -> bool:
+        return self.admitted >= self.capacity
+
+    def retry_after(self) -> float:
+        """
+        Seconds for the calls ahead to drain, going by the recent service time.
+        """
+        return self.avg_seconds * (self.queue_depth() + 1) / self.concurrency
+
+    @contextmanager
+    def admit(self, enabled: bool = True):
+        """
+        Hold one of the engine's slots for the duration of the block. Raises Overloaded
+        if the queue is full or no slot frees up within `timeout`. With `enabled` false (the
+        app's ADMISSION_ENABLED) the call is still counted but never refused or held back.
+        """
+        with self._lock:
+            if enabled and self.admitted >= self.capacity:
+                raise Overloaded(503, "queue_full", self.retry_after(), "Server busy, try again shortly")
+            self.admitted += 1
+        try:
+            if not enabled:
+                yield
+                return
+            if not self._slots.acquire(timeout=self.timeout):
+                raise Overloaded(503, "queue_timeout", self.retry_after(), "Server busy, try again shortly")
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - start
+                self._slots.release()
+                with self._lock:
+                    self.avg_seconds = elapsed if not self.avg_seconds else 0.8 * self.avg_seconds + 0.2 * elapsed
+        finally:
+            with self._lock:
+                self.admitted -= 1
+
+
+def client_address(remote_addr: str, headers) -> str:
+    """
+    The address a request is rate-limited under.
+    """
+    if ADMISSION_CLIENT_HEADER:
+        forwarded = headers.get(ADMISSION_CLIENT_HEADER)
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return remote_addr or ""
@@ -1,276 +1,984 @@
-from flask import Flask, render_template, request, jsonify, after_this_request
-from storage import timestomp, pad_file_reasonably
-from zk_utils import poseidon_hash
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify
 from dotenv import load_dotenv
+
+# Load .env before the local modules below read their settings at import
+load_dotenv()
+
+from storage import (timestomp, pad_file_reasonably, iter_file_chunks, validate_container, container_length,
+                     ContainerError)
+from zk_utils import (poseidon_hash, poseidon_hash_batch, verify_proof, verify_proof_batch,
+                      ProofCache, proof_digest, preload_verifier, get_verifier_pool, close_verifier_pool,
+                      ZK_VERIFIER, ZK_VERIFIER_WORKERS, ZKEngineError)
 from pathlib import Path
-import os, subprocess, base64, json, time, threading, glob, sqlite3, re, datetime
-from paths import UPLOAD_DIR, DB_DIR, ensure_directories
+import os, base64, json, time, re, datetime, secrets, fcntl, weakref
+from paths import (UPLOAD_DIR, DB_DIR, DB_PATH, ensure_directories, staging_file_path,
+                   upload_path, find_upload_file, upload_file_paths, ZK_ASSET_MANIFEST)
+from metadata import MetadataStore
+from packstore import PackStore, PACK_STORE_ENABLED
+from pages import PageCache
+import zk_assets
+from sweeper import ExpirySweeper, SWEEPER_ENABLED
+from admission import RateLimiter, EngineGate, Overloaded, client_address, ADMISSION_ENABLED, LIMITED_ROUTES
+from telemetry import (log, stage, render as render_metrics, snapshot_writer, Gauge, METRICS_ENABLED,
+                       REQUEST_SECONDS, REQUESTS_SHED, UPLOADS, BYTES_STORED, DOWNLOADS)
 
 
-load_dotenv()
 ensure_directories()
 MAX_CONTENT_LENGTH_MB = int(os.getenv("MAX_CONTENT_LENGTH_MB", 275))
 MAX_FILE_COUNT = int(os.getenv("MAX_FILE_COUNT", 5))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 64))
+# Chunked uploads are only bounded by MAX_UPLOAD_SIZE_MB, each request by MAX_CONTENT_LENGTH_MB
+MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", MAX_CONTENT_LENGTH_MB))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE_MB", 8)) * 1024 * 1024
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", 24))
+UPLOAD_READ_SIZE = 64 * 1024
+PADDING_MODE = os.getenv("PADDING_MODE", "fallocate")
+# The browser hashes secrets itself (static/poseidon.js); /poseidon and /poseidon/batch
+# remain for older clients and scripts, and can be turned off
+POSEIDON_ENDPOINT_ENABLED = os.getenv("POSEIDON_ENDPOINT_ENABLED", "1") != "0"
+# Internal counters at /stats; off by default since they reveal traffic levels
+STATS_ENABLED = os.getenv("STATS_ENABLED", "0") == "1"
+# Grace period before a delete-on-download file is removed, so the response can finish
+DOWNLOAD_DELETE_DELAY = int(os.getenv("DOWNLOAD_DELETE_DELAY", 120))
 
 ARTIFACTS_PATH = input_file = os.path.abspath(os.path.join(os.path.dirname( __file__ ), "..", "artifacts"))
 
-# Ensure the uploads directory exists
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(DB_DIR, exist_ok=True)
-
-# App config
-app = Flask(__name__)
-app.config['UPLOAD_DIR'] = UPLOAD_DIR
-app.config['DB_DIR'] = DB_DIR
-app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH_MB * 1000 * 1000 # e.g. 275MB .ezra container size limit
-app.config['MAX_FILE_COUNT'] = MAX_FILE_COUNT
 
-
-@app.errorhandler(413)
-def handle_413(e):
-    print(f"[!] Payload too large: {e}")
-
-    return "Payload too large. Please ensure your encrypted upload is under {} MB.".format(
-        app.config['MAX_CONTENT_LENGTH'] // 1000000
-    ), 413
+class AppState:
+    """
+    What an app keeps between requests, built by create_app() from its config: the metadata
+    store, the pack store, the expiry sweeper and the proof cache. Helpers find it with
+    app_state(), so two apps with different settings never share any of it.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.store = MetadataStore(config["DB_PATH"])
+        # Results of recent /download proof checks, so retries skip the pairing
+        self.proof_cache = ProofCache()
+        # Fixed-size slots for uploads in the smallest padding bucket; see packstore.py
+        self.packs = PackStore(self.store, config["UPLOAD_DIR"], padding_mode=config["PADDING_MODE"])
+        # Deletes expired uploads in the background; see start_background_tasks()
+        self.sweeper = ExpirySweeper(self.store, config["UPLOAD_DIR"],
+                                     session_ttl=config["UPLOAD_SESSION_TTL_HOURS"] * 3600,
+                                     on_delete=self.proof_cache.evict_files, packs=self.packs)
+
+
+def app_state(app=None) -> AppState:
+    """
+    The AppState of `app`, by default of the app handling the current request.
+    """
+    return (current_app if app is None else app).extensions["ezra"]
 
 
+# Every AppState in this process, for the gauges below. A server builds exactly one.
+_states = weakref.WeakSet()
 
 
-def get_expiration(file_id: str):
-    db_path = app.config['DB_DIR'] / "expirations.db"
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT delete_on_download FROM expirations WHERE file_id = ?", (file_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return bool(row[0]) if row else False
+def _total(read):
+    return sum(read(state) for state in list(_states))
 
-# HTML pages to be served
 
-@app.route("/", methods=["GET"])
-def index():
-    return render_template("index.html")
+# Admission control for the hashing and verification routes; see admission.py. The engines
+# are shared by the whole process, so the limits are too.
+limiter = RateLimiter()
+# As many verifications at once as there are verifiers (or snarkjs processes, with the cli backend)
+verify_gate = EngineGate("verify", ZK_VERIFIER_WORKERS)
+# Hashing is pure Python and holds the GIL, so running two at once only interleaves them
+hash_gate = EngineGate("hash", 1)
 
-@app.route("/about")
-def about():
-    return render_template("about.html")
+Gauge("ezra_proof_cache_entries", "Verification results held in the proof cache",
+      lambda: _total(lambda state: state.proof_cache.stats()["size"]))
+# Summed across workers, so hits and misses rather than a ratio
+Gauge("ezra_proof_cache_hits", "Proof cache hits since this worker started",
+      lambda: _total(lambda state: state.proof_cache.stats()["hits"]))
+Gauge("ezra_proof_cache_misses", "Proof cache misses since this worker started",
+      lambda: _total(lambda state: state.proof_cache.stats()["misses"]))
+Gauge("ezra_pack_slots_used", "Pack slots holding an upload", lambda: _total(lambda state: state.packs.stats()["slots_used"]))
+Gauge("ezra_pack_slots", "Pack slots in all pack files", lambda: _total(lambda state: state.packs.stats()["slots"]))
+Gauge("ezra_verify_queue_depth", "Proof verifications waiting for a verifier", verify_gate.queue_depth)
+Gauge("ezra_hash_queue_depth", "Poseidon batches waiting to be hashed", hash_gate.queue_depth)
 
-@app.route("/terms")
-def terms():
-    return render_template("terms.html")
+CANARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static/canary/canary.txt.asc")
+CANARY_DATE_RE = re.compile(r"Last Updated:\s*([A-Za-z]+\s+\d{1,2},\s+\d{4})")
 
-@app.route("/privacy")
-def privacy():
-    return render_template("privacy.html")
 
-@app.route("/dmca")
-def dmca():
-    return render_template("dmca.html")
-
-@app.route("/canary")
-def canary():
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    canary_path = os.path.join(base_dir, "static/canary/canary.txt.asc")
-    with open(canary_path, "r") as f:
+def canary_context() -> dict:
+    with open(CANARY_PATH, "r") as f:
         canary_content = f.read()
-    
+
     # Extract the "Last updated" date using regex
-    match = re.search(r"Last Updated:\s*([A-Za-z]+\s+\d{1,2},\s+\d{4})", canary_content)
+    match = CANARY_DATE_RE.search(canary_content)
     if match:
         last_updated = match.group(1).strip()
     else:
         last_updated = "Unknown"  # Fallback if parsing fails
-    
-    return render_template(
-        "canary.html",
+
+    return dict(
         date=last_updated,
         fingerprint="BB9A 9EEA 1443 59DE BB57  9867 8A32 EDA8 0D50 2239",
         public_key_url="/static/canary/ezra_public_key.asc",
         signed_canary_url="/static/canary/canary.txt.asc",
         signature_block=canary_content,
-        year=str(datetime.datetime.now(datetime.timezone.utc).year)
+        year=current_year()
     )
 
 
+def current_year() -> str:
+    return str(datetime.datetime.now(datetime.timezone.utc).year)
+
+
+# Rendered once and re-rendered only when a template or the canary file changes
+pages = PageCache()
+for template in ("about.html", "terms.html", "privacy.html", "dmca.html"):
+    pages.register(template)
+# The index page embeds the hashed artifact URLs, so a rebuilt manifest re-renders it
+pages.register("index.html", sources=[ZK_ASSET_MANIFEST],
+               context=lambda: {"zk_assets": zk_assets.asset_urls(), "zk_asset_hashes": zk_assets.asset_hashes()})
+pages.register("canary.html", context=canary_context, sources=[CANARY_PATH], key=current_year)
+
+routes = Blueprint("ezra", __name__)
+
+
+def create_app(config: dict = None) -> Flask:
+    """
+    Build the Flask app. `config` overrides the settings read from the environment. The
+    app's store, packs, sweeper and proof cache are built from the result; see AppState.
+    """
+    app = Flask(__name__)
+    app.config['UPLOAD_DIR'] = UPLOAD_DIR
+    app.config['DB_DIR'] = DB_DIR
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH_MB * 1000 * 1000 # e.g. 275MB .ezra container size limit
+    app.config['MAX_FILE_COUNT'] = MAX_FILE_COUNT
+    app.config['MAX_BATCH_SIZE'] = MAX_BATCH_SIZE
+    app.config['MAX_UPLOAD_SIZE'] = MAX_UPLOAD_SIZE_MB * 1000 * 1000
+    app.config['UPLOAD_CHUNK_SIZE'] = UPLOAD_CHUNK_SIZE
+    app.config['UPLOAD_SESSION_TTL_HOURS'] = UPLOAD_SESSION_TTL_HOURS
+    app.config['PADDING_MODE'] = PADDING_MODE
+    app.config['PACK_STORE_ENABLED'] = PACK_STORE_ENABLED
+    app.config['DOWNLOAD_DELETE_DELAY'] = DOWNLOAD_DELETE_DELAY
+    app.config['STATS_ENABLED'] = STATS_ENABLED
+    app.config['POSEIDON_ENDPOINT_ENABLED'] = POSEIDON_ENDPOINT_ENABLED
+    app.config['METRICS_ENABLED'] = METRICS_ENABLED
+    app.config['ADMISSION_ENABLED'] = ADMISSION_ENABLED
+    if config:
+        app.config.update(config)
+    # The database lives in DB_DIR unless its path is given outright
+    app.config.setdefault('DB_PATH', Path(app.config['DB_DIR']) / DB_PATH.name)
+
+    # Ensure the uploads directory exists
+    os.makedirs(app.config['UPLOAD_DIR'], exist_ok=True)
+    os.makedirs(app.config['DB_DIR'], exist_ok=True)
+    state = AppState(app.config)
+    state.store.init_schema()
+    app.extensions["ezra"] = state
+    _states.add(state)
+
+    app.register_blueprint(routes)
+
+    # Render the pages up front so the first visitors don't pay for Jinja
+    with app.test_request_context("/"):
+        pages.warm()
+    return app
+
+
+def preload():
+    """
+    Work that can be shared by forked workers: parse the verification key and the Poseidon
+    constants once in the parent. Run before forking (gunicorn's preload_app does this).
+    """
+    preload_verifier()
+
+
+def start_background_tasks(app: Flask):
+    """
+    Per-process services. Threads and Node workers don't survive fork(), so each worker
+    process starts its own after forking: `app`'s expiry sweeper, and a warm verifier pool
+    so the first download doesn't pay for starting Node.
+    """
+    if SWEEPER_ENABLED:
+        app_state(app).sweeper.start()
+    snapshot_writer.start()
+    if ZK_VERIFIER == "worker":
+        try:
+            get_verifier_pool().warm_up()
+        except ZKEngineError as e:
+            # Not fatal; the pool retries on the first verification
+            log("!", f"Could not warm up the verifier pool: {e}")
+
+
+def stop_background_tasks(app: Flask):
+    """
+    Stop this process's services once it has finished serving requests.
+    """
+    state = app_state(app)
+    state.sweeper.stop()
+    snapshot_writer.stop()
+    close_verifier_pool()
+    state.store.close_all()
+
+
+@routes.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+def shed_response(e: Overloaded, route: str):
+    REQUESTS_SHED.labels(route=route, reason=e.reason).inc()
+    return e.message, e.status, {"Retry-After": str(e.retry_after)}
+
+
+def check_rate_limit(path: str, remote_addr: str, headers, config):
+    """
+    Spend a token for a request to one of the LIMITED_ROUTES.
+    Returns None if it may go ahead, else the 429/503 response.
+    """
+    if not config['ADMISSION_ENABLED'] or path not in LIMITED_ROUTES:
+        return None
+    try:
+        limiter.check(client_address(remote_addr, headers))
+    except Overloaded as e:
+        return shed_response(e, path)
+    return None
+
+
+@routes.before_app_request
+def apply_rate_limit():
+    return check_rate_limit(request.path, request.remote_addr, request.headers, current_app.config)
+
+
+@routes.after_app_request
+def observe_request(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.labels(route=route, status=response.status_code).observe(time.perf_counter() - start)
+    return response
+
+
+@routes.app_errorhandler(413)
+def handle_413(e):
+    log("!", f"Payload too large: {e}")
+
+    return "Payload too large. Please ensure your encrypted upload is under {} MB.".format(
+        current_app.config['MAX_CONTENT_LENGTH'] // 1000000
+    ), 413
+
+
+# HTML pages to be served
+
+@routes.route("/", methods=["GET"])
+def index():
+    return pages.serve("index.html")
+
+@routes.route("/about")
+def about():
+    return pages.serve("about.html")
+
+@routes.route("/terms")
+def terms():
+    return pages.serve("terms.html")
+
+@routes.route("/privacy")
+def privacy():
+    return pages.serve("privacy.html")
+
+@routes.route("/dmca")
+def dmca():
+    return pages.serve("dmca.html")
+
+@routes.route("/canary")
+def canary():
+    return pages.serve("canary.html")
+
+@routes.route("/zk/<filename>", methods=["GET"])
+def zk_asset(filename):
+    return zk_assets.serve_asset(filename)
+
+
 # Core EZRA logic
 
-@app.route("/upload", methods=["POST"])
-def upload():
-    if "file" not in request.files:
-        return "No file provided", 400
+# file_ids are Poseidon hashes, decimal field elements of at most 77 digits. They end up in
+# file names, so anything else is refused before a path is built from it.
+FILE_ID_RE = re.compile(r"[0-9]{1,78}")
 
-    files = request.files.getlist("file")
-    if not files or all(f.filename == "" for f in files):
-        return "No valid files selected", 400
 
-    if len(files) > MAX_FILE_COUNT:
-        return f"Too many files. Maximum allowed is {MAX_FILE_COUNT}.", 400
+def is_file_id(value) -> bool:
+    return isinstance(value, str) and FILE_ID_RE.fullmatch(value) is not None
 
+
+def parse_upload_metadata(form):
+    """
+    Validate the secret, ZK proof and expiry fields shared by /upload and chunked finalize.
+    Returns (metadata, None) on success or (None, (message, status)) on failure.
+    """
     # Accept secret for hashing reference only (optional since proof is client-side)
-    secret_b64 = request.form.get("secret")
+    secret_b64 = form.get("secret")
     if not secret_b64:
-        return "Missing secret", 400
+        return None, ("Missing secret", 400)
 
     try:
         base64.b64decode(secret_b64)
     except Exception:
-        return "Invalid base64 secret", 400
+        return None, ("Invalid base64 secret", 400)
 
     # Get proof and public input from client
-    proof_json = request.form.get("zk_proof")
-    public_json = request.form.get("zk_public")
+    proof_json = form.get("zk_proof")
+    public_json = form.get("zk_public")
     if not proof_json or not public_json:
-        return "Missing ZK proof or public input", 400
+        return None, ("Missing ZK proof or public input", 400)
 
     try:
         proof = json.loads(proof_json)
         public = json.loads(public_json)
     except Exception:
-        return "Invalid proof or public format", 400
+        return None, ("Invalid proof or public format", 400)
+    if not isinstance(public, list) or not public or not is_file_id(public[0]):
+        return None, ("Invalid proof or public format", 400)
 
-    # Use first public input (Poseidon(secret)) as the file_id
-    file_id = public[0]
+    # Handle expiration policy
+    expire_hours = int(form.get("expire_hours", 24))
+    actual_expire = expire_hours if expire_hours > 0 else 24
 
-    # Save encrypted file
-    f = files[0]
-    ezra_path = os.path.join(app.config["UPLOAD_DIR"], f"{file_id}.ezra")
-    f.save(ezra_path)
+    return {
+        # Use first public input (Poseidon(secret)) as the file_id
+        "file_id": public[0],
+        "proof": proof,
+        "public": public,
+        "expire_hours": actual_expire,
+        "delete_after_download": form.get("delete_after_download") == "true",
+    }, None
 
-    # Save ZK proof and public signals
-    ezrp_proof_path = os.path.join(app.config["UPLOAD_DIR"], f"{file_id}.proof.json")
-    ezrp_public_path = os.path.join(app.config["UPLOAD_DIR"], f"{file_id}.public.json")
-    with open(ezrp_proof_path, "w") as pf:
-        json.dump(proof, pf)
-    with open(ezrp_public_path, "w") as pubf:
-        json.dump(public, pubf)
 
-    # Handle expiration policy
+def store_upload(staged_path: Path, meta: dict, state: AppState = None) -> str:
+    """
+    Move a fully received .ezra container into place: pad it and record its expiry, length
+    and ZK proof in one row. The row is only committed once the padded file sits at its
+    final path, so a failure part-way never leaves a half-stored upload behind.
+    With the pack store enabled, a container of the smallest size bucket is written to a
+    pack slot instead of its own file.
+    `state` defaults to the current Flask app's; the async server passes its own.
+    """
+    state = app_state() if state is None else state
+    config, store, packs = state.config, state.store, state.packs
+    file_id = meta["file_id"]
+    upload_dir = config["UPLOAD_DIR"]
+    expires_at = int(time.time()) + meta["expire_hours"] * 3600
+
+    size = staged_path.stat().st_size
+    if config["PACK_STORE_ENABLED"] and packs.fits(size):
+        with stage("upload", "record"), store.transaction():
+            store.record_file(
+                file_id, expires_at, meta["delete_after_download"], size,
+                proof=meta["proof"], public=meta["public"]
+            )
+            packs.put(file_id, staged_path)
+            # A file from an earlier upload of the same id is stale now
+            for path in upload_file_paths(file_id, upload_dir):
+                path.unlink(missing_ok=True)
+        ciphertext_length = size
+    else:
+        ezra_path = upload_path(file_id, "ezra", upload_dir)
+        ezra_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Record the real length so downloads never have to guess where the padding starts
+        with stage("upload", "pad"):
+            ciphertext_length = pad_file_reasonably(staged_path, mode=config['PADDING_MODE'])
+
+        with stage("upload", "record"), store.transaction():
+            store.record_file(
+                file_id, expires_at, meta["delete_after_download"], ciphertext_length,
+                proof=meta["proof"], public=meta["public"]
+            )
+            os.replace(staged_path, ezra_path)
+            # A flat-layout copy from before the migration, or a pack slot from an earlier
+            # upload of the same id, would otherwise shadow the new upload
+            for path in upload_file_paths(file_id, upload_dir):
+                if path != ezra_path:
+                    path.unlink(missing_ok=True)
+            packs.release([file_id])
+        timestomp([ezra_path])
+    state.sweeper.schedule(file_id, expires_at)
+
+    UPLOADS.inc()
+    BYTES_STORED.inc(ciphertext_length)
+
+    log("UPLOAD", f"Stored file with ID: {file_id}", file_id=file_id, bytes=ciphertext_length)
+    return file_id
+
+
+def check_container(staged_path: Path):
+    """
+    Refuse a version 2 container whose header is malformed or doesn't match its size.
+    Returns None if it may be stored, else (message, status).
+    """
+    try:
+        validate_container(staged_path)
+    except ContainerError as e:
+        return f"Invalid .ezra container: {e}", 400
+    return None
 
-    expire_hours = int(request.form.get("expire_hours", 24))
-    actual_expire = expire_hours if expire_hours > 0 else 24
-    delete_after_download = request.form.get("delete_after_download") == "true"
-    
 
-    with sqlite3.connect(DB_DIR / "expirations.db") as db:
-        db.execute(
-            "INSERT OR REPLACE INTO expirations (file_id, expires_at, delete_on_download) VALUES (?, ?, ?)",
-            (file_id, int(time.time()) + actual_expire * 3600, int(delete_after_download))
-        )
+def staging_path(upload_id: str, state: AppState = None) -> Path:
+    state = app_state() if state is None else state
+    return staging_file_path(upload_id, state.config["UPLOAD_DIR"])
+
 
+def select_upload_file(files, state: AppState = None):
+    """
+    The uploaded container from a multipart `files` mapping.
+    Returns (file, None) or (None, (message, status)).
+    """
+    if "file" not in files:
+        return None, ("No file provided", 400)
+
+    uploaded = files.getlist("file")
+    if not uploaded or all(f.filename == "" for f in uploaded):
+        return None, ("No valid files selected", 400)
 
-    # Timestomp and pad all relevant files
-    pad_file_reasonably(Path(ezra_path))
-    timestomp([Path(ezra_path), Path(ezrp_proof_path), Path(ezrp_public_path)])
+    max_files = (app_state() if state is None else state).config["MAX_FILE_COUNT"]
+    if len(uploaded) > max_files:
+        return None, (f"Too many files. Maximum allowed is {max_files}.", 400)
+    return uploaded[0], None
 
-    print(f"[UPLOAD] Stored file with ID: {file_id}")
+
+@routes.route("/upload", methods=["POST"])
+def upload():
+    with stage("upload", "parse"):
+        upload_file, error = select_upload_file(request.files)
+        if not error:
+            meta, error = parse_upload_metadata(request.form)
+    if error:
+        return error
+
+    # Save encrypted file next to its final location, then move it into place
+    staged = staging_path(secrets.token_hex(16))
+    with stage("upload", "save"):
+        upload_file.save(staged)
+    try:
+        error = check_container(staged)
+        if error:
+            return error
+        file_id = store_upload(staged, meta)
+    finally:
+        staged.unlink(missing_ok=True)
 
     return jsonify({ "file_id": file_id })
 
-@app.route("/poseidon", methods=["POST"])
+
+# Chunked, resumable uploads
+#
+#   POST   /upload/session                 -> { upload_id, chunk_size, max_size }
+#   GET    /upload/session/<id>            -> { received, next_chunk }
+#   PUT    /upload/session/<id>/<n>        (raw chunk bytes) -> { received, next_chunk }
+#   POST   /upload/session/<id>/finalize   (same form fields as /upload) -> { file_id }
+#   DELETE /upload/session/<id>
+#
+# Chunks are appended straight to <id>.part in UPLOAD_DIR, so a request never holds more
+# than one read buffer in memory. Every chunk but the last must be exactly chunk_size bytes.
+# Re-sending an already stored chunk is acknowledged without rewriting it, which lets a
+# client resume from `next_chunk` after a dropped connection. Once a finalize has started,
+# further chunks are refused with 409, and after it the session is gone (404).
+#
+# The steps below return (body, status) pairs or plain dicts rather than responses, so the
+# async server (async_app.py) runs the same steps and only reads the body its own way.
+
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def get_upload_session(upload_id: str, state: AppState = None):
+    state = app_state() if state is None else state
+    if not UPLOAD_ID_RE.match(upload_id):
+        return None
+    session = state.store.get_session(upload_id)
+    if not session or session["created_at"] + state.config["UPLOAD_SESSION_TTL_HOURS"] * 3600 < time.time():
+        return None
+    return session
+
+
+def delete_upload_session(upload_id: str, state: AppState = None):
+    state = app_state() if state is None else state
+    staging_path(upload_id, state).unlink(missing_ok=True)
+    state.store.delete_session(upload_id)
+
+
+def session_progress(upload_id: str, state: AppState = None) -> dict:
+    state = app_state() if state is None else state
+    chunk_size = state.config["UPLOAD_CHUNK_SIZE"]
+    received = staging_path(upload_id, state).stat().st_size
+    return {
+        "received": received,
+        "next_chunk": received // chunk_size if received % chunk_size == 0 else None,
+    }
+
+
+def payload_too_large(limit: int):
+    return "Payload too large. Please ensure your encrypted upload is under {} MB.".format(limit // 1000000), 413
+
+
+def create_upload_session(data, state: AppState = None):
+    state = app_state() if state is None else state
+    data = data or {}
+    expected_size = data.get("size")
+    if expected_size is not None:
+        if not isinstance(expected_size, int) or expected_size <= 0:
+            return "Invalid size", 400
+        if expected_size > state.config['MAX_UPLOAD_SIZE']:
+            return payload_too_large(state.config['MAX_UPLOAD_SIZE'])
+
+    upload_id = secrets.token_hex(16)
+    staging_path(upload_id, state).touch()
+    state.store.create_session(upload_id, int(time.time()), expected_size)
+
+    return {
+        "upload_id": upload_id,
+        "chunk_size": state.config['UPLOAD_CHUNK_SIZE'],
+        "max_size": state.config['MAX_UPLOAD_SIZE'],
+    }
+
+
+def upload_session_status(upload_id: str, state: AppState = None):
+    if not get_upload_session(upload_id, state):
+        return "Upload session not found", 404
+    return session_progress(upload_id, state)
+
+
+def lock_session_part(upload_id: str, state: AppState = None):
+    """
+    Open and lock a session's .part file. Chunk PUTs, finalize and abort all hold this lock,
+    so none of them sees another half done. Returns (part, None), or (None, response) if by
+    the time the lock is held the session is gone or being finalized. The file is never
+    created here, so a request that loses the race to a finalize can't leave a new .part
+    behind once the session row is gone.
+    """
+    state = app_state() if state is None else state
+    session = get_upload_session(upload_id, state)
+    if not session:
+        return None, ("Upload session not found", 404)
+    if session["finalizing_at"] is not None:
+        # Refused up front rather than after waiting for the finalize to let go of the lock
+        return None, ("Upload session is being finalized", 409)
+    try:
+        part = open(staging_path(upload_id, state), "r+b")
+    except FileNotFoundError:
+        return None, ("Upload session not found", 404)
+    try:
+        # One writer per session at a time, across threads and worker processes
+        fcntl.flock(part, fcntl.LOCK_EX)
+        session = get_upload_session(upload_id, state)
+        if not session or os.fstat(part.fileno()).st_nlink == 0:
+            refused = "Upload session not found", 404
+        elif session["finalizing_at"] is not None:
+            refused = "Upload session is being finalized", 409
+        else:
+            return part, None
+    except BaseException:
+        part.close()
+        raise
+    part.close()
+    return None, refused
+
+
+def abort_upload_session(upload_id: str, state: AppState = None):
+    part, refused = lock_session_part(upload_id, state)
+    if refused:
+        return refused
+    with part:
+        delete_upload_session(upload_id, state)
+    return "", 204
+
+
+def open_session_chunk(upload_id: str, index: int, length, state: AppState = None):
+    """
+    First step of a chunk PUT: check the session and where the chunk goes, then open and
+    lock the session's .part file. Returns (part, None), with `part` positioned at the end
+    where the chunk's `length` bytes are to be appended, or (None, response) if there is
+    nothing to write. The caller copies the body and hands `part` to close_session_chunk().
+    """
+    state = app_state() if state is None else state
+    if not get_upload_session(upload_id, state):
+        return None, ("Upload session not found", 404)
+
+    chunk_size = state.config['UPLOAD_CHUNK_SIZE']
+    if length is None:
+        return None, ("Content-Length required", 411)
+    if length > chunk_size or length == 0:
+        return None, (f"Chunks must be 1 to {chunk_size} bytes", 400)
+
+    offset = index * chunk_size
+    part, refused = lock_session_part(upload_id, state)
+    if refused:
+        return None, refused
+    try:
+        received = os.fstat(part.fileno()).st_size
+
+        if offset + length <= received:
+            # Already have this chunk (a retry after a lost response)
+            refused = session_progress(upload_id, state)
+        elif offset != received or received % chunk_size:
+            refused = { "error": "Unexpected chunk", **session_progress(upload_id, state) }, 409
+        elif offset + length > state.config['MAX_UPLOAD_SIZE']:
+            refused = payload_too_large(state.config['MAX_UPLOAD_SIZE'])
+        else:
+            part.seek(received)
+            return part, None
+    except BaseException:
+        part.close()
+        raise
+    part.close()
+    return None, refused
+
+
+def close_session_chunk(part, upload_id: str, offset: int, remaining: int, state: AppState = None):
+    """
+    Last step of a chunk PUT: unlock and close `part`. If `remaining` bytes of the chunk
+    never arrived (the connection dropped, or copying it failed), everything past `offset`
+    is dropped so the client can resend the chunk.
+    """
+    try:
+        if remaining:
+            part.truncate(offset)
+    finally:
+        part.close()
+    if remaining:
+        return { "error": "Incomplete chunk", **session_progress(upload_id, state) }, 400
+    return session_progress(upload_id, state)
+
+
+def finalize_upload_session(upload_id: str, form, state: AppState = None):
+    state = app_state() if state is None else state
+    session = get_upload_session(upload_id, state)
+    if not session:
+        return "Upload session not found", 404
+    if session["finalizing_at"] is not None:
+        return "Upload session is being finalized", 409
+
+    meta, error = parse_upload_metadata(form)
+    if error:
+        return error
+
+    # Waits out any chunk still being written. The lock is held until the session is gone,
+    # and chunks are refused once it is marked as finalizing.
+    part, refused = lock_session_part(upload_id, state)
+    if refused:
+        return refused
+    staged = staging_path(upload_id, state)
+    with part:
+        received = os.fstat(part.fileno()).st_size
+        if received == 0:
+            return "No file provided", 400
+        if session["expected_size"] is not None and received != session["expected_size"]:
+            return { "error": "Upload incomplete", **session_progress(upload_id, state) }, 409
+        if not state.store.begin_finalize(upload_id, int(time.time())):
+            return "Upload session is being finalized", 409
+
+        try:
+            error = check_container(staged)
+            if error:
+                return error
+            file_id = store_upload(staged, meta, state)
+        finally:
+            delete_upload_session(upload_id, state)
+
+    return { "file_id": file_id }
+
+
+@routes.route("/upload/session", methods=["POST"])
+def upload_session_init():
+    return create_upload_session(request.get_json(silent=True))
+
+
+@routes.route("/upload/session/<upload_id>", methods=["GET"])
+def upload_session_get(upload_id):
+    return upload_session_status(upload_id)
+
+
+@routes.route("/upload/session/<upload_id>", methods=["DELETE"])
+def upload_session_abort(upload_id):
+    return abort_upload_session(upload_id)
+
+
+@routes.route("/upload/session/<upload_id>/<int:index>", methods=["PUT"])
+def upload_session_chunk(upload_id, index):
+    part, refused = open_session_chunk(upload_id, index, request.content_length)
+    if refused:
+        return refused
+
+    offset, remaining = part.tell(), request.content_length
+    try:
+        while remaining > 0:
+            buf = request.stream.read(min(UPLOAD_READ_SIZE, remaining))
+            if not buf:
+                break
+            part.write(buf)
+            remaining -= len(buf)
+    finally:
+        response = close_session_chunk(part, upload_id, offset, remaining)
+    return response
+
+
+@routes.route("/upload/session/<upload_id>/finalize", methods=["POST"])
+def upload_session_finalize(upload_id):
+    return finalize_upload_session(upload_id, request.form)
+
+
+def hash_secret_b64(b64: str) -> str:
+    binary = base64.b64decode(b64)
+    secret = int.from_bytes(binary, byteorder="big")
+    return poseidon_hash(secret)  # already decimal string
+
+
+@routes.route("/poseidon", methods=["POST"])
 def poseidon_endpoint():
+    if not current_app.config["POSEIDON_ENDPOINT_ENABLED"]:
+        return "Not found", 404
     data = request.get_json()
     try:
         b64 = data.get("secret_b64")
         if not b64:
             return "Missing input", 400
 
-        binary = base64.b64decode(b64)
-        secret = int.from_bytes(binary, byteorder="big")
-        hashed = poseidon_hash(secret)
-        return jsonify({ "hash": hashed })  # already decimal string
+        return jsonify({ "hash": hash_secret_b64(b64) })
     except Exception as e:
         return f"Error: {str(e)}", 500
 
+@routes.route("/poseidon/batch", methods=["POST"])
+def poseidon_batch_endpoint():
+    if not current_app.config["POSEIDON_ENDPOINT_ENABLED"]:
+        return "Not found", 404
+    data = request.get_json(silent=True) or {}
+    secrets_b64 = data.get("secrets_b64")
+    if not isinstance(secrets_b64, list) or not secrets_b64:
+        return "Missing input", 400
+    if len(secrets_b64) > current_app.config["MAX_BATCH_SIZE"]:
+        return f"Too many secrets. Maximum batch size is {current_app.config['MAX_BATCH_SIZE']}.", 400
+
+    secret_ints = []
+    for i, b64 in enumerate(secrets_b64):
+        try:
+            binary = base64.b64decode(b64, validate=True)
+        except Exception:
+            return f"Invalid base64 secret at index {i}", 400
+        secret_ints.append(int.from_bytes(binary, byteorder="big"))
 
-
-def delayed_delete(file_id, delay=120):
-    time.sleep(delay)
     try:
-        for f in glob.glob(f"{UPLOAD_DIR}/{file_id}.*"):
-            os.remove(f)
-            print(f"[CLEANUP] Deleted: {f}")
+        with hash_gate.admit(current_app.config['ADMISSION_ENABLED']):
+            hashes = poseidon_hash_batch(secret_ints)
+        return jsonify({ "hashes": hashes })
+    except Overloaded as e:
+        return shed_response(e, "/poseidon/batch")
     except Exception as e:
-        print(f"[!] Error deleting {file_id}: {e}")
-        
-
-@app.route("/download", methods=["POST"])
-def download():
-    data = request.get_json()
+        return f"Error: {str(e)}", 500
 
-    proof = data.get("proof")
-    public = data.get("public")
 
+def check_proof_payload(proof, public):
+    """
+    Returns an error message if proof/public are not shaped like a snarkjs Groth16 proof, else None.
+    """
     if not isinstance(proof, dict) or not isinstance(public, list) or not public or not all(isinstance(p, str) for p in public):
-        return "Invalid proof/public format", 400
+        return "Invalid proof/public format"
 
     required_keys = {"pi_a", "pi_b", "pi_c", "protocol", "curve"}
     if not required_keys.issubset(proof.keys()):
-        return "Malformed proof structure", 400
-
-    file_id = public[0]
-
-    
-    tmp_proof_path = os.path.join(ARTIFACTS_PATH, "tmp_proof.json")
-    tmp_public_path = os.path.join(ARTIFACTS_PATH, "tmp_public.json")
+        return "Malformed proof structure"
+    return None
+
+@routes.route("/verify/batch", methods=["POST"])
+def verify_batch_endpoint():
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return "Missing input", 400
+    if len(items) > current_app.config["MAX_BATCH_SIZE"]:
+        return f"Too many proofs. Maximum batch size is {current_app.config['MAX_BATCH_SIZE']}.", 400
+
+    batch = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            return f"Invalid proof/public format at index {i}", 400
+        error = check_proof_payload(item.get("proof"), item.get("public"))
+        if error:
+            return f"{error} at index {i}", 400
+        batch.append({ "proof": item["proof"], "public": item["public"] })
 
     try:
-        with open(tmp_proof_path, "w") as pf:
-            json.dump(proof, pf)
-        with open(tmp_public_path, "w") as pubf:
-            json.dump(public, pubf)
-
-        subprocess.run([
-            "snarkjs", "groth16", "verify",
-            os.path.join(ARTIFACTS_PATH, "verification_key.json" ),
-            tmp_public_path,
-            tmp_proof_path
-        ], check=True)
-
-    except subprocess.CalledProcessError:
-        return "Invalid proof", 403
+        with verify_gate.admit(current_app.config['ADMISSION_ENABLED']):
+            valid = verify_proof_batch(batch)
+    except Overloaded as e:
+        return shed_response(e, "/verify/batch")
     except Exception as e:
-        print(f"Exception during proof verification: {e}")
+        log("!", f"Exception during batch proof verification: {e}")
         return "Server error during proof verification", 500
 
-    ezra_path = os.path.join(UPLOAD_DIR, f"{file_id}.ezra")
-    
+    return jsonify({ "valid": valid })
+
+
+@routes.route("/stats", methods=["GET"])
+def stats():
+    if not current_app.config["STATS_ENABLED"]:
+        return "Not found", 404
+    return jsonify({ "proof_cache": app_state().proof_cache.stats() })
+
+
+@routes.route("/metrics", methods=["GET"])
+def metrics():
+    if not current_app.config["METRICS_ENABLED"]:
+        return "Not found", 404
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+# /download is split into steps shared with the async server (async_app.py), which runs
+# the database and disk steps and the verification step on separate executors
 
-    if not os.path.exists(ezra_path):
-        return "File not found", 404
+def check_download_request(data, state: AppState = None):
+    """
+    Validate a /download body and refuse consumed one-time downloads before any proof work.
+    Returns ((proof, public, record), None) or (None, (message, status)).
+    """
+    state = app_state() if state is None else state
+    with stage("download", "check"):
+        return _check_download_request(data, state)
+
+
+def _check_download_request(data, state: AppState):
+    data = data or {}
+    proof = data.get("proof")
+    public = data.get("public")
+
+    error = check_proof_payload(proof, public)
+    if error:
+        return None, (error, 400)
+    if not is_file_id(public[0]):
+        return None, ("Invalid file id", 400)
 
-    should_delete = get_expiration(file_id)
-    
-    # Load ciphertext before scheduling deletion
-    with open(ezra_path, "rb") as f:
-        ciphertext = f.read().rstrip(b'\x00')
+    # A consumed one-time download is refused before paying for proof verification
+    record = state.store.get_file(public[0])
+    if record and record["consumed_at"] is not None:
+        return None, ("File already downloaded", 410)
+    return (proof, public, record), None
 
-    if should_delete:
-        @after_this_request
-        def schedule_deletion(response):
-            print(f"[→] Deletion policy active for {file_id} — will delete after response")
-            threading.Thread(target=delayed_delete, args=(file_id,), daemon=True).start()
-            return response
 
-    return jsonify({
-        "ciphertext": base64.b64encode(ciphertext).decode()
-    })
+def verify_download_proof(proof, public, state: AppState = None) -> bool:
+    """
+    Verify through the proof cache. Raises if the verifier itself fails, and Overloaded
+    if a cache miss can't get a verifier in time.
+    """
+    state = app_state() if state is None else state
+    proof_cache = state.proof_cache
+    with stage("download", "verify"):
+        digest = proof_digest(proof, public)
+        valid = proof_cache.get(digest)
+        if valid is None:
+            with verify_gate.admit(state.config['ADMISSION_ENABLED']):
+                valid = verify_proof(proof, public)
+            proof_cache.put(digest, public[0], valid)
+        return valid
+
+
+def claim_download(file_id: str, record, state: AppState = None):
+    """
+    Find the file to serve and, for a one-time download, claim it.
+    Returns ((path, offset, ciphertext_length, ciphertext), None) or (None, (message, status)).
+    `offset` is where the container starts in the file, non-zero for a pack slot.
+    `ciphertext` is the container of a packed upload, already read, and None for an upload
+    in its own file, which is to be streamed from `path`.
+    """
+    state = app_state() if state is None else state
+    with stage("download", "claim"):
+        return _claim_download(file_id, record, state)
+
+
+def _claim_download(file_id: str, record, state: AppState):
+    config = state.config
+    packed = state.packs.locate(file_id) is not None
+    ezra_path = None if packed else find_upload_file(file_id, "ezra", config["UPLOAD_DIR"])
+    if not packed and ezra_path is None:
+        return None, ("File not found", 404)
+
+    if record and record["delete_on_download"]:
+        # Claim the file atomically; of two concurrent downloads only one wins. The deletion
+        # is persisted as an earlier expiry and carried out by the expiry sweeper.
+        now = int(time.time())
+        delete_at = now + config['DOWNLOAD_DELETE_DELAY']
+        if not state.store.consume_file(file_id, now, delete_at):
+            return None, ("File already downloaded", 410)
+        state.sweeper.schedule(file_id, delete_at)
+        state.proof_cache.evict_files([file_id])
+        log("DOWNLOAD", f"Deletion policy active for {file_id} — will delete after {config['DOWNLOAD_DELETE_DELAY']}s",
+            file_id=file_id, delete_at=delete_at)
+
+    # Uploads stored before the real length was recorded need it from the header, or a scan.
+    # Packed uploads always have it.
+    length = record["ciphertext_length"] if record else None
+
+    if packed:
+        # Read a slot right away. Once the upload expires or is consumed, the slot is zeroed
+        # and handed to the next upload, and an open handle doesn't survive that. The slot
+        # is looked up again for the read, since compaction may have moved it since.
+        with stage("download", "read"):
+            read = state.packs.read(file_id, length)
+        if read is None:
+            return None, ("File not found", 404)
+        ezra_path, offset, ciphertext = read
+        return (ezra_path, offset, len(ciphertext), ciphertext), None
+
+    if length is None:
+        length = container_length(Path(ezra_path))
+    return (ezra_path, 0, length, None), None
+
+
+def wants_binary_download(accept_mimetypes) -> bool:
+    return accept_mimetypes.best_match(["application/json", "application/octet-stream"]) == "application/octet-stream"
+
+
+@routes.route("/download", methods=["POST"])
+def download():
+    checked, error = check_download_request(request.get_json())
+    if error:
+        return error
+    proof, public, record = checked
+    file_id = public[0]
+
+    try:
+        valid = verify_download_proof(proof, public)
+    except Overloaded as e:
+        return shed_response(e, "/download")
+    except Exception as e:
+        log("!", f"Exception during proof verification: {e}")
+        return "Server error during proof verification", 500
+
+    if not valid:
+        return "Invalid proof", 403
 
-    
+    claimed, error = claim_download(file_id, record)
+    if error:
+        return error
+    ezra_path, offset, length, ciphertext = claimed
+
+    if wants_binary_download(request.accept_mimetypes):
+        DOWNLOADS.labels(format="binary").inc()
+        if ciphertext is None:
+            # Stream the file in fixed-size chunks; the open handle survives a scheduled delete
+            ciphertext = iter_file_chunks(Path(ezra_path), length, offset=offset)
+        response = Response(ciphertext, mimetype="application/octet-stream")
+        response.headers["Content-Length"] = str(length)
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    DOWNLOADS.labels(format="json").inc()
+    with stage("download", "encode"):
+        if ciphertext is None:
+            with open(ezra_path, "rb") as f:
+                f.seek(offset)
+                ciphertext = f.read(length)
+        response = jsonify({
+            "ciphertext": base64.b64encode(ciphertext).decode()
+        })
+    return response
 
 
 if __name__ == "__main__":
-    # Initialize SQLite database
-    # SQLite database setup
-    schema = """
-    CREATE TABLE IF NOT EXISTS expirations (
-        file_id TEXT PRIMARY KEY,
-        expires_at INTEGER NOT NULL,
-        delete_on_download INTEGER DEFAULT 0
-    );
-    """
-    with sqlite3.connect(DB_DIR / "expirations.db") as db:
-        db.execute(schema)
-        db.commit()
-    print(f"[INIT] Initialized {DB_DIR / 'expirations.db'}")
+    # Development server only; see wsgi.py and gunicorn.conf.py for production
+    app = create_app()
+    log("INIT", f"Initialized {app.config['DB_PATH']}")
+    start_background_tasks(app)
     app.run(ssl_context="adhoc", host="0.0.0.0", debug=True, port=5001)
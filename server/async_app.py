@@ -0,0 +1,307 @@
+# Asyncio server for the transfer-heavy routes: /upload, the chunked upload session routes
+# (/upload/session/...), /download and /poseidon.
+#
+# Under Flask a slow client holds a worker thread for its whole upload or download, and
+# proof verification blocks the same thread. Here the event loop owns the sockets and only
+# the blocking steps leave it: database and disk work go to one thread pool, and proof
+# verification (which waits on the Node verifier pool) to another, sized to the verify gate,
+# so queued proofs can't starve file I/O. One process can then hold thousands of slow
+# clients open. The handlers reuse app.py's helpers, so requests and responses are the
+# same as the Flask routes'. Every other path falls through to the Flask app.
+#
+# Admission control (admission.py) applies here too. The verify pool has a thread for every
+# call the verify gate admits, and the loop refuses more than that up front, so no proof
+# waits unseen in the executor's queue.
+#
+#   cd server && hypercorn async_app:app --bind 0.0.0.0:5001 --workers 2
+#
+# Needs the packages in requirements-async.txt.
+
+import asyncio
+import os
+import secrets
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, Response, g, jsonify, request
+
+import app as ezra
+import wsgi
+from admission import Overloaded
+from storage import DOWNLOAD_CHUNK_SIZE
+from telemetry import log, stage, REQUEST_SECONDS, DOWNLOADS
+
+ASYNC_IO_THREADS = int(os.getenv("ASYNC_IO_THREADS", 32))
+# Seconds a client may take to send a request body (a whole upload)
+ASYNC_BODY_TIMEOUT = int(os.getenv("ASYNC_BODY_TIMEOUT", 600))
+
+ASYNC_PATHS = {"/upload", "/download", "/poseidon"}
+# Everything at or below these paths, i.e. all of the chunked upload session routes
+ASYNC_PREFIXES = ("/upload/session",)
+
+io_executor = ThreadPoolExecutor(ASYNC_IO_THREADS, thread_name_prefix="ezra-io")
+# Calls past the gate's concurrency wait inside it, on their own thread, for a verifier
+verify_executor = ThreadPoolExecutor(ezra.verify_gate.capacity, thread_name_prefix="ezra-verify")
+
+
+async def run_io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(io_executor, partial(fn, *args))
+
+
+def is_async_path(path: str) -> bool:
+    return path in ASYNC_PATHS or any(path == prefix or path.startswith(prefix + "/") for prefix in ASYNC_PREFIXES)
+
+
+async def run_verify(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(verify_executor, partial(fn, *args))
+
+
+def save_stream(stream, path: Path, chunk_size: int = ezra.UPLOAD_READ_SIZE):
+    with open(path, "wb") as f:
+        while chunk := stream.read(chunk_size):
+            f.write(chunk)
+
+
+def encode_download(path: Path, length: int, offset: int = 0, ciphertext: bytes = None) -> bytes:
+    with stage("download", "encode"):
+        if ciphertext is None:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                ciphertext = f.read(length)
+        return base64.b64encode(ciphertext)
+
+
+async def stream_file(path: Path, length: int, chunk_size: int = DOWNLOAD_CHUNK_SIZE, offset: int = 0):
+    f = await run_io(open, path, "rb")
+    try:
+        await run_io(f.seek, offset)
+        remaining = length
+        while remaining > 0:
+            chunk = await run_io(f.read, min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await run_io(f.close)
+
+
+def create_async_app(flask_app) -> Quart:
+    """
+    The Quart app serving ASYNC_PATHS. Settings and state (store, sweeper, proof cache) are
+    `flask_app`'s, so both servers share one configuration.
+    """
+    config = flask_app.config
+    state = ezra.app_state(flask_app)
+
+    app = Quart(__name__)
+    app.config["MAX_CONTENT_LENGTH"] = config["MAX_CONTENT_LENGTH"]
+    app.config["BODY_TIMEOUT"] = ASYNC_BODY_TIMEOUT
+    # Verifications submitted to verify_executor and not yet finished
+    verifying = 0
+
+    @app.before_serving
+    async def start():
+        await run_io(ezra.start_background_tasks, flask_app)
+
+    @app.after_serving
+    async def stop():
+        await run_io(ezra.stop_background_tasks, flask_app)
+
+    @app.before_request
+    async def start_request_timer():
+        g.request_start = time.perf_counter()
+        return ezra.check_rate_limit(request.path, request.remote_addr, request.headers, config)
+
+    @app.after_request
+    async def observe_request(response):
+        start = getattr(g, "request_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.labels(route=route, status=response.status_code).observe(time.perf_counter() - start)
+        return response
+
+    @app.errorhandler(413)
+    async def handle_413(e):
+        log("!", f"Payload too large: {e}")
+        return "Payload too large. Please ensure your encrypted upload is under {} MB.".format(
+            config['MAX_CONTENT_LENGTH'] // 1000000
+        ), 413
+
+    @app.route("/upload", methods=["POST"])
+    async def upload():
+        files, form = await request.files, await request.form
+        with stage("upload", "parse"):
+            upload_file, error = ezra.select_upload_file(files, state)
+            if not error:
+                meta, error = ezra.parse_upload_metadata(form)
+        if error:
+            return error
+
+        staged = ezra.staging_path(secrets.token_hex(16), state)
+        try:
+            with stage("upload", "save"):
+                await run_io(save_stream, upload_file.stream, staged)
+            error = await run_io(ezra.check_container, staged)
+            if error:
+                return error
+            file_id = await run_io(ezra.store_upload, staged, meta, state)
+        finally:
+            await run_io(staged.unlink, True)
+
+        return jsonify({ "file_id": file_id })
+
+    # Chunked upload sessions: the same steps as the Flask routes, with the chunk bodies read
+    # from the event loop instead of a buffered copy
+
+    @app.route("/upload/session", methods=["POST"])
+    async def upload_session_init():
+        data = await request.get_json(silent=True)
+        return await run_io(ezra.create_upload_session, data, state)
+
+    @app.route("/upload/session/<upload_id>", methods=["GET"])
+    async def upload_session_get(upload_id):
+        return await run_io(ezra.upload_session_status, upload_id, state)
+
+    @app.route("/upload/session/<upload_id>", methods=["DELETE"])
+    async def upload_session_abort(upload_id):
+        return await run_io(ezra.abort_upload_session, upload_id, state)
+
+    @app.route("/upload/session/<upload_id>/<int:index>", methods=["PUT"])
+    async def upload_session_chunk(upload_id, index):
+        part, refused = await run_io(ezra.open_session_chunk, upload_id, index, request.content_length, state)
+        if refused:
+            return refused
+
+        offset, remaining = part.tell(), request.content_length
+        try:
+            async for data in request.body:
+                data = data[:remaining]
+                await run_io(part.write, data)
+                remaining -= len(data)
+                if not remaining:
+                    break
+        finally:
+            # Shielded so a cancelled request still unlocks and closes the .part file
+            response = await asyncio.shield(run_io(ezra.close_session_chunk, part, upload_id, offset, remaining, state))
+        return response
+
+    @app.route("/upload/session/<upload_id>/finalize", methods=["POST"])
+    async def upload_session_finalize(upload_id):
+        form = await request.form
+        return await run_io(ezra.finalize_upload_session, upload_id, form, state)
+
+    @app.route("/download", methods=["POST"])
+    async def download():
+        nonlocal verifying
+        data = await request.get_json(silent=True)
+        checked, error = await run_io(ezra.check_download_request, data, state)
+        if error:
+            return error
+        proof, public, record = checked
+        file_id = public[0]
+
+        gate = ezra.verify_gate
+        if state.config["ADMISSION_ENABLED"] and verifying >= gate.capacity:
+            return ezra.shed_response(Overloaded(503, "queue_full", gate.retry_after(), "Server busy, try again shortly"),
+                                      "/download")
+        verifying += 1
+        try:
+            valid = await run_verify(ezra.verify_download_proof, proof, public, state)
+        except Overloaded as e:
+            return ezra.shed_response(e, "/download")
+        except Exception as e:
+            log("!", f"Exception during proof verification: {e}")
+            return "Server error during proof verification", 500
+        finally:
+            verifying -= 1
+
+        if not valid:
+            return "Invalid proof", 403
+
+        claimed, error = await run_io(ezra.claim_download, file_id, record, state)
+        if error:
+            return error
+        ezra_path, offset, length, ciphertext = claimed
+
+        if ezra.wants_binary_download(request.accept_mimetypes):
+            DOWNLOADS.labels(format="binary").inc()
+            # A packed upload comes already read (see claim_download)
+            body = ciphertext if ciphertext is not None else stream_file(Path(ezra_path), length, offset=offset)
+            response = Response(body, mimetype="application/octet-stream")
+            response.headers["Content-Length"] = str(length)
+            response.headers["Cache-Control"] = "no-store"
+            return response
+
+        DOWNLOADS.labels(format="json").inc()
+        encoded = await run_io(encode_download, ezra_path, length, offset, ciphertext)
+        return jsonify({
+            "ciphertext": encoded.decode()
+        })
+
+    @app.route("/poseidon", methods=["POST"])
+    async def poseidon_endpoint():
+        if not config["POSEIDON_ENDPOINT_ENABLED"]:
+            return "Not found", 404
+        data = await request.get_json(silent=True)
+        try:
+            b64 = data.get("secret_b64")
+            if not b64:
+                return "Missing input", 400
+
+            # Sub-millisecond, not worth a thread hop
+            return jsonify({ "hash": ezra.hash_secret_b64(b64) })
+        except Exception as e:
+            return f"Error: {str(e)}", 500
+
+    return app
+
+
+def with_status_chunk(wsgi_app):
+    """
+    Hypercorn's WSGI adapter sends the status line together with the first body chunk, so
+    an empty body (a 204) would never send one. Always yield at least one chunk.
+    """
+    def app(environ, start_response):
+        body = wsgi_app(environ, start_response)
+        try:
+            empty = True
+            for chunk in body:
+                empty = False
+                yield chunk
+            if empty:
+                yield b""
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+    return app
+
+
+class EZRAServer:
+    """
+    ASGI entry point: ASYNC_PATHS and ASYNC_PREFIXES go to the Quart app, everything else to the Flask app
+    running on Hypercorn's WSGI adapter. Lifespan events (startup and shutdown) go to Quart.
+    """
+    def __init__(self, async_app: Quart, flask_app):
+        self.async_app = async_app
+        self.flask_app = flask_app
+        # The adapter buffers the request body, so allow the largest request Flask accepts
+        self.wsgi = AsyncioWSGIMiddleware(with_status_chunk(flask_app), max_body_size=flask_app.config["MAX_CONTENT_LENGTH"])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan" or is_async_path(scope.get("path", "")):
+            await self.async_app(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+
+def create_asgi_app(flask_app) -> EZRAServer:
+    return EZRAServer(create_async_app(flask_app), flask_app)
+
+
+# wsgi.py builds the app and runs preload()
+app = create_asgi_app(wsgi.app)
@@ -1,30 +1,19 @@
 #!/usr/bin/env python3
-from pathlib import Path
-import time, sqlite3
+# One-shot cleanup of expired uploads and abandoned upload sessions.
+# The server already does this continuously in the background (see sweeper.py); this is
+# for deployments that disable the in-process sweeper (SWEEPER_ENABLED=0) or run it by hand.
+import time
 
-from paths import UPLOAD_DIR, DB_DIR
+from dotenv import load_dotenv
 
-DB_PATH = DB_DIR / "expirations.db"
+load_dotenv()
 
-# File extensions to delete
-EXTS = ["ezra", "proof.json", "public.json"]
+from paths import UPLOAD_DIR
+from metadata import store
+from sweeper import ExpirySweeper
 
-now = int(time.time())
+store.init_schema()
 
-# Query expired file_ids
-# Should be O(k) where k is expired files
-# Not O(1) but better than the O(n) of the previous version
-with sqlite3.connect(DB_PATH) as conn:
-    cursor = conn.execute("SELECT file_id FROM expirations WHERE expires_at <= ?", (now,))
-    expired_ids = [row[0] for row in cursor.fetchall()]
-
-# Remove files + delete DB entries
-for file_id in expired_ids:
-    print(f"[CLEANUP] Expired: {file_id}")
-    for ext in EXTS:
-        try:
-            (UPLOAD_DIR / f"{file_id}.{ext}").unlink()
-        except FileNotFoundError:
-            continue
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("DELETE FROM expirations WHERE file_id = ?", (file_id,))
+# Walks the expires_at index in batches, so the cost follows the number of expired files
+removed = ExpirySweeper(store, UPLOAD_DIR).sweep_all(int(time.time()))
+print(f"[CLEANUP] Removed {removed} expired upload(s)")
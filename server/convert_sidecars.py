@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Move the per-upload <id>.proof.json / <id>.public.json sidecars written by older versions
+# into the upload's database row, then delete them. Sidecars whose upload no longer has a
+# row (expired before the upgrade) are just deleted. Run once after upgrading; it can run
+# while the server is up and can be re-run safely.
+import argparse
+import json
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from paths import UPLOAD_DIR, LEGACY_SIDECAR_SUFFIXES
+from metadata import store
+
+PROOF_SUFFIX, PUBLIC_SUFFIX = LEGACY_SIDECAR_SUFFIXES
+
+
+def find_sidecars(upload_dir: Path):
+    """
+    Yield (file_id, {suffix: path}) for every upload with sidecars, in either layout.
+    """
+    for dirpath, _, filenames in os.walk(upload_dir):
+        found = {}
+        for name in filenames:
+            for suffix in LEGACY_SIDECAR_SUFFIXES:
+                if name.endswith(f".{suffix}"):
+                    found.setdefault(name[:-len(suffix) - 1], {})[suffix] = Path(dirpath) / name
+        yield from found.items()
+
+
+def _load(path: Path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def convert(upload_dir: Path = UPLOAD_DIR, batch_size: int = 500) -> dict:
+    counts = {"converted": 0, "orphaned": 0}
+    batch = []
+
+    def flush():
+        items = []
+        for file_id, sidecars in batch:
+            proof = _load(sidecars[PROOF_SUFFIX]) if PROOF_SUFFIX in sidecars else None
+            public = _load(sidecars[PUBLIC_SUFFIX]) if PUBLIC_SUFFIX in sidecars else None
+            if proof is not None and public is not None:
+                items.append((file_id, proof, public))
+
+        # Rows come first; sidecars are only removed once their contents are committed
+        counts["converted"] += store.attach_proofs(items)
+        for file_id, sidecars in batch:
+            if store.get_file(file_id) is None:
+                counts["orphaned"] += 1
+            for path in sidecars.values():
+                path.unlink(missing_ok=True)
+        batch.clear()
+
+    for file_id, sidecars in find_sidecars(Path(upload_dir)):
+        batch.append((file_id, sidecars))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move proof sidecar files into the metadata database")
+    parser.add_argument("--upload-dir", type=Path, default=UPLOAD_DIR)
+    parser.add_argument("--batch-size", type=int, default=500, help="uploads per database transaction")
+    args = parser.parse_args()
+
+    store.init_schema()
+    counts = convert(args.upload_dir, args.batch_size)
+    print(f"[CONVERT] Moved {counts['converted']} proof(s) into the database, "
+          f"removed sidecars of {counts['orphaned']} expired upload(s)")
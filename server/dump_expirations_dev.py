@@ -1,8 +1,7 @@
 from pathlib import Path
-import sqlite3
 from datetime import datetime, timezone
 
-from paths import DB_DIR
+from metadata import store
 
 def humanize(ts):
     try:
@@ -10,16 +9,16 @@ def humanize(ts):
     except:
         return "Invalid timestamp"
 
-with sqlite3.connect(DB_DIR / "expirations.db") as conn:
-    cursor = conn.execute("SELECT file_id, expires_at, delete_on_download FROM expirations ORDER BY expires_at ASC")
-    rows = cursor.fetchall()
+store.init_schema()
+rows = store.all_files()
 
 if not rows:
     print("[INFO] No records in database.")
 else:
     print(f"[INFO] {len(rows)} expiration records:")
-    for file_id, expires_at, delete_flag in rows:
-        print(f"• {file_id}")
-        print(f"   ├─ Expires: {humanize(expires_at)} (epoch: {expires_at})")
-        print(f"   ├─ Delete on Download: {'Yes' if delete_flag else 'No'}")
+    for row in rows:
+        print(f"• {row['file_id']}")
+        print(f"   ├─ Expires: {humanize(row['expires_at'])} (epoch: {row['expires_at']})")
+        print(f"   ├─ Delete on Download: {'Yes' if row['delete_on_download'] else 'No'}")
+        print(f"   ├─ Ciphertext Length: {row['ciphertext_length'] if row['ciphertext_length'] is not None else 'Unknown'}")
         
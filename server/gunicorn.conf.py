@@ -0,0 +1,49 @@
+# Gunicorn settings for EZRA, all overridable through the environment (or server/.env).
+#
+# Each worker process runs a pool of request threads (gthread). Uploads and downloads
+# mostly wait on the network and disk, and proof verification waits on the Node verifier
+# pool, so threads are cheap concurrency here; processes add CPU for hashing and padding.
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("EZRA_BIND", "0.0.0.0:5001")
+workers = int(os.getenv("EZRA_PROCESSES", multiprocessing.cpu_count()))
+threads = int(os.getenv("EZRA_THREADS", 8))
+worker_class = "gthread"
+
+# Build the app and parse the verification key and Poseidon constants once, before forking
+preload_app = True
+
+# On SIGTERM/SIGHUP a worker stops accepting and gets this long to finish in-flight requests
+# (a large upload or download) before it is killed. Chunked uploads resume after a restart.
+graceful_timeout = int(os.getenv("EZRA_GRACEFUL_TIMEOUT", 120))
+# A worker that stops heartbeating for this long is restarted
+timeout = int(os.getenv("EZRA_WORKER_TIMEOUT", 300))
+keepalive = int(os.getenv("EZRA_KEEPALIVE", 5))
+# Recycle workers now and then so slow leaks can't accumulate; jitter avoids restarting all at once
+max_requests = int(os.getenv("EZRA_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+
+# TLS is normally terminated by a reverse proxy; set both to serve HTTPS directly
+certfile = os.getenv("EZRA_TLS_CERT") or None
+keyfile = os.getenv("EZRA_TLS_KEY") or None
+
+accesslog = os.getenv("EZRA_ACCESS_LOG") or None
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Threads and child processes from the parent don't survive fork(); start this worker's own
+    import wsgi
+    from app import start_background_tasks
+    start_background_tasks(wsgi.app)
+
+
+def worker_exit(server, worker):
+    import wsgi
+    from app import stop_background_tasks
+    stop_background_tasks(wsgi.app)
@@ -0,0 +1,376 @@
+# Shared access to the expirations database
+#
+# Every thread keeps one long-lived connection instead of opening a new one per query.
+# Connections run in WAL mode (readers never block the writer), wait out locks with a busy
+# timeout, and reuse compiled statements from sqlite3's per-connection statement cache,
+# which is keyed on the SQL text, hence the module-level query constants. A connection is
+# closed when its thread exits, so short-lived threads don't leave connections behind.
+# Schema creation and upgrades live here so every entry point gets the same tables.
+
+import json
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+from paths import DB_PATH
+
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expirations (
+    file_id TEXT PRIMARY KEY,
+    expires_at INTEGER NOT NULL,
+    delete_on_download INTEGER DEFAULT 0,
+    ciphertext_length INTEGER,
+    consumed_at INTEGER,
+    proof TEXT,
+    public_signals TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_expirations_expires_at ON expirations (expires_at);
+
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    upload_id TEXT PRIMARY KEY,
+    created_at INTEGER NOT NULL,
+    expected_size INTEGER,
+    finalizing_at INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_created_at ON upload_sessions (created_at);
+
+-- Pack files of fixed-size slots for small uploads (see packstore.py). AUTOINCREMENT so
+-- the id, and with it the file name, of a deleted pack is never handed out again.
+CREATE TABLE IF NOT EXISTS packs (
+    pack_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    slots INTEGER NOT NULL
+);
+
+-- One row per slot, with file_id NULL while the slot is free. The UNIQUE index serves both
+-- the lookup by file_id and the search for a free slot.
+CREATE TABLE IF NOT EXISTS pack_slots (
+    pack_id INTEGER NOT NULL,
+    slot INTEGER NOT NULL,
+    file_id TEXT UNIQUE,
+    PRIMARY KEY (pack_id, slot)
+);
+"""
+
+# Columns added after the first release, as (table, column, definition)
+MIGRATIONS = [
+    ("expirations", "ciphertext_length", "INTEGER"),
+    ("expirations", "consumed_at", "INTEGER"),
+    ("expirations", "proof", "TEXT"),
+    ("expirations", "public_signals", "TEXT"),
+    ("upload_sessions", "finalizing_at", "INTEGER"),
+]
+
+SELECT_FILE = "SELECT file_id, expires_at, delete_on_download, ciphertext_length, consumed_at FROM expirations WHERE file_id = ?"
+INSERT_FILE = "INSERT OR REPLACE INTO expirations (file_id, expires_at, delete_on_download, ciphertext_length, proof, public_signals) VALUES (?, ?, ?, ?, ?, ?)"
+SELECT_PROOF = "SELECT proof, public_signals FROM expirations WHERE file_id = ?"
+ATTACH_PROOF = "UPDATE expirations SET proof = ?, public_signals = ? WHERE file_id = ? AND proof IS NULL"
+DELETE_FILE = "DELETE FROM expirations WHERE file_id = ?"
+DELETE_EXPIRED_FILE = "DELETE FROM expirations WHERE file_id = ? AND expires_at <= ?"
+CONSUME_FILE = "UPDATE expirations SET consumed_at = ?, expires_at = MIN(expires_at, ?) WHERE file_id = ? AND consumed_at IS NULL"
+SELECT_EXPIRED = "SELECT file_id FROM expirations WHERE expires_at <= ?"
+SELECT_EXPIRING = "SELECT file_id, expires_at FROM expirations WHERE expires_at <= ? ORDER BY expires_at LIMIT ?"
+SELECT_ALL_FILES = "SELECT file_id, expires_at, delete_on_download, ciphertext_length FROM expirations ORDER BY expires_at ASC"
+
+SELECT_SLOT = "SELECT pack_id, slot FROM pack_slots WHERE file_id = ?"
+SELECT_FREE_SLOT = "SELECT pack_id, slot FROM pack_slots WHERE file_id IS NULL ORDER BY pack_id, slot LIMIT 1"
+INSERT_PACK = "INSERT INTO packs (slots) VALUES (?)"
+INSERT_SLOT = "INSERT INTO pack_slots (pack_id, slot) VALUES (?, ?)"
+ASSIGN_SLOT = "UPDATE pack_slots SET file_id = ? WHERE pack_id = ? AND slot = ? AND file_id IS NULL"
+RELEASE_SLOT = "UPDATE pack_slots SET file_id = NULL WHERE pack_id = ? AND slot = ?"
+SELECT_PACK_FILL = "SELECT pack_id, COUNT(file_id) AS used, COUNT(*) AS slots FROM pack_slots GROUP BY pack_id ORDER BY pack_id"
+SELECT_PACK_FILES = "SELECT slot, file_id FROM pack_slots WHERE pack_id = ? AND file_id IS NOT NULL ORDER BY slot"
+SELECT_FREE_SLOTS_ELSEWHERE = "SELECT pack_id, slot FROM pack_slots WHERE file_id IS NULL AND pack_id != ? ORDER BY pack_id, slot LIMIT ?"
+DELETE_PACK_SLOTS = "DELETE FROM pack_slots WHERE pack_id = ?"
+DELETE_PACK = "DELETE FROM packs WHERE pack_id = ?"
+
+SELECT_SESSION = "SELECT upload_id, created_at, expected_size, finalizing_at FROM upload_sessions WHERE upload_id = ?"
+INSERT_SESSION = "INSERT INTO upload_sessions (upload_id, created_at, expected_size) VALUES (?, ?, ?)"
+FINALIZE_SESSION = "UPDATE upload_sessions SET finalizing_at = ? WHERE upload_id = ? AND finalizing_at IS NULL"
+DELETE_SESSION = "DELETE FROM upload_sessions WHERE upload_id = ?"
+SELECT_STALE_SESSIONS = "SELECT upload_id FROM upload_sessions WHERE created_at <= ?"
+
+
+class _ThreadConnection:
+    """
+    A thread's connection, held only by its thread-local storage. The thread exiting drops
+    it, and the finalizer registered in MetadataStore.connection() closes the connection.
+    """
+    __slots__ = ("conn", "pid", "generation", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, pid: int, generation: int):
+        self.conn = conn
+        self.pid = pid
+        self.generation = generation
+
+
+def _release_connection(conn: sqlite3.Connection, pid: int, connections: set, lock: threading.Lock):
+    with lock:
+        connections.discard(conn)
+    if pid != os.getpid():
+        return  # inherited across fork: the parent still owns it
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def _compact_json(value):
+    return None if value is None else json.dumps(value, separators=(",", ":"))
+
+
+class MetadataStore:
+    def __init__(self, path: Path = DB_PATH, busy_timeout_ms: int = DB_BUSY_TIMEOUT_MS):
+        self.path = Path(path)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()  # open connections of live threads
+        # Bumped by close_all() so threads notice their cached connection is gone
+        self._generation = 0
+
+    # Connections
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,  # autocommit; transaction() issues BEGIN explicitly
+            check_same_thread=False,  # only so close_all() may close it from another thread
+            cached_statements=256,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        This thread's connection, opened on first use and closed when the thread exits.
+        A forked child never reuses its parent's connection.
+        """
+        held = getattr(self._local, "held", None)
+        if held is None or held.pid != os.getpid() or held.generation != self._generation:
+            conn = self._connect()
+            held = _ThreadConnection(conn, os.getpid(), self._generation)
+            with self._lock:
+                self._connections.add(conn)
+            weakref.finalize(held, _release_connection, conn, held.pid, self._connections, self._lock)
+            self._local.held = held
+        return held.conn
+
+    def open_connections(self) -> int:
+        with self._lock:
+            return len(self._connections)
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run several statements atomically. Takes the write lock up front (BEGIN IMMEDIATE)
+        so the transaction can't fail half-way on a lock upgrade. Nested use joins the
+        outer transaction.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def close_all(self):
+        """
+        Close every pooled connection, e.g. before deleting the database file.
+        """
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+            self._generation += 1
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    # Schema
+
+    def init_schema(self):
+        """
+        Create missing tables and add columns that older databases are missing.
+        """
+        with self.transaction() as conn:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            for table, column, definition in MIGRATIONS:
+                columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    # Uploaded files
+
+    def get_file(self, file_id: str):
+        row = self.execute(SELECT_FILE, (file_id,)).fetchone()
+        return dict(row) if row else None
+
+    def record_file(self, file_id: str, expires_at: int, delete_on_download: bool, ciphertext_length: int,
+                    proof=None, public=None):
+        self.execute(INSERT_FILE, (
+            file_id, expires_at, int(delete_on_download), ciphertext_length,
+            _compact_json(proof), _compact_json(public)
+        ))
+
+    def get_proof(self, file_id: str):
+        """
+        The (proof, public signals) stored with an upload, or None if it has none.
+        """
+        row = self.execute(SELECT_PROOF, (file_id,)).fetchone()
+        if row is None or row["proof"] is None:
+            return None
+        return json.loads(row["proof"]), json.loads(row["public_signals"])
+
+    def attach_proofs(self, items: list) -> int:
+        """
+        Store proofs for existing rows that have none, from (file_id, proof, public) tuples.
+        Returns how many rows were updated.
+        """
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(ATTACH_PROOF, [
+                (_compact_json(proof), _compact_json(public), file_id) for file_id, proof, public in items
+            ])
+            return conn.total_changes - before
+
+    def consume_file(self, file_id: str, now: int, delete_at: int) -> bool:
+        """
+        Mark a delete-on-download file as consumed and bring its expiry forward to delete_at,
+        which hands the deletion to the expiry sweeper and survives a restart.
+        Returns False if the file was already consumed (or is gone), so exactly one
+        download can claim it.
+        """
+        return self.execute(CONSUME_FILE, (now, delete_at, file_id)).rowcount == 1
+
+    def delete_files(self, file_ids: list):
+        with self.transaction() as conn:
+            conn.executemany(DELETE_FILE, [(file_id,) for file_id in file_ids])
+
+    def expired_file_ids(self, now: int) -> list:
+        return [row[0] for row in self.execute(SELECT_EXPIRED, (now,))]
+
+    def expiring_before(self, cutoff: int, limit: int) -> list:
+        """
+        Up to `limit` (file_id, expires_at) pairs expiring at or before cutoff, soonest first.
+        An index range scan, so the cost follows the rows returned rather than the table size.
+        """
+        return [(row[0], row[1]) for row in self.execute(SELECT_EXPIRING, (cutoff, limit))]
+
+    def delete_expired(self, file_ids: list, now: int) -> list:
+        """
+        Delete the rows of those file_ids that are still expired at `now`, and return the
+        ids actually deleted. A row refreshed or re-created with a later expiry is kept.
+        """
+        with self.transaction() as conn:
+            return [file_id for file_id in file_ids
+                    if conn.execute(DELETE_EXPIRED_FILE, (file_id, now)).rowcount == 1]
+
+    def all_files(self) -> list:
+        return [dict(row) for row in self.execute(SELECT_ALL_FILES)]
+
+    # Chunked upload sessions
+
+    def get_session(self, upload_id: str):
+        row = self.execute(SELECT_SESSION, (upload_id,)).fetchone()
+        return dict(row) if row else None
+
+    def create_session(self, upload_id: str, created_at: int, expected_size=None):
+        self.execute(INSERT_SESSION, (upload_id, created_at, expected_size))
+
+    def begin_finalize(self, upload_id: str, now: int) -> bool:
+        """
+        Mark a session as being finalized, after which it takes no more chunks.
+        Returns False if it is gone or another request is already finalizing it.
+        """
+        return self.execute(FINALIZE_SESSION, (now, upload_id)).rowcount == 1
+
+    def delete_session(self, upload_id: str):
+        self.execute(DELETE_SESSION, (upload_id,))
+
+    def stale_session_ids(self, cutoff: int) -> list:
+        return [row[0] for row in self.execute(SELECT_STALE_SESSIONS, (cutoff,))]
+
+    # Pack slots
+
+    def get_slot(self, file_id: str):
+        """
+        The (pack_id, slot) holding an upload, or None if it is stored as its own file.
+        """
+        row = self.execute(SELECT_SLOT, (file_id,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def free_slot(self):
+        """
+        The lowest free (pack_id, slot), or None if every pack is full.
+        """
+        row = self.execute(SELECT_FREE_SLOT).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def add_pack(self, slots: int) -> int:
+        """
+        Register a new pack with `slots` free slots. Returns its pack_id.
+        """
+        with self.transaction() as conn:
+            pack_id = conn.execute(INSERT_PACK, (slots,)).lastrowid
+            conn.executemany(INSERT_SLOT, [(pack_id, slot) for slot in range(slots)])
+            return pack_id
+
+    def assign_slot(self, file_id: str, pack_id: int, slot: int) -> bool:
+        """
+        Give a free slot to an upload. Returns False if the slot was taken meanwhile.
+        """
+        return self.execute(ASSIGN_SLOT, (file_id, pack_id, slot)).rowcount == 1
+
+    def release_slot(self, pack_id: int, slot: int):
+        self.execute(RELEASE_SLOT, (pack_id, slot))
+
+    def pack_fill(self) -> list:
+        """
+        (pack_id, used, slots) for every pack.
+        """
+        return [(row[0], row[1], row[2]) for row in self.execute(SELECT_PACK_FILL)]
+
+    def pack_files(self, pack_id: int) -> list:
+        """
+        (slot, file_id) for the occupied slots of a pack.
+        """
+        return [(row[0], row[1]) for row in self.execute(SELECT_PACK_FILES, (pack_id,))]
+
+    def free_slots_elsewhere(self, pack_id: int, limit: int) -> list:
+        """
+        Up to `limit` free (pack_id, slot) pairs outside the given pack, lowest first.
+        """
+        return [(row[0], row[1]) for row in self.execute(SELECT_FREE_SLOTS_ELSEWHERE, (pack_id, limit))]
+
+    def delete_pack(self, pack_id: int):
+        with self.transaction() as conn:
+            conn.execute(DELETE_PACK_SLOTS, (pack_id,))
+            conn.execute(DELETE_PACK, (pack_id,))
+
+
+# Process-wide store used by the app and the maintenance scripts
+store = MetadataStore()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Move uploads from the flat UPLOAD_DIR layout into the sharded one (see paths.upload_path).
+#
+# Safe to run while the server is up. Each file is hard-linked to its sharded path before the
+# flat name is removed, and lookups check the flat path first, so a download never misses a
+# file mid-move. A flat file whose sharded path already exists is a stale copy of a re-upload
+# and is simply removed. The directory is streamed with os.scandir, and --pause throttles the
+# disk work between batches.
+import argparse
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from paths import UPLOAD_DIR, UPLOAD_SUFFIXES, LEGACY_SIDECAR_SUFFIXES, UPLOAD_SHARD_DEPTH, upload_path
+
+
+def parse_upload_name(name: str):
+    """
+    Split "<file_id>.<suffix>" into (file_id, suffix), or None for anything else (.part, .gitkeep).
+    """
+    for suffix in UPLOAD_SUFFIXES + LEGACY_SIDECAR_SUFFIXES:
+        if name.endswith(f".{suffix}") and len(name) > len(suffix) + 1:
+            return name[:-len(suffix) - 1], suffix
+    return None
+
+
+def migrate(upload_dir: Path = UPLOAD_DIR, batch_size: int = 1000, pause: float = 0.0, dry_run: bool = False) -> dict:
+    upload_dir = Path(upload_dir)
+    counts = {"moved": 0, "stale": 0, "skipped": 0}
+
+    with os.scandir(upload_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                continue  # shard directories
+            parsed = parse_upload_name(entry.name)
+            if parsed is None or not entry.is_file(follow_symlinks=False):
+                counts["skipped"] += 1
+                continue
+
+            file_id, suffix = parsed
+            src = Path(entry.path)
+            dst = upload_path(file_id, suffix, upload_dir)
+            if dry_run:
+                print(f"[MIGRATE] {src.name} -> {dst.relative_to(upload_dir)}")
+                counts["moved"] += 1
+                continue
+
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(src, dst)
+                counts["moved"] += 1
+            except FileExistsError:
+                counts["stale"] += 1
+            except FileNotFoundError:
+                # Deleted (expired, or re-uploaded) since the scan saw it
+                continue
+            src.unlink(missing_ok=True)
+
+            done = counts["moved"] + counts["stale"]
+            if done % batch_size == 0:
+                print(f"[MIGRATE] {done} files processed")
+                if pause:
+                    time.sleep(pause)
+
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move a flat upload directory into the sharded layout")
+    parser.add_argument("--upload-dir", type=Path, default=UPLOAD_DIR)
+    parser.add_argument("--batch-size", type=int, default=1000, help="files between progress reports and pauses")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep after each batch")
+    parser.add_argument("--dry-run", action="store_true", help="print the moves without making them")
+    args = parser.parse_args()
+
+    if UPLOAD_SHARD_DEPTH == 0:
+        parser.error("UPLOAD_SHARD_DEPTH is 0, so the flat layout is already the configured one")
+
+    counts = migrate(args.upload_dir, args.batch_size, args.pause, args.dry_run)
+    print(f"[MIGRATE] Moved {counts['moved']}, removed {counts['stale']} stale, skipped {counts['skipped']}")
@@ -0,0 +1,216 @@
+# Pack files for small uploads
+#
+# Every upload under 1 MB is padded up to 1 MB (see storage.padded_size). With mostly small
+# documents, that means a disk full of 1 MB mostly-zero files, one inode each. With
+# PACK_STORE_ENABLED=1, uploads in that smallest bucket go into a slot of a pack file
+# instead. A pack is PACK_SLOTS slots of PACK_SLOT_SIZE bytes under uploads/packs/, and the
+# slot index is the pack_slots table. A slot always holds exactly the padded size
+# (ciphertext, then zeros), so a pack reveals no more about an upload's length than the
+# loose padded file would.
+#
+# Slots are handed out lowest first, so new uploads fill old packs before a new pack is
+# created. A slot is zeroed when its upload expires and then reused. Packs are created at
+# full size with the configured padding mode. Allocation and creation both happen under
+# the database write lock, so two workers never pick the same slot or create the same pack.
+#
+# Expiry leaves holes. compact() moves the uploads of the emptiest pack into free slots of
+# the others, whenever they fit, then deletes the emptied pack. It copies whole slots and
+# unlinks the old pack, so a download that already opened it keeps reading the old copy.
+# The sweeper runs it every PACK_COMPACT_INTERVAL seconds.
+
+import os
+from pathlib import Path
+
+from paths import UPLOAD_DIR, pack_path
+from storage import padded_size, pad_file_to_exact_size, timestomp
+from telemetry import log
+
+PACK_STORE_ENABLED = os.getenv("PACK_STORE_ENABLED", "0") == "1"
+PACK_SLOTS = int(os.getenv("PACK_SLOTS", 64))
+PACK_COMPACT_INTERVAL = int(os.getenv("PACK_COMPACT_INTERVAL", 3600))
+# Slots hold uploads of the smallest padding bucket
+PACK_SLOT_SIZE = padded_size(0)
+
+_ZERO_SLOT = bytes(PACK_SLOT_SIZE)
+
+
+def _pwrite_all(fd: int, data, offset: int):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+class PackStore:
+    def __init__(self, store, upload_dir: Path = UPLOAD_DIR, slots: int = PACK_SLOTS, padding_mode: str = "fallocate"):
+        self.store = store
+        self.upload_dir = Path(upload_dir)
+        self.slots = max(1, slots)
+        self.padding_mode = padding_mode
+
+    def fits(self, size: int) -> bool:
+        """
+        Whether an upload of `size` bytes pads to exactly one slot.
+        """
+        return padded_size(size) == PACK_SLOT_SIZE
+
+    def path(self, pack_id: int) -> Path:
+        return pack_path(pack_id, self.upload_dir)
+
+    def locate(self, file_id: str):
+        """
+        (pack path, byte offset) of a packed upload, or None if it isn't packed.
+        """
+        found = self.store.get_slot(file_id)
+        if found is None:
+            return None
+        pack_id, slot = found
+        return self.path(pack_id), slot * PACK_SLOT_SIZE
+
+    def read(self, file_id: str, length: int):
+        """
+        (pack path, byte offset, first `length` bytes of the slot) of a packed upload, or None
+        if it isn't packed. The slot is looked up and read under the database write lock,
+        which release() and compact_once() hold while they zero, move or delete slots, so
+        the bytes are always this upload's.
+        """
+        with self.store.transaction():
+            found = self.locate(file_id)
+            if found is None:
+                return None
+            path, offset = found
+            with open(path, "rb") as f:
+                return path, offset, os.pread(f.fileno(), length, offset)
+
+    # Writing
+
+    def _new_pack(self) -> int:
+        pack_id = self.store.add_pack(self.slots)
+        path = self.path(pack_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+        pad_file_to_exact_size(path, self.slots * PACK_SLOT_SIZE, mode=self.padding_mode)
+        log("PACK", f"Created pack {pack_id}", pack_id=pack_id, slots=self.slots)
+        return pack_id
+
+    def put(self, file_id: str, source: Path):
+        """
+        Copy a fully received container into a slot, reusing the upload's slot if it has
+        one, and zero the rest of the slot. Returns (pack path, byte offset). Inside the
+        caller's transaction, the slot only becomes the upload's once that commits.
+        """
+        data = Path(source).read_bytes()
+        if not self.fits(len(data)):
+            raise ValueError(f"{len(data)} bytes don't fit a {PACK_SLOT_SIZE}-byte slot")
+
+        with self.store.transaction():
+            found = self.store.get_slot(file_id)
+            if found is None:
+                found = self.store.free_slot() or (self._new_pack(), 0)
+                self.store.assign_slot(file_id, *found)
+            pack_id, slot = found
+            path, offset = self.path(pack_id), slot * PACK_SLOT_SIZE
+            fd = os.open(path, os.O_WRONLY)
+            try:
+                _pwrite_all(fd, data, offset)
+                _pwrite_all(fd, memoryview(_ZERO_SLOT)[len(data):], offset + len(data))
+            finally:
+                os.close(fd)
+        timestomp([path])
+        return path, offset
+
+    def release(self, file_ids: list) -> int:
+        """
+        Zero and free the slots of the given uploads. Uploads without a slot are skipped.
+        Returns how many slots were freed.
+        """
+        freed = 0
+        with self.store.transaction():
+            for file_id in file_ids:
+                found = self.store.get_slot(file_id)
+                if found is None:
+                    continue
+                pack_id, slot = found
+                try:
+                    fd = os.open(self.path(pack_id), os.O_WRONLY)
+                except FileNotFoundError:
+                    pass  # nothing left to zero
+                else:
+                    try:
+                        _pwrite_all(fd, _ZERO_SLOT, slot * PACK_SLOT_SIZE)
+                    finally:
+                        os.close(fd)
+                self.store.release_slot(pack_id, slot)
+                freed += 1
+        return freed
+
+    # Compaction
+
+    def _drop(self, pack_id: int):
+        self.store.delete_pack(pack_id)
+        self.path(pack_id).unlink(missing_ok=True)
+        log("PACK", f"Deleted pack {pack_id}", pack_id=pack_id)
+
+    def compact_once(self) -> int:
+        """
+        Delete empty packs, then move the uploads of the emptiest pack into the other
+        packs if they fit there. Returns how many uploads were moved, 0 once nothing more can be done.
+        """
+        with self.store.transaction():
+            live = []
+            for pack_id, used, slots in self.store.pack_fill():
+                if used:
+                    live.append((used, -pack_id, slots))
+                else:
+                    self._drop(pack_id)
+            if len(live) < 2:
+                return 0
+
+            # The emptiest pack, and of those the newest, so old packs stay put
+            used, source, _ = min(live)
+            source = -source
+            free_elsewhere = sum(slots - n for n, pack_id, slots in live if -pack_id != source)
+            if free_elsewhere < used:
+                return 0
+
+            targets = self.store.free_slots_elsewhere(source, used)
+            fds = {}
+            src = os.open(self.path(source), os.O_RDONLY)
+            try:
+                for (slot, file_id), (pack_id, target_slot) in zip(self.store.pack_files(source), targets):
+                    data = os.pread(src, PACK_SLOT_SIZE, slot * PACK_SLOT_SIZE)
+                    if pack_id not in fds:
+                        fds[pack_id] = os.open(self.path(pack_id), os.O_WRONLY)
+                    _pwrite_all(fds[pack_id], data.ljust(PACK_SLOT_SIZE, b"\0"), target_slot * PACK_SLOT_SIZE)
+                    self.store.release_slot(source, slot)
+                    self.store.assign_slot(file_id, pack_id, target_slot)
+            finally:
+                os.close(src)
+                for fd in fds.values():
+                    os.close(fd)
+            timestomp([self.path(pack_id) for pack_id in fds])
+            self._drop(source)
+        return used
+
+    def compact(self) -> int:
+        """
+        Compact until no pack can be emptied into the others. Each pack is moved in its
+        own transaction, so writers wait for at most one pack's worth of copying.
+        Returns how many uploads were moved.
+        """
+        moved = 0
+        while True:
+            batch = self.compact_once()
+            if not batch:
+                # The last pass may still have dropped packs that were already empty
+                return moved
+            moved += batch
+
+    def stats(self) -> dict:
+        fill = self.store.pack_fill()
+        return {
+            "packs": len(fill),
+            "slots_used": sum(used for _, used, _ in fill),
+            "slots": sum(slots for _, _, slots in fill),
+        }
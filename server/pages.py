@@ -0,0 +1,151 @@
+# Pre-rendered pages
+#
+# The informational pages and the warrant canary get most of the anonymous traffic but only
+# change on a deploy or a canary update. Each page is rendered once and compressed once
+# (gzip, plus brotli when the brotli package is installed). It's kept with a strong ETag
+# and with Last-Modified set to the newest mtime of its sources: its template, plus any
+# data files it reads. A request only stats those sources, and a changed mtime re-renders
+# the page on the next request. Conditional requests (If-None-Match / If-Modified-Since)
+# get a bodiless 304, and everything else gets the stored bytes in the best encoding the
+# client accepts.
+
+import datetime
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import Response, current_app, render_template, request
+
+try:
+    import brotli
+except ImportError:  # optional; pages are still served gzipped
+    brotli = None
+
+# Pages are compressed once per render, so spend the CPU on the smallest output
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Content-Encoding -> ETag suffix, in order of preference
+ENCODINGS = (("br", "-br"), ("gzip", "-gz"), ("identity", ""))
+
+
+class RenderedPage:
+    __slots__ = ("bodies", "etags", "last_modified", "mtimes", "key")
+
+    def __init__(self, html: str, mtimes: dict, key):
+        """
+        `mtimes` maps each source path to its st_mtime_ns at render time.
+        """
+        body = html.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies = {"identity": body}
+        compressed = gzip.compress(body, GZIP_LEVEL, mtime=0)  # mtime=0 keeps the bytes (and ETag) stable
+        if len(compressed) < len(body):
+            self.bodies["gzip"] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+            if len(compressed) < len(body):
+                self.bodies["br"] = compressed
+        self.etags = {encoding: digest + suffix for encoding, suffix in ENCODINGS if encoding in self.bodies}
+        # HTTP dates have one-second resolution
+        self.last_modified = datetime.datetime.fromtimestamp(max(mtimes.values()) // 10**9, datetime.timezone.utc)
+        self.mtimes = mtimes
+        self.key = key
+
+
+class PageCache:
+    def __init__(self):
+        self._specs = {}  # name -> (template, context, sources, key)
+        self._pages = {}  # name -> RenderedPage
+        self._lock = threading.Lock()
+
+    def register(self, name: str, template: str = None, context=None, sources=(), key=None):
+        """
+        Declare a page. `context` is a callable returning the template variables, `sources`
+        the data files it reads besides the template, and `key` a callable whose result
+        also forces a re-render when it changes (e.g. the current year).
+        """
+        self._specs[name] = (template or name, context, tuple(sources), key)
+
+    def _mtimes(self, paths) -> dict:
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = 0
+        return mtimes
+
+    def _is_current(self, page: RenderedPage, key) -> bool:
+        return page.key == key and self._mtimes(page.mtimes) == page.mtimes
+
+    def get(self, name: str) -> RenderedPage:
+        """
+        The rendered page, re-rendering it first if a source changed. Needs a request context.
+        """
+        template, context, sources, key_fn = self._specs[name]
+        key = key_fn() if key_fn else None
+        page = self._pages.get(name)
+        if page is not None and self._is_current(page, key):
+            return page
+
+        with self._lock:
+            page = self._pages.get(name)
+            if page is not None and self._is_current(page, key):
+                return page
+            env = current_app.jinja_env
+            template_path = env.loader.get_source(env, template)[1]
+            # Stat before rendering, so an edit made during the render triggers another one
+            mtimes = self._mtimes((template_path, *sources))
+            html = render_template(template, **(context() if context else {}))
+            page = RenderedPage(html, mtimes, key)
+            self._pages[name] = page
+            return page
+
+    def warm(self):
+        """
+        Render every registered page now, e.g. at startup. Needs a request context.
+        """
+        for name in self._specs:
+            self.get(name)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def serve(self, name: str) -> Response:
+        page = self.get(name)
+        encoding = negotiate_encoding(page)
+        etag = page.etags[encoding]
+
+        if request.if_none_match:
+            # Any encoding of the same content is a match
+            not_modified = any(request.if_none_match.contains_weak(tag) for tag in page.etags.values())
+        else:
+            since = request.if_modified_since
+            not_modified = since is not None and since >= page.last_modified
+
+        if not_modified:
+            response = Response(status=304)
+        else:
+            response = Response(page.bodies[encoding], mimetype="text/html")
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.last_modified = page.last_modified
+        response.headers["Cache-Control"] = "no-cache"  # always revalidate; a 304 costs next to nothing
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+def negotiate_encoding(page: RenderedPage) -> str:
+    accepted = request.accept_encodings
+    best, best_quality = "identity", 0
+    for encoding, _ in ENCODINGS:
+        if encoding == "identity" or encoding not in page.bodies:
+            continue
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
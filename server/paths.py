@@ -12,6 +12,7 @@ TMP_PROOF_PATH = os.path.abspath(os.path.join(ARTIFACTS_DIR, "tmp_proof.json"))
 TMP_PUBLIC_PATH = os.path.abspath(os.path.join(ARTIFACTS_DIR, "tmp_public.json"))
 VERIFICATION_KEY_PATH = os.path.abspath(os.path.join(ARTIFACTS_DIR, "verification_key.json"))
 """
+import hashlib
 from pathlib import Path
 
 # Root of the project (parent of the file's directory)
@@ -22,10 +23,81 @@ UPLOAD_DIR = PROJECT_ROOT / "uploads"
 LOG_DIR = PROJECT_ROOT / "logs"
 DB_DIR = PROJECT_ROOT / "db"
 ARTIFACTS_DIR = PROJECT_ROOT / "artifacts"
+NODE_MODULES_DIR = PROJECT_ROOT / "node_modules"
+
+STATIC_DIR = SERVER_DIR / "static"
+# Content-hashed copies of the client-side circuit artifacts, see zk_assets.py
+ZK_ASSET_DIR = STATIC_DIR / "zk"
+ZK_ASSET_MANIFEST = ZK_ASSET_DIR / "manifest.json"
 
-TMP_PROOF_PATH = ARTIFACTS_DIR / "tmp_proof.json"
-TMP_PUBLIC_PATH = ARTIFACTS_DIR / "tmp_public.json"
 VERIFICATION_KEY_PATH = ARTIFACTS_DIR / "verification_key.json"
+DB_PATH = DB_DIR / "expirations.db"
+ZK_WORKER_PATH = SERVER_DIR / "zk_worker.js"
+
+
+# Files stored for every upload, by suffix. The proof and public signals live in the database.
+UPLOAD_SUFFIXES = ("ezra",)
+# Per-upload sidecars written by older versions; convert_sidecars.py moves them into the database
+LEGACY_SIDECAR_SUFFIXES = ("proof.json", "public.json")
+
+# Uploads live under UPLOAD_SHARD_DEPTH levels of two-hex-digit directories
+# (uploads/3f/a2/<id>.ezra); 0 keeps the old flat layout. Change it only together
+# with migrate_upload_layout.py.
+UPLOAD_SHARD_DEPTH = int(os.getenv("UPLOAD_SHARD_DEPTH", 2))
+
+
+def shard_dir(file_id: str, upload_dir: Path = UPLOAD_DIR, depth: int = UPLOAD_SHARD_DEPTH) -> Path:
+    # file_ids are decimal Poseidon hashes whose leading digits are far from uniform,
+    # so the prefixes come from a digest of the id instead
+    digest = hashlib.sha256(file_id.encode()).hexdigest()
+    return Path(upload_dir).joinpath(*(digest[2 * level:2 * level + 2] for level in range(depth)))
+
+
+def upload_path(file_id: str, suffix: str = "ezra", upload_dir: Path = UPLOAD_DIR, depth: int = UPLOAD_SHARD_DEPTH) -> Path:
+    """
+    Where an upload's file is written. Every stored file goes through here.
+    """
+    return shard_dir(file_id, upload_dir, depth) / f"{file_id}.{suffix}"
+
+
+def legacy_upload_path(file_id: str, suffix: str = "ezra", upload_dir: Path = UPLOAD_DIR) -> Path:
+    return Path(upload_dir) / f"{file_id}.{suffix}"
+
+
+def find_upload_file(file_id: str, suffix: str = "ezra", upload_dir: Path = UPLOAD_DIR):
+    """
+    The existing file for an upload, or None. A file not yet moved by the layout migration
+    is still found at its flat path. The flat path is checked first: the migration only
+    removes it once the sharded copy exists, so a concurrent move can't be missed.
+    """
+    for path in (legacy_upload_path(file_id, suffix, upload_dir), upload_path(file_id, suffix, upload_dir)):
+        if path.exists():
+            return path
+    return None
+
+
+def upload_file_paths(file_id: str, upload_dir: Path = UPLOAD_DIR) -> list:
+    """
+    Every file an upload can have on disk, in either layout, so deleting one never needs a glob.
+    """
+    paths = [upload_path(file_id, suffix, upload_dir) for suffix in UPLOAD_SUFFIXES]
+    if UPLOAD_SHARD_DEPTH:
+        paths += [legacy_upload_path(file_id, suffix, upload_dir) for suffix in UPLOAD_SUFFIXES]
+    return paths
+
+
+def pack_path(pack_id: int, upload_dir: Path = UPLOAD_DIR) -> Path:
+    """
+    A pack file holding the slots of small uploads (see packstore.py).
+    """
+    return Path(upload_dir) / "packs" / f"{pack_id:08d}.pack"
+
+
+def staging_file_path(upload_id: str, upload_dir: Path = UPLOAD_DIR) -> Path:
+    """
+    Where a chunked upload accumulates before it is finalized.
+    """
+    return Path(upload_dir) / f"{upload_id}.part"
 
 
 def ensure_directories():
@@ -0,0 +1,150 @@
+# Pure-Python Poseidon over the BN254 scalar field
+#
+# Mirrors circomlibjs' buildPoseidon() (and the PoseidonEx template in circuits/poseidon.circom)
+# using the optimized C/S/M/P constants the circuit is compiled with, so hashes are
+# bit-identical to what the client proves against. Constants are parsed once per width.
+#
+# static/poseidon.js is a port of this file, so the browser can compute the hash it proves
+# without asking the server. Its constants are generated from the same source:
+#
+#   python3 server/poseidon.py
+
+import argparse
+import json
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+
+from paths import PROJECT_ROOT, STATIC_DIR
+
+POSEIDON_CONSTANTS_PATH = PROJECT_ROOT / "circuits" / "poseidon_constants.circom"
+POSEIDON_JS_CONSTANTS_PATH = STATIC_DIR / "poseidon_constants.js"
+# The client only hashes single secrets
+JS_WIDTHS = (2,)
+
+# BN254 scalar field modulus
+FIELD = 21888242871839275222246405745257275088548364400416034343698204186575808495617
+
+N_ROUNDS_F = 8
+N_ROUNDS_P = [56, 57, 56, 60, 60, 63, 64, 63, 60, 66, 60, 65, 70, 60, 64, 68]
+
+_HEX = re.compile(r"0x[0-9a-fA-F]+")
+
+
+@lru_cache(maxsize=None)
+def _constants_source() -> str:
+    return POSEIDON_CONSTANTS_PATH.read_text()
+
+
+def _parse_constants(name: str, t: int) -> List[int]:
+    """
+    Pull the flat list of constants for width t out of `function POSEIDON_<name>(t)`.
+    """
+    source = _constants_source()
+    start = source.index(f"function POSEIDON_{name}(t)")
+    end = source.index("\n}", start)
+    body = source[start:end]
+
+    branch = re.search(rf"t\s*==\s*{t}\s*\)\s*\{{(.*?)\}}\s*else", body, re.S)
+    if not branch:
+        raise ValueError(f"No POSEIDON_{name} constants for t={t}")
+    return [int(h, 16) for h in _HEX.findall(branch.group(1))]
+
+
+@lru_cache(maxsize=None)
+def load_constants(t: int) -> dict:
+    """
+    Returns the C, S, M and P constants for state width t (number of inputs + 1).
+    """
+    if not 2 <= t <= len(N_ROUNDS_P) + 1:
+        raise ValueError(f"Unsupported Poseidon width t={t}")
+
+    def matrix(flat):
+        return [flat[i * t:(i + 1) * t] for i in range(t)]
+
+    return {
+        "C": _parse_constants("C", t),
+        "S": _parse_constants("S", t),
+        "M": matrix(_parse_constants("M", t)),
+        "P": matrix(_parse_constants("P", t)),
+    }
+
+
+def _pow5(a: int) -> int:
+    return pow(a, 5, FIELD)
+
+
+def _mix(state: List[int], M: List[List[int]]) -> List[int]:
+    t = len(state)
+    return [sum(M[j][i] * state[j] for j in range(t)) % FIELD for i in range(t)]
+
+
+def poseidon(inputs: List[int], init_state: int = 0) -> int:
+    """
+    Poseidon hash of 1-16 field elements, identical to circomlibjs' poseidon(inputs).
+    """
+    t = len(inputs) + 1
+    consts = load_constants(t)
+    C, S, M, P = consts["C"], consts["S"], consts["M"], consts["P"]
+    n_rounds_p = N_ROUNDS_P[t - 2]
+    half_f = N_ROUNDS_F // 2
+
+    state = [init_state % FIELD] + [x % FIELD for x in inputs]
+    state = [(a + C[i]) % FIELD for i, a in enumerate(state)]
+
+    # First half of the full rounds; the last one mixes with the sparse-friendly P
+    for r in range(half_f - 1):
+        state = [_pow5(a) for a in state]
+        state = [(a + C[(r + 1) * t + i]) % FIELD for i, a in enumerate(state)]
+        state = _mix(state, M)
+    state = [_pow5(a) for a in state]
+    state = [(a + C[half_f * t + i]) % FIELD for i, a in enumerate(state)]
+    state = _mix(state, P)
+
+    # Partial rounds with the sparse S matrices
+    for r in range(n_rounds_p):
+        state[0] = (_pow5(state[0]) + C[(half_f + 1) * t + r]) % FIELD
+        row = (t * 2 - 1) * r
+        s0 = sum(S[row + j] * a for j, a in enumerate(state)) % FIELD
+        for k in range(1, t):
+            state[k] = (state[k] + state[0] * S[row + t + k - 1]) % FIELD
+        state[0] = s0
+
+    # Second half of the full rounds
+    for r in range(half_f - 1):
+        state = [_pow5(a) for a in state]
+        state = [(a + C[(half_f + 1) * t + n_rounds_p + r * t + i]) % FIELD for i, a in enumerate(state)]
+        state = _mix(state, M)
+    state = [_pow5(a) for a in state]
+    return _mix(state, M)[0]
+
+
+def js_constants(widths=JS_WIDTHS) -> str:
+    """
+    The constants for the given widths as a script defining window.EZRA_POSEIDON_CONSTANTS.
+    Numbers are hex strings, which BigInt() parses, since JSON has no big integers.
+    """
+    data = {}
+    for t in widths:
+        consts = load_constants(t)
+        data[str(t)] = {
+            "nRoundsP": N_ROUNDS_P[t - 2],
+            **{name: [hex(c) for c in consts[name]] for name in ("C", "S")},
+            **{name: [[hex(c) for c in row] for row in consts[name]] for name in ("M", "P")},
+        }
+    return ("// Generated by server/poseidon.py from circuits/poseidon_constants.circom. Do not edit.\n"
+            f"window.EZRA_POSEIDON_CONSTANTS = {json.dumps(data, indent=1)};\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the Poseidon constants used by static/poseidon.js")
+    parser.add_argument("--out", type=Path, default=POSEIDON_JS_CONSTANTS_PATH, help="output file")
+    args = parser.parse_args(argv)
+    args.out.write_text(js_constants())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,23 @@ document.addEventListener("DOMContentLoaded", () => {
     const modal = document.getElementById("uploadOptionsModal");
   
     window.pendingFiles = [];
+
+    // Busy server
+    //
+    // /poseidon and /download answer 429 or 503 with a Retry-After header when the server
+    // is shedding load. Wait as long as it asks, a few times at most, before giving up.
+    const MAX_BUSY_RETRIES = 3;
+    const MAX_RETRY_AFTER_SECONDS = 30;
+
+    window.fetchWithRetryAfter = async function(url, options) {
+      for (let attempt = 0; ; attempt++) {
+        const res = await fetch(url, options);
+        if ((res.status !== 429 && res.status !== 503) || attempt >= MAX_BUSY_RETRIES) return res;
+        const seconds = parseInt(res.headers.get("Retry-After"), 10);
+        if (!(seconds > 0) || seconds > MAX_RETRY_AFTER_SECONDS) return res;
+        await new Promise(resolve => setTimeout(resolve, seconds * 1000));
+      }
+    };
   
     // Show selected files
     fileInput.addEventListener("change", () => {
@@ -92,27 +109,17 @@ document.addEventListener("DOMContentLoaded", () => {
       confirmUpload.textContent = "Encrypting & Uploading...";
     
       try {
-        stageText.textContent = "Encrypting your files…";
-        const zipData = await createZipArchive(pendingFiles);
-    
+        const files = pendingFiles;
+
         // Generate AES key and secret
         const aesKey = new Uint8Array(32);
         const secret = new Uint8Array(32);
         crypto.getRandomValues(aesKey);
         crypto.getRandomValues(secret);
         
-    
-        // Encrypt with AES-GCM
-        const iv = crypto.getRandomValues(new Uint8Array(12));
         const keyObj = await crypto.subtle.importKey('raw', aesKey, { name: 'AES-GCM' }, false, ['encrypt']);
-        const ciphertext = await crypto.subtle.encrypt({ name: 'AES-GCM', iv }, keyObj, zipData);
-
-        stageText.textContent = "Uploading to EZRA…";
-    
-        const encryptedBlob = new Blob([iv, new Uint8Array(ciphertext)], { type: 'application/octet-stream' });
     
         const formData = new FormData();
-        formData.append("file", encryptedBlob, "encrypted.ezra");
         formData.append("secret", btoa(String.fromCharCode(...secret)));
     
         const expireHours = parseInt(expirySelect.value);
@@ -134,35 +141,27 @@ document.addEventListener("DOMContentLoaded", () => {
         composite.set(aesKey, secret.length);
         const compositeB64 = btoa(String.fromCharCode(...composite));
     
-        // Setup upload progress
-        const xhr = new XMLHttpRequest();
-        xhr.open("POST", "/upload", true);
-    
-        xhr.upload.onprogress = function (e) {
-          if (e.lengthComputable) {
-            const percent = Math.round((e.loaded / e.total) * 100);
+        // Zip, encrypt and upload in one pass, one segment at a time, then finalize with
+        // the proof and settings
+        stageText.textContent = "Encrypting & uploading to EZRA…";
+        const archiveLength = zipLength(files);
+        const container = encryptContainer(zipStream(files), archiveLength, keyObj);
+        try {
+          await uploadInChunks(container, containerLength(archiveLength), formData, (sent, total) => {
+            const percent = Math.round((sent / total) * 100);
             progressBar.value = percent;
             if (percent === 100) {
               stageText.textContent = "Finalizing…";
             }
-          }
-        };
-    
-        xhr.onload = async function () {
-          if (xhr.status !== 200) {
-            alert(`Upload failed: ${xhr.responseText}`);
-            return;
-          }
-          modal.classList.add("hidden");
-          // Upload succeeded — now show the secret
-          window.showSecretModal(compositeB64);
-        };
-    
-        xhr.onerror = function () {
-          alert("Upload failed due to network error.");
-        };
-    
-        xhr.send(formData);
+          });
+        } catch (err) {
+          alert(`Upload failed: ${err.message}`);
+          return;
+        }
+
+        modal.classList.add("hidden");
+        // Upload succeeded — now show the secret
+        window.showSecretModal(compositeB64);
     
       } catch (err) {
         console.error("[Upload Error]", err);
@@ -176,15 +175,364 @@ document.addEventListener("DOMContentLoaded", () => {
     });
     
   
-    // Zip helper
-    async function createZipArchive(files) {
-      const zip = new JSZip();
+    // Chunked upload helper
+    //
+    // Opens an upload session, PUTs `source` (an async iterable of byte arrays, `size`
+    // bytes in all) one chunk at a time and finalizes it with `fields`. Chunks are cut from
+    // the source as they're sent, so only the current one is held. A failed chunk is retried
+    // with backoff after asking the server whether it arrived, so a dropped connection
+    // doesn't restart the whole upload.
+    const MAX_CHUNK_RETRIES = 5;
+
+    async function uploadInChunks(source, size, fields, onProgress) {
+      const initRes = await fetch("/upload/session", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ size })
+      });
+      if (!initRes.ok) throw new Error(await initRes.text());
+      const { upload_id: uploadId, chunk_size: chunkSize } = await initRes.json();
+
+      const chunks = rechunk(source, chunkSize)[Symbol.asyncIterator]();
+      let index = 0;
+      let chunk = (await chunks.next()).value;
+      let failures = 0;
+
+      while (chunk) {
+        let res;
+        try {
+          res = await fetch(`/upload/session/${uploadId}/${index}`, {
+            method: "PUT",
+            headers: { "Content-Type": "application/octet-stream" },
+            body: chunk
+          });
+        } catch (err) {
+          res = null;  // network error, retried below
+        }
+
+        let next = null;
+        if (res && (res.ok || res.status === 409)) {
+          const progress = await res.json();
+          if (res.ok) failures = 0;
+          next = progress.next_chunk;
+          onProgress(progress.received, size);
+        } else if (res && res.status >= 400 && res.status < 500) {
+          throw new Error(await res.text());
+        } else {
+          if (++failures > MAX_CHUNK_RETRIES) {
+            throw new Error("network error");
+          }
+          await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+
+          // Find out whether the chunk was stored before the connection dropped
+          const status = await fetch(`/upload/session/${uploadId}`).catch(() => null);
+          if (status && status.ok) {
+            next = (await status.json()).next_chunk;
+          }
+        }
+
+        if (next === index + 1) {
+          index = next;
+          chunk = (await chunks.next()).value;
+        } else if (next !== null && next !== index) {
+          // Earlier chunks were encrypted on the fly and are gone, so they can't be resent
+          throw new Error("Upload out of step with the server");
+        }
+      }
+
+      const finalRes = await fetch(`/upload/session/${uploadId}/finalize`, {
+        method: "POST",
+        body: fields
+      });
+      if (!finalRes.ok) throw new Error(await finalRes.text());
+      return (await finalRes.json()).file_id;
+    }
+
+
+    // Byte stream helpers
+
+    // Yield the chunks of a ReadableStream (a file or a response body)
+    async function* readStream(stream) {
+      const reader = stream.getReader();
+      try {
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) return;
+          yield value;
+        }
+      } finally {
+        reader.releaseLock();
+      }
+    }
+
+    // Re-cut a stream of byte arrays into fresh arrays of exactly `size` bytes, bar the last
+    async function* rechunk(source, size) {
+      let buffer = new Uint8Array(size);
+      let filled = 0;
+      for await (let bytes of source) {
+        while (bytes.length > 0) {
+          const n = Math.min(size - filled, bytes.length);
+          buffer.set(bytes.subarray(0, n), filled);
+          filled += n;
+          bytes = bytes.subarray(n);
+          if (filled === size) {
+            yield buffer;
+            buffer = new Uint8Array(size);
+            filled = 0;
+          }
+        }
+      }
+      if (filled > 0) yield buffer.subarray(0, filled);
+    }
+
+    // Split the first `n` bytes off a stream. Returns [head, the rest of the stream].
+    async function splitHead(source, n) {
+      const iterator = source[Symbol.asyncIterator]();
+      const head = new Uint8Array(n);
+      let filled = 0;
+      let leftover = null;
+      while (filled < n) {
+        const { done, value } = await iterator.next();
+        if (done) break;
+        const take = Math.min(n - filled, value.length);
+        head.set(value.subarray(0, take), filled);
+        filled += take;
+        if (take < value.length) leftover = value.subarray(take);
+      }
+      async function* rest() {
+        if (leftover) yield leftover;
+        while (true) {
+          const { done, value } = await iterator.next();
+          if (done) return;
+          yield value;
+        }
+      }
+      return [head.subarray(0, filled), rest()];
+    }
+
+
+    // Streaming ZIP
+    //
+    // Files are stored, not deflated, and read one stream chunk at a time, so the archive is
+    // never held in memory. Every size is known up front, which gives the archive's exact
+    // length before its first byte (the container header needs it). Sizes stay under 4 GB,
+    // so no ZIP64. Like the server's archives, every entry gets the same timestamp
+    // (1980-01-01) and permissions.
+    const ZIP_DOS_DATE = (1 << 5) | 1;
+    const ZIP_FLAGS = 0x0808;  // sizes and CRC in a data descriptor, UTF-8 names
+    const ZIP_EXTERNAL_ATTR = (0o100644 << 16) >>> 0;
+    const textEncoder = new TextEncoder();
+
+    const CRC_TABLE = (() => {
+      const table = new Uint32Array(256);
+      for (let n = 0; n < 256; n++) {
+        let c = n;
+        for (let k = 0; k < 8; k++) c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+        table[n] = c >>> 0;
+      }
+      return table;
+    })();
+
+    function crc32Update(crc, bytes) {
+      for (let i = 0; i < bytes.length; i++) crc = CRC_TABLE[(crc ^ bytes[i]) & 0xff] ^ (crc >>> 8);
+      return crc;
+    }
+
+    function zipLength(files) {
+      let length = 22;
       for (const file of files) {
-        const content = await file.arrayBuffer();
-        zip.file(file.name, content);
+        const nameLength = textEncoder.encode(file.name).length;
+        length += 30 + nameLength + file.size + 16 + 46 + nameLength;
       }
-      const blob = await zip.generateAsync({ type: "uint8array" });
-      return blob;
+      return length;
+    }
+
+    function zipRecord(size, fill) {
+      const record = new Uint8Array(size);
+      fill(new DataView(record.buffer));
+      return record;
+    }
+
+    async function* zipStream(files) {
+      const entries = [];
+      let offset = 0;
+
+      for (const file of files) {
+        const name = textEncoder.encode(file.name);
+        const local = zipRecord(30 + name.length, view => {
+          view.setUint32(0, 0x04034b50, true);
+          view.setUint16(4, 20, true);
+          view.setUint16(6, ZIP_FLAGS, true);
+          view.setUint16(12, ZIP_DOS_DATE, true);
+          view.setUint16(26, name.length, true);
+        });
+        local.set(name, 30);
+        yield local;
+
+        let crc = 0xffffffff;
+        let size = 0;
+        for await (const bytes of readStream(file.stream())) {
+          crc = crc32Update(crc, bytes);
+          size += bytes.length;
+          yield bytes;
+        }
+        if (size !== file.size) throw new Error(`${file.name} changed while it was being read`);
+        crc = (crc ^ 0xffffffff) >>> 0;
+
+        yield zipRecord(16, view => {
+          view.setUint32(0, 0x08074b50, true);
+          view.setUint32(4, crc, true);
+          view.setUint32(8, size, true);
+          view.setUint32(12, size, true);
+        });
+        entries.push({ name, crc, size, offset });
+        offset += local.length + size + 16;
+      }
+
+      let directorySize = 0;
+      for (const entry of entries) {
+        const central = zipRecord(46 + entry.name.length, view => {
+          view.setUint32(0, 0x02014b50, true);
+          view.setUint16(4, (3 << 8) | 20, true);
+          view.setUint16(6, 20, true);
+          view.setUint16(8, ZIP_FLAGS, true);
+          view.setUint16(14, ZIP_DOS_DATE, true);
+          view.setUint32(16, entry.crc, true);
+          view.setUint32(20, entry.size, true);
+          view.setUint32(24, entry.size, true);
+          view.setUint16(28, entry.name.length, true);
+          view.setUint32(38, ZIP_EXTERNAL_ATTR, true);
+          view.setUint32(42, entry.offset, true);
+        });
+        central.set(entry.name, 46);
+        directorySize += central.length;
+        yield central;
+      }
+
+      yield zipRecord(22, view => {
+        view.setUint32(0, 0x06054b50, true);
+        view.setUint16(8, entries.length, true);
+        view.setUint16(10, entries.length, true);
+        view.setUint32(12, directorySize, true);
+        view.setUint32(16, offset, true);
+      });
+    }
+
+
+    // .ezra containers
+    //
+    // Version 2 (see "# .ezra containers" in server/storage.py): a 32-byte header, then the
+    // archive in SEGMENT_SIZE pieces, each sealed with AES-GCM under nonce prefix || index
+    // with the header as associated data. Both directions work one segment at a time.
+    // Version 1 (iv || AES-GCM of the whole archive) is still read, for older uploads.
+    const CONTAINER_MAGIC = [0x45, 0x5a, 0x52, 0x41];  // "EZRA"
+    const CONTAINER_VERSION = 2;
+    const CONTAINER_HEADER_SIZE = 32;
+    const SEGMENT_SIZE = 1024 * 1024;
+    const SEGMENT_TAG_SIZE = 16;
+
+    function containerLength(plaintextLength) {
+      const segments = Math.max(1, Math.ceil(plaintextLength / SEGMENT_SIZE));
+      return CONTAINER_HEADER_SIZE + plaintextLength + segments * SEGMENT_TAG_SIZE;
+    }
+
+    function segmentNonce(prefix, index) {
+      const nonce = new Uint8Array(12);
+      nonce.set(prefix, 0);
+      new DataView(nonce.buffer).setUint32(8, index);
+      return nonce;
+    }
+
+    function containerHeader(plaintextLength, noncePrefix) {
+      const header = new Uint8Array(CONTAINER_HEADER_SIZE);
+      const view = new DataView(header.buffer);
+      header.set(CONTAINER_MAGIC, 0);
+      view.setUint8(4, CONTAINER_VERSION);
+      view.setUint16(6, CONTAINER_HEADER_SIZE);
+      view.setUint32(8, SEGMENT_SIZE);
+      view.setBigUint64(12, BigInt(plaintextLength));
+      header.set(noncePrefix, 20);
+      return header;
+    }
+
+    // The version 2 header at the start of `bytes`, or null for a version 1 container.
+    // The fields aren't trusted: they're authenticated along with every segment.
+    function parseContainerHeader(bytes) {
+      if (bytes.length < CONTAINER_MAGIC.length || CONTAINER_MAGIC.some((b, i) => bytes[i] !== b)) return null;
+      if (bytes.length < CONTAINER_HEADER_SIZE) throw new Error("Truncated container header");
+      const view = new DataView(bytes.buffer, bytes.byteOffset, CONTAINER_HEADER_SIZE);
+      const version = view.getUint8(4);
+      if (version !== CONTAINER_VERSION) throw new Error(`Unsupported container version ${version}`);
+      const segmentSize = view.getUint32(8);
+      const plaintextLength = Number(view.getBigUint64(12));
+      if (segmentSize === 0) throw new Error("Invalid container header");
+      return {
+        raw: bytes.slice(0, CONTAINER_HEADER_SIZE),
+        segmentSize,
+        plaintextLength,
+        noncePrefix: bytes.slice(20, 28),
+        segments: Math.max(1, Math.ceil(plaintextLength / segmentSize)),
+      };
+    }
+
+    async function* encryptContainer(plaintext, plaintextLength, keyObj) {
+      const noncePrefix = crypto.getRandomValues(new Uint8Array(8));
+      const header = containerHeader(plaintextLength, noncePrefix);
+      yield header;
+
+      let index = 0;
+      let written = 0;
+      const seal = async (segment) => new Uint8Array(await crypto.subtle.encrypt(
+        { name: "AES-GCM", iv: segmentNonce(noncePrefix, index++), additionalData: header }, keyObj, segment));
+
+      for await (const segment of rechunk(plaintext, SEGMENT_SIZE)) {
+        written += segment.length;
+        yield await seal(segment);
+      }
+      if (index === 0) yield await seal(new Uint8Array(0));
+      if (written !== plaintextLength) throw new Error("Archive length changed while encrypting");
+    }
+
+    async function* decryptContainer(sealed, header, keyObj) {
+      let index = 0;
+      let remaining = header.plaintextLength;
+      for await (const segment of rechunk(sealed, header.segmentSize + SEGMENT_TAG_SIZE)) {
+        if (index >= header.segments) throw new Error("Container longer than its header says");
+        const plaintext = await crypto.subtle.decrypt(
+          { name: "AES-GCM", iv: segmentNonce(header.noncePrefix, index), additionalData: header.raw }, keyObj, segment);
+        if (plaintext.byteLength !== Math.min(header.segmentSize, remaining)) throw new Error("Segment has the wrong length");
+        remaining -= plaintext.byteLength;
+        index++;
+        yield new Uint8Array(plaintext);
+      }
+      if (index !== header.segments) throw new Error("Container ended early");
+    }
+
+    // Where a download's plaintext goes. With the File System Access API it is written to
+    // the chosen file one segment at a time. Elsewhere the segments are collected into a Blob
+    // (which the browser may keep on disk) and saved through a link at the end.
+    async function openDownloadSink(filename) {
+      if (window.showSaveFilePicker) {
+        const handle = await window.showSaveFilePicker({ suggestedName: filename });
+        const writable = await handle.createWritable();
+        return {
+          write: (bytes) => writable.write(bytes),
+          close: () => writable.close(),
+          abort: () => writable.abort(),
+        };
+      }
+      let parts = [];
+      return {
+        write: async (bytes) => { parts.push(bytes); },
+        close: async () => {
+          const a = document.createElement("a");
+          a.href = URL.createObjectURL(new Blob(parts, { type: "application/zip" }));
+          a.download = filename;
+          a.click();
+          parts = [];
+        },
+        abort: async () => { parts = []; },
+      };
     }
 
 
@@ -214,64 +562,76 @@ document.addEventListener("DOMContentLoaded", () => {
         return;
       }
 
+      let sink = null;
       try {
         const secretBytes = Uint8Array.from(atob(secret), c => c.charCodeAt(0));
         const key = secretBytes.slice(32);
         const seed = secretBytes.slice(0, 32);
 
+        // Ask where to save first, while the click still counts as a user gesture
+        try {
+          sink = await openDownloadSink("ezra_files.zip");
+        } catch (err) {
+          if (err.name === "AbortError") return;  // the save dialog was cancelled
+          throw err;
+        }
+
         const secretB64 = btoa(String.fromCharCode(...seed));
         const { proof, public: publicSignals } = await generateProof(secretB64);
 
-        const res = await fetch("/download", {
+        const res = await window.fetchWithRetryAfter("/download", {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: {
+            "Content-Type": "application/json",
+            "Accept": "application/octet-stream"
+          },
           body: JSON.stringify({ proof, public: publicSignals })
         });
 
         if (!res.ok) {
           const error = await res.text();
+          await sink.abort();
+          sink = null;
           downloadStatus.textContent = `Download failed: ${error}`;
           downloadStatus.classList.remove("hidden");
           return;
         }
 
-        // --- Stream and decode the response ---
+        // --- Decrypt the ciphertext as it arrives ---
         downloadProgress.classList.remove("hidden");
-
-        const reader = res.body.getReader();
-        const decoder = new TextDecoder("utf-8");
-        const contentLength = +res.headers.get("Content-Length") || 1;
+        // A compressing proxy makes Content-Length the encoded size, so don't trust it then
+        const total = res.headers.get("Content-Encoding") ? 0 : +res.headers.get("Content-Length");
         let received = 0;
-        let text = "";
-
-        while (true) {
-          const { done, value } = await reader.read();
-          if (done) break;
-
-          text += decoder.decode(value, { stream: true });
-          received += value.length;
-          downloadProgress.value = Math.round((received / contentLength) * 100);
-        }
-
-        const parsed = JSON.parse(text);
-        const ciphertext = parsed.ciphertext;
-        const raw = Uint8Array.from(atob(ciphertext), c => c.charCodeAt(0));
-
-        const iv = raw.slice(0, 12);
-        const encrypted = raw.slice(12);
+        const body = (async function* () {
+          for await (const bytes of readStream(res.body)) {
+            received += bytes.length;
+            if (total) downloadProgress.value = Math.round((received / total) * 100);
+            yield bytes;
+          }
+        })();
 
         const keyObj = await crypto.subtle.importKey("raw", key, { name: "AES-GCM" }, false, ["decrypt"]);
-        const decrypted = await crypto.subtle.decrypt({ name: "AES-GCM", iv }, keyObj, encrypted);
-
-        const blob = new Blob([decrypted], { type: "application/zip" });
-        const a = document.createElement("a");
-        a.href = URL.createObjectURL(blob);
-        a.download = "ezra_files.zip";
-        a.click();
+        const [head, rest] = await splitHead(body, CONTAINER_HEADER_SIZE);
+        const header = parseContainerHeader(head);
+        if (header) {
+          for await (const plaintext of decryptContainer(rest, header, keyObj)) {
+            await sink.write(plaintext);
+          }
+        } else {
+          // Version 1: one AES-GCM message over the whole archive
+          const parts = [head];
+          for await (const bytes of rest) parts.push(bytes);
+          const raw = new Uint8Array(await new Blob(parts).arrayBuffer());
+          const decrypted = await crypto.subtle.decrypt({ name: "AES-GCM", iv: raw.subarray(0, 12) }, keyObj, raw.subarray(12));
+          await sink.write(new Uint8Array(decrypted));
+        }
+        await sink.close();
+        sink = null;
 
         resetDownloadStatus();
       } catch (err) {
         console.error("[Download Error]", err);
+        if (sink) await sink.abort().catch(() => {});
         downloadStatus.textContent = "Download or decryption failed.";
         downloadStatus.classList.remove("hidden");
       } finally {
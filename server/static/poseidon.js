@@ -0,0 +1,73 @@
+// Poseidon over the BN254 scalar field, in the browser
+//
+// A port of server/poseidon.py, which is bit-identical to circomlibjs, so proofs can be
+// built without asking the server for Poseidon(secret). The constants come from
+// poseidon_constants.js, generated from the circuit's own constants. Without them
+// window.poseidonHash stays undefined and zkp_logic.js falls back to /poseidon.
+(() => {
+  const constantsByWidth = window.EZRA_POSEIDON_CONSTANTS;
+  if (!constantsByWidth) return;
+
+  const FIELD = 21888242871839275222246405745257275088548364400416034343698204186575808495617n;
+  const N_ROUNDS_F = 8;
+  const prepared = {};
+
+  function loadConstants(t) {
+    if (!prepared[t]) {
+      const raw = constantsByWidth[t];
+      if (!raw) throw new Error(`Unsupported Poseidon width t=${t}`);
+      const big = list => list.map(h => BigInt(h));
+      prepared[t] = { C: big(raw.C), S: big(raw.S), M: raw.M.map(big), P: raw.P.map(big), nRoundsP: raw.nRoundsP };
+    }
+    return prepared[t];
+  }
+
+  function pow5(a) {
+    const a2 = a * a % FIELD;
+    return a2 * a2 % FIELD * a % FIELD;
+  }
+
+  function mix(state, M) {
+    return state.map((_, i) => state.reduce((acc, a, j) => acc + M[j][i] * a, 0n) % FIELD);
+  }
+
+  /**
+   * Poseidon hash of an array of BigInts, as a BigInt. Inputs are reduced into the field
+   * first, like circomlibjs' F.e().
+   */
+  window.poseidonHash = function(inputs) {
+    const t = inputs.length + 1;
+    const { C, S, M, P, nRoundsP } = loadConstants(t);
+    const halfF = N_ROUNDS_F / 2;
+
+    let state = [0n, ...inputs.map(x => ((x % FIELD) + FIELD) % FIELD)];
+    state = state.map((a, i) => (a + C[i]) % FIELD);
+
+    // First half of the full rounds; the last one mixes with the sparse-friendly P
+    for (let r = 0; r < halfF - 1; r++) {
+      state = state.map((a, i) => (pow5(a) + C[(r + 1) * t + i]) % FIELD);
+      state = mix(state, M);
+    }
+    state = state.map((a, i) => (pow5(a) + C[halfF * t + i]) % FIELD);
+    state = mix(state, P);
+
+    // Partial rounds with the sparse S matrices
+    for (let r = 0; r < nRoundsP; r++) {
+      state[0] = (pow5(state[0]) + C[(halfF + 1) * t + r]) % FIELD;
+      const row = (t * 2 - 1) * r;
+      const s0 = state.reduce((acc, a, j) => acc + S[row + j] * a, 0n) % FIELD;
+      for (let k = 1; k < t; k++) {
+        state[k] = (state[k] + state[0] * S[row + t + k - 1]) % FIELD;
+      }
+      state[0] = s0;
+    }
+
+    // Second half of the full rounds
+    for (let r = 0; r < halfF - 1; r++) {
+      state = state.map((a, i) => (pow5(a) + C[(halfF + 1) * t + nRoundsP + r * t + i]) % FIELD);
+      state = mix(state, M);
+    }
+    state = state.map(pow5);
+    return mix(state, M)[0];
+  };
+})();
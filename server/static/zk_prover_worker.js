@@ -0,0 +1,112 @@
+// Groth16 proving off the main thread
+//
+// zkp_logic.js hands every proof to this worker, so the witness calculation and the
+// multi-exponentiations no longer freeze the page. The worker outlives the proofs: it keeps
+// the circuit's wasm and zkey in memory, and snarkjs keeps its BN254 curve, so only the
+// first proof pays for fetching and setting them up. zkp_logic.js sends a throwaway proof
+// when the page loads to get that out of the way before the user needs one.
+//
+// The artifacts are also kept in Cache Storage under their SHA-256 (from zk_assets.py's
+// manifest), so a later visit reads them from disk without asking the network, and a
+// rebuilt circuit can never be mixed up with a cached one. Bytes whose hash doesn't match
+// are refused. Without the hashes (build_zk.sh never ran) or outside a secure context, the
+// worker just fetches the URLs and leaves caching to the browser.
+//
+// Messages in:  {id, type: "warmup" | "prove", assets: {name: {url, sha256}}, input}
+// Messages out: {id, proof, publicSignals} or {id, error}
+
+// Same build as the one index.html loads for the main-thread fallback
+importScripts("https://cdn.jsdelivr.net/npm/snarkjs@0.7.1/build/snarkjs.min.js");
+
+const CACHE_NAME = "ezra-zk-artifacts";
+const CACHE_KEY_PREFIX = "/zk/sha256/";
+const WASM = "poseidon_preimage.wasm";
+const ZKEY = "poseidon_preimage.zkey";
+
+// Cache key (the hash, or the URL without one) -> Promise of the artifact's bytes
+const loaded = new Map();
+
+function hex(buffer) {
+  return [...new Uint8Array(buffer)].map(b => b.toString(16).padStart(2, "0")).join("");
+}
+
+async function fetchBytes(url) {
+  const res = await fetch(url);
+  if (!res.ok) throw new Error(`Failed to fetch ${url}: ${res.status}`);
+  return new Uint8Array(await res.arrayBuffer());
+}
+
+/**
+ * Bytes of an artifact, from Cache Storage if an earlier visit stored them, else from the
+ * network, checked against the hash and then stored.
+ */
+async function readArtifact({ url, sha256 }) {
+  if (!sha256 || !self.caches || !self.crypto?.subtle) return fetchBytes(url);
+
+  const cache = await caches.open(CACHE_NAME);
+  const key = CACHE_KEY_PREFIX + sha256;
+  const hit = await cache.match(key);
+  if (hit) return new Uint8Array(await hit.arrayBuffer());
+
+  const bytes = await fetchBytes(url);
+  if (hex(await crypto.subtle.digest("SHA-256", bytes)) !== sha256) {
+    throw new Error(`${url} does not match its published hash`);
+  }
+  await cache.put(key, new Response(bytes));
+  return bytes;
+}
+
+function artifact(asset) {
+  const key = asset.sha256 || asset.url;
+  if (!loaded.has(key)) {
+    const bytes = readArtifact(asset);
+    bytes.catch(() => loaded.delete(key));  // let the next proof try again
+    loaded.set(key, bytes);
+  }
+  return loaded.get(key);
+}
+
+/**
+ * Drop cached artifacts (in memory and in Cache Storage) that the page no longer lists.
+ */
+async function forgetOthers(assets) {
+  const current = Object.values(assets).map(asset => asset.sha256 || asset.url);
+  for (const key of loaded.keys()) {
+    if (!current.includes(key)) loaded.delete(key);
+  }
+  if (!self.caches) return;
+  const cache = await caches.open(CACHE_NAME);
+  for (const request of await cache.keys()) {
+    const sha256 = new URL(request.url).pathname.slice(CACHE_KEY_PREFIX.length);
+    if (!current.includes(sha256)) await cache.delete(request);
+  }
+}
+
+async function prove(assets, input) {
+  const [wasm, zkey] = await Promise.all([artifact(assets[WASM]), artifact(assets[ZKEY])]);
+  return snarkjs.groth16.fullProve(input, { type: "mem", data: wasm }, { type: "mem", data: zkey });
+}
+
+async function handle({ type, assets, input }) {
+  if (type === "warmup") {
+    await Promise.all([artifact(assets[WASM]), artifact(assets[ZKEY])]);
+    await forgetOthers(assets);
+    // The first proof builds snarkjs' curve, which the later ones reuse
+    if (input) await prove(assets, input);
+    return {};
+  }
+  if (type === "prove") {
+    const { proof, publicSignals } = await prove(assets, input);
+    return { proof, publicSignals };
+  }
+  throw new Error(`Unknown message type ${type}`);
+}
+
+self.onmessage = async event => {
+  const { id } = event.data;
+  try {
+    self.postMessage({ id, ...(await handle(event.data)) });
+  } catch (err) {
+    self.postMessage({ id, error: String(err && err.message || err) });
+  }
+};
@@ -10,10 +10,15 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   
     /**
-     * Fetch the Poseidon hash of the secret from the server.
+     * Poseidon hash of the secret as a decimal string, computed locally by poseidon.js.
+     * The server's /poseidon endpoint is only asked if that script didn't load.
      */
     async function computePoseidonHash(secretB64) {
-      const res = await fetch("/poseidon", {
+      if (window.poseidonHash) {
+        return window.poseidonHash([BigInt(base64ToBigIntDecimal(secretB64))]).toString();
+      }
+
+      const res = await window.fetchWithRetryAfter("/poseidon", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ secret_b64: secretB64 })
@@ -26,8 +31,95 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   
     /**
-     * Generates a Zero-Knowledge Proof from a base64 secret using snarkjs.
-     * Relies on static WASM and ZKey files being served via Flask.
+     * URL of a circuit artifact. The page lists the content-hashed (immutable) URLs;
+     * without them (build_zk.sh never ran) fall back to the plain /static copy.
+     */
+    function zkAssetUrl(name) {
+      const assets = window.EZRA_ZK_ASSETS || {};
+      return assets[name] || "/static/" + name;
+    }
+  
+    /**
+     * Name -> {url, sha256} for each circuit artifact; sha256 is missing without a manifest.
+     */
+    function zkAssets() {
+      const hashes = window.EZRA_ZK_ASSET_HASHES || {};
+      const assets = {};
+      for (const name of ["poseidon_preimage.wasm", "poseidon_preimage.zkey"]) {
+        assets[name] = { url: zkAssetUrl(name), sha256: hashes[name] };
+      }
+      return assets;
+    }
+
+    /**
+     * The proving worker (zk_prover_worker.js), started once and kept for the page's lifetime.
+     * run() resolves with the worker's reply, or rejects with `unavailable` set if the worker
+     * itself broke (e.g. it couldn't load snarkjs), in which case proofs go back to the main
+     * thread.
+     */
+    const prover = (() => {
+      let worker = null;
+      let nextId = 0;
+      const pending = new Map();
+
+      function fail(message) {
+        worker = null;
+        for (const { reject } of pending.values()) {
+          reject(Object.assign(new Error(message), { unavailable: true }));
+        }
+        pending.clear();
+      }
+
+      if (window.Worker) {
+        try {
+          worker = new Worker("/static/zk_prover_worker.js");
+          worker.onmessage = event => {
+            const { id, error, ...result } = event.data;
+            const call = pending.get(id);
+            if (!call) return;
+            pending.delete(id);
+            if (error) call.reject(new Error(error));
+            else call.resolve(result);
+          };
+          worker.onerror = event => {
+            event.preventDefault();
+            fail("Proving worker failed: " + (event.message || "could not start"));
+          };
+        } catch (err) {
+          worker = null;
+        }
+      }
+
+      return {
+        get available() { return worker !== null; },
+        run(message) {
+          if (!worker) return Promise.reject(Object.assign(new Error("No proving worker"), { unavailable: true }));
+          return new Promise((resolve, reject) => {
+            const id = nextId++;
+            pending.set(id, { resolve, reject });
+            worker.postMessage({ id, assets: zkAssets(), ...message });
+          });
+        }
+      };
+    })();
+
+    /**
+     * Loads the artifacts into the worker and runs one throwaway proof (of the secret 1), so
+     * the user's first proof doesn't wait for the download and setup. Runs once the page is idle.
+     */
+    function warmUpProver() {
+      if (!prover.available) return;
+      const input = window.poseidonHash
+        ? { x: "1", expected: window.poseidonHash([1n]).toString() }
+        : undefined;
+      prover.run({ type: "warmup", input }).catch(err => console.warn("Prover warm-up failed:", err.message));
+    }
+    (window.requestIdleCallback || (callback => setTimeout(callback, 0)))(warmUpProver);
+
+    /**
+     * Generates a Zero-Knowledge Proof from a base64 secret using snarkjs, in the proving
+     * worker when there is one and on the main thread otherwise.
+     * Relies on the WASM and ZKey files being served via Flask.
      */
     window.generateProof = async function(secretB64) {
       const secretInt = base64ToBigIntDecimal(secretB64);
@@ -37,14 +129,20 @@ document.addEventListener("DOMContentLoaded", () => {
         x: secretInt,
         expected: expected
       };
+
+      try {
+        const { proof, publicSignals } = await prover.run({ type: "prove", input });
+        return { proof, public: publicSignals };
+      } catch (err) {
+        if (!err.unavailable) throw err;
+      }
   
       const { proof, publicSignals } = await snarkjs.groth16.fullProve(
         input,
-        "/static/poseidon_preimage.wasm",
-        "/static/poseidon_preimage.zkey"
+        zkAssetUrl("poseidon_preimage.wasm"),
+        zkAssetUrl("poseidon_preimage.zkey")
       );
   
       return { proof, public: publicSignals };
     };
   });
-  
\ No newline at end of file
@@ -1,11 +1,15 @@
 # Ephemeral File Handling
 
-import io, os
-from zipfile import ZipFile
+import os, stat, struct, tempfile, zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 # Although it ruins the consistency of using os.path.* everywhere,
 # pathlib seems best for the following file manipulations compared to os.path
 from pathlib import Path 
-from typing import List
+from typing import BinaryIO, List, Iterator, NamedTuple, Optional, Tuple, Union
+
+# Read size for streaming .ezra containers back to clients
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
 
 
 def timestomp(files: List[Path]):
@@ -19,7 +23,17 @@ def timestomp(files: List[Path]):
             print(f"Failed to timestomp {file} with error: {e}")
 
 
-def pad_file_reasonably(path: Path):
+# Padding modes
+#   "fallocate": allocate real zeroed blocks with posix_fallocate (default)
+#   "write":     write zeros from one reusable buffer, for filesystems without fallocate
+#   "sparse":    ftruncate only. Fastest, but the hole shows up in st_blocks / `du`,
+#                which gives the real size away to anyone who can look at the disk
+PADDING_MODES = ("fallocate", "write", "sparse")
+PAD_CHUNK_SIZE = 1024 * 1024
+_ZERO_CHUNK = bytes(PAD_CHUNK_SIZE)
+
+
+def padded_size(size: int) -> int:
     """
     | .ezra Size | Padding Goal                    |
     |------------|---------------------------------|
@@ -27,33 +41,481 @@ def pad_file_reasonably(path: Path):
     | 1MB-10MB   | Round up to nearest MB          |
     | 10MB+      | Round up to nearest 5MB or 10MB |
     """
-    size = path.stat().st_size
     if size < 1 * 1024 * 1024:
-        target = 1 * 1024 * 1024
+        return 1 * 1024 * 1024
     elif size < 10 * 1024 * 1024:
-        target = ((size // (1024 * 1024)) + 1) * 1024 * 1024  # Round up to next MB
+        return ((size // (1024 * 1024)) + 1) * 1024 * 1024  # Round up to next MB
     else:
-        target = ((size // (5 * 1024 * 1024)) + 1) * 5 * 1024 * 1024  # Round to 5MB
-    pad_file_to_exact_size(path, target)
+        return ((size // (5 * 1024 * 1024)) + 1) * 5 * 1024 * 1024  # Round to 5MB
+
+
+def pad_file_reasonably(path: Path, mode: str = "fallocate") -> int:
+    """
+    Pad a file up to its size bucket (see padded_size).
+    Returns the real, unpadded length so the caller can record it and readers
+    never have to scan for where the padding starts.
+    """
+    size = path.stat().st_size
+    pad_file_to_exact_size(path, padded_size(size), mode=mode)
+    return size
 
-def pad_file_to_exact_size(path: Path, target_bytes: int = 100):
+def pad_file_to_exact_size(path: Path, target_bytes: int = 100, mode: str = "fallocate"):
     """
     Pad .ezrm and .ezrd files to consistent size (e.g. 100 Bytes)
+    Padding never builds a buffer proportional to the amount of padding.
     """
-    current = path.stat().st_size
-    if current < target_bytes:
-        with open(path, "ab") as f:
-            f.write(b'\x00' * (target_bytes - current))
+    if mode not in PADDING_MODES:
+        raise ValueError(f"Unknown padding mode: {mode}")
+
+    with open(path, "r+b") as f:
+        current = f.seek(0, os.SEEK_END)
+        if current >= target_bytes:
+            return
+
+        if mode == "fallocate" and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), current, target_bytes - current)
+                return
+            except OSError:
+                pass  # e.g. EOPNOTSUPP, fall back to writing zeros
+        elif mode == "sparse":
+            f.truncate(target_bytes)
+            return
+
+        zeros = memoryview(_ZERO_CHUNK)
+        remaining = target_bytes - current
+        while remaining > 0:
+            n = min(remaining, PAD_CHUNK_SIZE)
+            f.write(zeros[:n])
+            remaining -= n
     
 
-def create_ezra_archive(filepaths: list[Path]) -> bytes:
+def unpadded_length(path: Path, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> int:
     """
-    Given a list of file paths, create an in-memory ZIP archive containing them.
-    Returns the raw bytes of the zip archive.
+    Length of a padded file without its trailing zero bytes, found by scanning backwards
+    one chunk at a time. Only needed for uploads stored before their real length was recorded.
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - chunk_size)
+            f.seek(start)
+            chunk = f.read(end - start).rstrip(b'\x00')
+            if chunk:
+                return start + len(chunk)
+            end = start
+    return 0
+
+
+def iter_file_chunks(path: Path, length: int, chunk_size: int = DOWNLOAD_CHUNK_SIZE, offset: int = 0) -> Iterator[bytes]:
+    """
+    Yield `length` bytes of a file from `offset` on in chunks, so a response never holds the whole file.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+# .ezra containers
+#
+# Version 1 is iv (12 bytes) || AES-256-GCM(zip): one message over the whole archive, so
+# the browser had to hold all of it at once. Version 2 is split into segments that are
+# sealed and opened one at a time:
+#
+#   header    32 bytes, big-endian: magic "EZRA", version (2), flags (0), header size (32),
+#             segment size (u32), plaintext length (u64), nonce prefix (8 bytes), 4 zero bytes
+#   segments  AES-256-GCM of each `segment size` bytes of the archive, 16-byte tag appended.
+#             The last one holds the remainder; an empty archive is one empty segment.
+#
+# Segment i uses the nonce prefix || i (u32) as its nonce and the whole header as associated
+# data. Editing the header breaks every tag, swapping segments breaks their nonces, and
+# dropping segments from the end contradicts the authenticated length. The server has no
+# key: it checks that a container's header is well-formed and matches its size, after which
+# the exact length of a stored container is known without scanning for padding.
+# A version 1 container starts with a random IV, so it is told apart by the missing magic.
+
+CONTAINER_MAGIC = b"EZRA"
+CONTAINER_VERSION = 2
+_CONTAINER_HEADER = struct.Struct(">4sBBHIQ8s4x")
+CONTAINER_HEADER_SIZE = _CONTAINER_HEADER.size
+SEGMENT_TAG_SIZE = 16
+MIN_SEGMENT_SIZE = 4 * 1024
+MAX_SEGMENT_SIZE = 16 * 1024 * 1024
+# What the browser client writes
+DEFAULT_SEGMENT_SIZE = 1024 * 1024
+
+
+class ContainerError(ValueError):
+    """
+    A container that claims to be version 2 but is malformed.
+    """
+
+
+class ContainerHeader(NamedTuple):
+    segment_size: int
+    plaintext_length: int
+    nonce_prefix: bytes
+
+    @property
+    def segments(self) -> int:
+        return max(1, -(-self.plaintext_length // self.segment_size))
+
+    @property
+    def length(self) -> int:
+        """
+        Size of the whole container in bytes.
+        """
+        return CONTAINER_HEADER_SIZE + self.plaintext_length + self.segments * SEGMENT_TAG_SIZE
+
+    def segment_span(self, index: int) -> Tuple[int, int]:
+        """
+        (offset, length) of sealed segment `index` within the container.
+        """
+        if not 0 <= index < self.segments:
+            raise IndexError(f"segment {index} out of range")
+        start = CONTAINER_HEADER_SIZE + index * (self.segment_size + SEGMENT_TAG_SIZE)
+        return start, min(self.segment_size + SEGMENT_TAG_SIZE, self.length - start)
+
+    def nonce(self, index: int) -> bytes:
+        return self.nonce_prefix + index.to_bytes(4, "big")
+
+    def pack(self) -> bytes:
+        return _CONTAINER_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, 0, CONTAINER_HEADER_SIZE,
+                                      self.segment_size, self.plaintext_length, self.nonce_prefix)
+
+
+def parse_container_header(data: bytes) -> Optional[ContainerHeader]:
+    """
+    The header at the start of `data`, or None for a version 1 container.
+    Raises ContainerError if the magic is there but the rest doesn't add up.
+    """
+    if data[:len(CONTAINER_MAGIC)] != CONTAINER_MAGIC:
+        return None
+    if len(data) < CONTAINER_HEADER_SIZE:
+        raise ContainerError("truncated header")
+
+    _, version, flags, header_size, segment_size, plaintext_length, nonce_prefix = _CONTAINER_HEADER.unpack_from(data)
+    if version != CONTAINER_VERSION:
+        raise ContainerError(f"unsupported version {version}")
+    if flags or header_size != CONTAINER_HEADER_SIZE or any(data[CONTAINER_HEADER_SIZE - 4:CONTAINER_HEADER_SIZE]):
+        raise ContainerError("unsupported header fields")
+    if not MIN_SEGMENT_SIZE <= segment_size <= MAX_SEGMENT_SIZE:
+        raise ContainerError(f"segment size {segment_size} out of range")
+
+    header = ContainerHeader(segment_size, plaintext_length, nonce_prefix)
+    if header.segments > 1 << 32:
+        raise ContainerError("too many segments for the nonce counter")
+    return header
+
+
+def read_container_header(path: Path, offset: int = 0) -> Optional[ContainerHeader]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return parse_container_header(f.read(CONTAINER_HEADER_SIZE))
+
+
+def validate_container(path: Path) -> Optional[ContainerHeader]:
+    """
+    Check a received (unpadded) upload. Returns its header, or None for a version 1
+    container, which has no structure to check. Raises ContainerError if it's malformed.
+    """
+    header = read_container_header(path)
+    if header is not None:
+        size = Path(path).stat().st_size
+        if size != header.length:
+            raise ContainerError(f"container is {size} bytes, its header says {header.length}")
+    return header
+
+
+def container_length(path: Path) -> int:
+    """
+    Length of a stored container without its padding: from the header for version 2,
+    by scanning for trailing zeros for version 1.
     """
-    zip_buffer = io.BytesIO()
-    with ZipFile(zip_buffer, 'w') as zipf:
+    header = read_container_header(path)
+    return header.length if header is not None else unpadded_length(path)
+
+
+def iter_container_segments(path: Path, offset: int = 0) -> Iterator[Tuple[int, bytes, bytes]]:
+    """
+    Yield (index, nonce, sealed segment) for each segment of a version 2 container stored
+    at `offset`, reading one segment at a time.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        header = parse_container_header(f.read(CONTAINER_HEADER_SIZE))
+        if header is None:
+            raise ContainerError("not a version 2 container")
+        for index in range(header.segments):
+            start, length = header.segment_span(index)
+            f.seek(offset + start)
+            sealed = f.read(length)
+            if len(sealed) != length:
+                raise ContainerError(f"segment {index} is truncated")
+            yield index, header.nonce(index), sealed
+
+
+# Streaming ZIP archives
+#
+# The archive is written member by member and yielded as it's produced, so memory stays
+# bounded by a few chunks whatever the size of the inputs. Members are stored by default:
+# .ezra containers are ciphertext and don't compress. A stored member's file is read twice,
+# once for its CRC, so its local header carries the real CRC and sizes: streaming readers
+# can't find the end of a stored member that defers them to a data descriptor. With a
+# compression level, members are deflated. Serially, each member is streamed through zlib
+# with a trailing data descriptor, since its CRC and sizes are only known at the end, which
+# deflate's own end marker makes safe for any reader. With workers > 1, up to `workers`
+# members are deflated ahead in threads (zlib releases the GIL). Each one goes into a
+# spool file that moves to disk past ARCHIVE_SPOOL_SIZE. A member that didn't shrink is
+# stored instead. Members and archives past 2 GiB or 65535 entries use ZIP64 records.
+# Every member gets the same timestamp and permissions, so the archive reveals nothing
+# about the files besides their names and contents.
+
+ZIP64_LIMIT = (1 << 31) - 1
+ZIP_FILECOUNT_LIMIT = (1 << 16) - 1
+ARCHIVE_SPOOL_SIZE = 8 * 1024 * 1024
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_RECORD = struct.Struct("<IHHHHIIH")
+_END_RECORD64 = struct.Struct("<IQHHIIQQQQ")
+_END_LOCATOR64 = struct.Struct("<IIQI")
+_STORED, _DEFLATED = 0, 8
+_FLAG_DATA_DESCRIPTOR, _FLAG_UTF8 = 0x08, 0x800
+_DOS_TIME, _DOS_DATE = 0, (1 << 5) | 1  # 1980-01-01 00:00, the earliest a ZIP can record
+_EXTERNAL_ATTR = (stat.S_IFREG | 0o644) << 16
+_UNIX_VERSION = 3 << 8
+
+
+class _Member:
+    __slots__ = ("path", "name", "flags", "method", "crc", "size", "compressed_size", "offset", "spool", "zip64")
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        # The filename remains inside the archive, but is not leaked in storage
+        name = self.path.name
+        self.name = name.encode("utf-8")
+        self.flags = 0 if name.isascii() else _FLAG_UTF8
+        self.method = _STORED
+        self.crc = self.size = self.compressed_size = self.offset = 0
+        self.spool = None
+        # Whether the local header has a ZIP64 extra, which the central directory must repeat
+        self.zip64 = False
+
+
+def _stored_member(path: Path, chunk_size: int) -> _Member:
+    """
+    A member to be stored, with the CRC and size of its file computed up front.
+    """
+    member = _Member(path)
+    with open(member.path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            member.crc = zlib.crc32(chunk, member.crc)
+            member.size += len(chunk)
+    member.compressed_size = member.size
+    return member
+
+
+def _deflate_member(path: Path, level: int, chunk_size: int) -> _Member:
+    """
+    Deflate one file into a spool, for the parallel writer.
+    """
+    member = _Member(path)
+    member.spool = tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    try:
+        with open(member.path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                member.crc = zlib.crc32(chunk, member.crc)
+                member.size += len(chunk)
+                member.compressed_size += member.spool.write(compressor.compress(chunk))
+        member.compressed_size += member.spool.write(compressor.flush())
+    except BaseException:
+        member.spool.close()
+        raise
+    if member.compressed_size < member.size:
+        member.method = _DEFLATED
+        member.spool.seek(0)
+    else:
+        member.spool.close()
+        member.spool = None
+        member.compressed_size = member.size
+    return member
+
+
+class _ZipStream:
+    def __init__(self):
+        self.offset = 0
+        self.members = []
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def _local_header(self, member: _Member, zip64: bool) -> bytes:
+        member.offset = self.offset
+        member.zip64 = zip64
+        self.members.append(member)
+        if member.flags & _FLAG_DATA_DESCRIPTOR:
+            crc, size, compressed_size = 0, 0, 0
+        else:
+            crc, size, compressed_size = member.crc, member.size, member.compressed_size
+        extra = b""
+        if zip64:
+            extra = struct.pack("<HHQQ", 1, 16, size, compressed_size)
+            size = compressed_size = 0xFFFFFFFF
+        header = _LOCAL_HEADER.pack(0x04034b50, 45 if zip64 else 20, member.flags, member.method, _DOS_TIME,
+                                    _DOS_DATE, crc, compressed_size, size, len(member.name), len(extra))
+        return self._emit(header + member.name + extra)
+
+    def _file_data(self, member: _Member, chunk_size: int) -> Iterator[bytes]:
+        source = member.spool or open(member.path, "rb")
+        with source:
+            remaining = member.compressed_size
+            while remaining > 0:
+                chunk = source.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise OSError(f"{member.path} shrank while it was being archived")
+                remaining -= len(chunk)
+                yield self._emit(chunk)
+
+    def write_prepared(self, member: _Member, chunk_size: int) -> Iterator[bytes]:
+        """
+        A member whose CRC and sizes are known up front.
+        """
+        yield self._local_header(member, member.size > ZIP64_LIMIT)
+        yield from self._file_data(member, chunk_size)
+
+    def write_streamed(self, path: Path, level: int, chunk_size: int) -> Iterator[bytes]:
+        """
+        A member deflated on the fly, followed by a data descriptor.
+        """
+        member = _Member(path)
+        member.flags |= _FLAG_DATA_DESCRIPTOR
+        member.method = _DEFLATED
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        # Deflate can grow incompressible input slightly
+        zip64 = member.path.stat().st_size * 1.05 > ZIP64_LIMIT
+        yield self._local_header(member, zip64)
+
+        with open(member.path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                member.crc = zlib.crc32(chunk, member.crc)
+                member.size += len(chunk)
+                chunk = compressor.compress(chunk)
+                if chunk:
+                    member.compressed_size += len(chunk)
+                    yield self._emit(chunk)
+        tail = compressor.flush()
+        member.compressed_size += len(tail)
+        yield self._emit(tail)
+
+        if zip64:
+            descriptor = struct.pack("<IIQQ", 0x08074b50, member.crc, member.compressed_size, member.size)
+        elif max(member.size, member.compressed_size) > ZIP64_LIMIT:
+            raise OSError(f"{member.path} grew past the ZIP64 limit while it was being archived")
+        else:
+            descriptor = struct.pack("<IIII", 0x08074b50, member.crc, member.compressed_size, member.size)
+        yield self._emit(descriptor)
+
+    def finish(self) -> Iterator[bytes]:
+        """
+        The central directory and end records.
+        """
+        start = self.offset
+        for m in self.members:
+            # Sizes go in the ZIP64 extra whenever the local header put them there
+            zip64_sizes = m.zip64 or max(m.size, m.compressed_size) > ZIP64_LIMIT
+            fields = [m.size, m.compressed_size] if zip64_sizes else []
+            if m.offset > ZIP64_LIMIT:
+                fields.append(m.offset)
+            extra = struct.pack(f"<HH{len(fields)}Q", 1, 8 * len(fields), *fields) if fields else b""
+            version = 45 if fields else 20
+            size, compressed_size = (0xFFFFFFFF, 0xFFFFFFFF) if zip64_sizes else (m.size, m.compressed_size)
+            offset = 0xFFFFFFFF if m.offset > ZIP64_LIMIT else m.offset
+            header = _CENTRAL_HEADER.pack(0x02014b50, _UNIX_VERSION | version, version, m.flags, m.method,
+                                          _DOS_TIME, _DOS_DATE, m.crc, compressed_size, size,
+                                          len(m.name), len(extra), 0, 0, 0, _EXTERNAL_ATTR, offset)
+            yield self._emit(header + m.name + extra)
+
+        count, size = len(self.members), self.offset - start
+        if count > ZIP_FILECOUNT_LIMIT or size > ZIP64_LIMIT or start > ZIP64_LIMIT:
+            end64 = self.offset
+            yield self._emit(_END_RECORD64.pack(0x06064b50, 44, _UNIX_VERSION | 45, 45, 0, 0,
+                                                count, count, size, start))
+            yield self._emit(_END_LOCATOR64.pack(0x07064b50, 0, end64, 1))
+            count, size, start = min(count, 0xFFFF), min(size, 0xFFFFFFFF), min(start, 0xFFFFFFFF)
+        yield self._emit(_END_RECORD.pack(0x06054b50, 0, 0, count, count, size, start, 0))
+
+
+def iter_ezra_archive(filepaths: List[Path], compresslevel: int = None, workers: int = 1,
+                      chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of the given files chunk by chunk, never holding a whole file.
+    `compresslevel` None stores the members, 0-9 deflates them, with `workers` threads
+    compressing members ahead of the one being written.
+    """
+    stream = _ZipStream()
+    if compresslevel is None:
         for path in filepaths:
-            archive_name = path.name  # filename remains inside archive, but not leaked in storage
-            zipf.write(path, arcname=archive_name)
-    return zip_buffer.getvalue()
+            yield from stream.write_prepared(_stored_member(path, chunk_size), chunk_size)
+    elif workers <= 1:
+        for path in filepaths:
+            yield from stream.write_streamed(path, compresslevel, chunk_size)
+    else:
+        paths = iter(filepaths)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="archive") as pool:
+            try:
+                # At most `workers` members wait in spools, which bounds memory and disk use
+                for path in paths:
+                    pending.append(pool.submit(_deflate_member, path, compresslevel, chunk_size))
+                    if len(pending) == workers:
+                        break
+                while pending:
+                    member = pending.popleft().result()
+                    path = next(paths, None)
+                    if path is not None:
+                        pending.append(pool.submit(_deflate_member, path, compresslevel, chunk_size))
+                    yield from stream.write_prepared(member, chunk_size)
+            finally:
+                # Abandoned early (error, or the consumer stopped reading): drop the spools
+                for future in pending:
+                    if not future.cancel() and future.exception() is None:
+                        spool = future.result().spool
+                        if spool is not None:
+                            spool.close()
+    yield from stream.finish()
+
+
+def write_ezra_archive(filepaths: List[Path], out: Union[BinaryIO, int], compresslevel: int = None,
+                       workers: int = 1) -> int:
+    """
+    Write a ZIP archive of the given files to a binary file object or a file descriptor.
+    Returns the number of bytes written.
+    """
+    written = 0
+    for chunk in iter_ezra_archive(filepaths, compresslevel, workers):
+        if isinstance(out, int):
+            view = memoryview(chunk)
+            while view:
+                view = view[os.write(out, view):]
+        else:
+            out.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def create_ezra_archive(filepaths: list[Path], compresslevel: int = None, workers: int = 1) -> bytes:
+    """
+    Given a list of file paths, create an in-memory ZIP archive containing them.
+    Returns the raw bytes of the zip archive. Only for small archives; large ones
+    should be streamed with iter_ezra_archive or write_ezra_archive.
+    """
+    return b"".join(iter_ezra_archive(filepaths, compresslevel, workers))
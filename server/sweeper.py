@@ -0,0 +1,256 @@
+# In-process expiry sweeper
+#
+# A background thread that deletes uploads shortly after they expire, instead of waiting
+# for a cron run of cleanup_expired.py. Upcoming expiries are kept in a min-heap that is
+# filled from the indexed expires_at column one window at a time, so no pass ever scans the
+# whole table or lists the upload directory. New uploads that expire inside the current
+# window are pushed straight onto the heap and wake the thread if they are now the earliest.
+#
+# Due entries are deleted from the database only if their row is still expired (a row may
+# have been refreshed, re-created or already removed), and only the files of the rows
+# actually deleted are unlinked, in the same transaction. Uploads write their row under the
+# same lock, so a re-upload can't slip in between. Work is done in batches of at most
+# `batch_size` files so one busy second can't stall the thread, and a crash before the
+# commit just means the batch is retried.
+# Packed uploads (see packstore.py) have their slot zeroed and freed instead, and every
+# PACK_COMPACT_INTERVAL seconds the packs are compacted.
+#
+# Each refill also drops chunked-upload sessions older than UPLOAD_SESSION_TTL_HOURS, and any
+# staging (.part) file that old with no session behind it.
+
+import heapq
+import os
+import threading
+import time
+from pathlib import Path
+
+from packstore import PackStore, PACK_COMPACT_INTERVAL
+from paths import UPLOAD_DIR, upload_file_paths, staging_file_path
+from telemetry import log, FILES_EXPIRED, SESSIONS_EXPIRED, SWEEP_SECONDS
+
+SWEEPER_ENABLED = os.getenv("SWEEPER_ENABLED", "1") != "0"
+# How far ahead each refill reads from the index, in seconds
+SWEEPER_HORIZON = int(os.getenv("SWEEPER_HORIZON", 300))
+SWEEPER_BATCH_SIZE = int(os.getenv("SWEEPER_BATCH_SIZE", 256))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", 24))
+
+
+class ExpirySweeper:
+    def __init__(self, store, upload_dir: Path = UPLOAD_DIR, horizon: int = SWEEPER_HORIZON,
+                 batch_size: int = SWEEPER_BATCH_SIZE, session_ttl: int = UPLOAD_SESSION_TTL_HOURS * 3600,
+                 on_delete=None, packs: PackStore = None, compact_interval: int = PACK_COMPACT_INTERVAL):
+        self.store = store
+        self.upload_dir = Path(upload_dir)
+        self.packs = packs if packs is not None else PackStore(store, self.upload_dir)
+        self.compact_interval = compact_interval
+        self.horizon = max(1, horizon)
+        self.batch_size = max(1, batch_size)
+        self.session_ttl = session_ttl
+        # Called with each batch of deleted file_ids, e.g. to drop cached state about them
+        self.on_delete = on_delete
+
+        self._heap = []  # (expires_at, file_id)
+        self._queued = set()  # file_ids in the heap, so refills don't duplicate them
+        # Everything expiring at or before this is either on the heap or already gone
+        self._loaded_until = None
+        self._next_refill = 0
+        self._next_compact = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    # Scheduling
+
+    def _push(self, file_id: str, expires_at: int):
+        if file_id not in self._queued:
+            self._queued.add(file_id)
+            heapq.heappush(self._heap, (expires_at, file_id))
+
+    def schedule(self, file_id: str, expires_at: int):
+        """
+        Tell the sweeper about a new or changed expiry. Anything beyond the loaded window is
+        left to a later refill, which keeps the heap small.
+        """
+        with self._cond:
+            if self._loaded_until is None or expires_at > self._loaded_until:
+                return
+            self._push(file_id, expires_at)
+            if self._heap[0][1] == file_id:
+                self._cond.notify()
+
+    def refill(self, now: int):
+        """
+        Load the next window of expiries from the expires_at index.
+        """
+        cutoff = now + self.horizon
+        rows = self.store.expiring_before(cutoff, self.batch_size)
+        with self._cond:
+            for file_id, expires_at in rows:
+                self._push(file_id, expires_at)
+            if len(rows) == self.batch_size:
+                # Window truncated: trust it only up to the last row. Rows sharing its second
+                # may be missing, so read on once that second is due and its loaded rows are
+                # gone, otherwise the refill would just return the same rows again
+                self._loaded_until = rows[-1][1] - 1
+                self._next_refill = max(now, rows[-1][1])
+            else:
+                self._loaded_until = cutoff
+                self._next_refill = now + (self.horizon // 2 or 1)
+
+        self.sweep_sessions(now)
+
+    # Deleting
+
+    def _pop_due(self, now: int) -> list:
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                _, file_id = heapq.heappop(self._heap)
+                self._queued.discard(file_id)
+                due.append(file_id)
+        return due
+
+    def sweep_due(self, now: int) -> int:
+        """
+        Delete one batch of due files. Returns how many uploads were removed.
+        """
+        due = self._pop_due(now)
+        if not due:
+            return 0
+
+        with SWEEP_SECONDS.time(), self.store.transaction():
+            expired = self.store.delete_expired(due, now)
+            for file_id in expired:
+                log("CLEANUP", f"Expired: {file_id}", file_id=file_id)
+                for path in upload_file_paths(file_id, self.upload_dir):
+                    path.unlink(missing_ok=True)
+            self.packs.release(expired)
+        FILES_EXPIRED.inc(len(expired))
+        if expired and self.on_delete is not None:
+            self.on_delete(expired)
+        return len(expired)
+
+    def sweep_sessions(self, now: int) -> int:
+        """
+        Drop abandoned chunked-upload sessions along with their partial files.
+        """
+        stale = self.store.stale_session_ids(now - self.session_ttl)
+        for upload_id in stale:
+            log("CLEANUP", f"Abandoned upload session: {upload_id}", upload_id=upload_id)
+            staging_file_path(upload_id, self.upload_dir).unlink(missing_ok=True)
+            self.store.delete_session(upload_id)
+        SESSIONS_EXPIRED.inc(len(stale))
+        self.sweep_staging(now)
+        return len(stale)
+
+    def sweep_staging(self, now: int) -> int:
+        """
+        Remove staging files that outlived session_ttl without a session: left behind by a
+        crash during a plain upload or a finalize. Only the top of upload_dir is listed,
+        which holds the staging files next to the shard and pack directories.
+        """
+        cutoff = now - self.session_ttl
+        removed = 0
+        with os.scandir(self.upload_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".part") or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                if self.store.get_session(entry.name[:-len(".part")]) is not None:
+                    continue
+                log("CLEANUP", f"Orphaned staging file: {entry.name}")
+                Path(entry.path).unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def compact_packs(self, now: int) -> int:
+        """
+        Compact the pack files if the last compaction is compact_interval seconds old.
+        """
+        if now < self._next_compact:
+            return 0
+        self._next_compact = now + self.compact_interval
+        moved = self.packs.compact()
+        if moved:
+            log("PACK", f"Compaction moved {moved} upload(s)", moved=moved)
+        return moved
+
+    def sweep_all(self, now: int = None) -> int:
+        """
+        One-shot cleanup of everything already expired, for cron and manual runs.
+        """
+        now = int(time.time()) if now is None else now
+        removed = 0
+        while True:
+            self.refill(now)
+            swept = 0
+            while True:
+                batch = self.sweep_due(now)
+                if not batch and not self._has_due(now):
+                    break
+                swept += batch
+            removed += swept
+            if self._loaded_until is None or self._loaded_until >= now:
+                self.compact_packs(now)
+                return removed
+
+    def _has_due(self, now: int) -> bool:
+        with self._cond:
+            return bool(self._heap) and self._heap[0][0] <= now
+
+    # Background thread
+
+    def _wait_time(self, now: float) -> float:
+        with self._cond:
+            wake = self._next_refill
+            if self._heap:
+                wake = min(wake, self._heap[0][0])
+        return max(0.0, wake - now)
+
+    def run(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+            delay = None
+            try:
+                now = int(time.time())
+                if now >= self._next_refill:
+                    self.refill(now)
+                while self.sweep_due(now) or self._has_due(now):
+                    pass
+                self.compact_packs(now)
+            except Exception as e:
+                # Keep sweeping; the failed batch is picked up again by the next refill
+                log("!", f"Sweeper error: {e}")
+                with self._cond:
+                    self._next_refill = int(time.time()) + 5
+                delay = 5
+
+            with self._cond:
+                if self._stopping:
+                    return
+                if delay is None:
+                    delay = self._wait_time(time.time())
+                if delay > 0:
+                    # expires_at has one-second resolution; the slack avoids waking just short of it
+                    self._cond.wait(timeout=min(self.horizon, delay + 0.05))
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run, name="expiry-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
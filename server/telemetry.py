@@ -0,0 +1,428 @@
+# Metrics and structured logging
+#
+# Counters and histograms for the hot paths, rendered in the Prometheus text format at
+# /metrics. A timed stage costs one lock and a bisect over the bucket bounds, a few
+# microseconds against requests that take milliseconds, so instrumentation stays on all the
+# time. Only the endpoint is opt-in (METRICS_ENABLED), since the numbers reveal traffic levels.
+#
+# Each process counts for itself. Under gunicorn, a scrape reaches only one worker. Set
+# METRICS_DIR to a directory the workers share: each worker then writes a snapshot there
+# every METRICS_FLUSH_INTERVAL seconds, and the worker answering a scrape adds the other
+# workers' snapshots to its own live values. Counters don't go backwards when a worker is
+# recycled: once an exited worker's snapshot is METRICS_RETIRE_AFTER seconds old, the next
+# scrape folds its counters and histograms into retired.json, one cumulative file for all
+# exited workers, and deletes it. Their gauges are dropped.
+#
+# log() replaces bare print() for server events. LOG_FORMAT=text keeps the "[TAG] message"
+# lines; LOG_FORMAT=json prints one JSON object per line with the fields as keys.
+
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+# Age after which the snapshot of a worker that is no longer running is folded into retired.json
+METRICS_RETIRE_AFTER = float(os.getenv("METRICS_RETIRE_AFTER", 300))
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# Seconds; request stages range from sub-millisecond hashing to multi-second padding
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def log(tag: str, message: str, **fields):
+    """
+    Log a server event: "[TAG] message" in text mode, a JSON line with `fields` in json mode.
+    Tag "!" marks a warning.
+    """
+    if LOG_FORMAT == "json":
+        record = {
+            "ts": round(time.time(), 3),
+            "level": "warning" if tag == "!" else "info",
+            "event": "warning" if tag == "!" else tag.lower(),
+            "msg": message,
+            "pid": os.getpid(),
+            **fields,
+        }
+        print(json.dumps(record, default=str), flush=True)
+    else:
+        print(f"[{tag}] {message}")
+
+
+# Metric types
+
+REGISTRY = []
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # per bucket, the last one is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return [list(self.counts), self.sum]
+
+
+class Metric(ABC):
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), registry: list = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.append(self)
+
+    @abstractmethod
+    def snapshot(self) -> list:
+        """
+        [[label values, value], ...] for every set of label values seen so far.
+        """
+
+
+class _LabeledMetric(Metric):
+    """
+    A metric that keeps one child per set of label values, made by _new_child().
+    """
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), registry: list = REGISTRY):
+        self._children = {}
+        self._lock = threading.Lock()
+        super().__init__(name, documentation, labelnames, registry)
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        The child for a set of label values that hasn't been seen yet.
+        """
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def snapshot(self) -> list:
+        return [[list(key), child.snapshot()] for key, child in list(self._children.items())]
+
+
+class Counter(_LabeledMetric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Histogram(_LabeledMetric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+
+class Gauge(Metric):
+    """
+    A value read from `fn` at scrape time, e.g. a cache size.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, fn, registry=REGISTRY):
+        self.fn = fn
+        super().__init__(name, documentation, registry=registry)
+
+    def snapshot(self) -> list:
+        try:
+            return [[[], float(self.fn())]]
+        except Exception:
+            return []
+
+
+# Metrics of the hot paths
+
+REQUEST_SECONDS = Histogram("ezra_request_seconds", "Time spent in a request handler", ("route", "status"))
+STAGE_SECONDS = Histogram("ezra_stage_seconds", "Time spent in one stage of /upload or /download", ("route", "stage"))
+VERIFY_SECONDS = Histogram("ezra_verify_seconds", "Groth16 verification time", ("backend", "result"))
+HASH_SECONDS = Histogram("ezra_hash_seconds", "Poseidon hashing time per call", ("kind",))
+UPLOADS = Counter("ezra_uploads_total", "Uploads stored")
+BYTES_STORED = Counter("ezra_bytes_stored_total", "Ciphertext bytes stored, before padding")
+DOWNLOADS = Counter("ezra_downloads_total", "Downloads served", ("format",))
+FILES_EXPIRED = Counter("ezra_files_expired_total", "Uploads deleted by the expiry sweeper")
+SESSIONS_EXPIRED = Counter("ezra_upload_sessions_expired_total", "Abandoned chunked-upload sessions removed")
+REQUESTS_SHED = Counter("ezra_requests_shed_total", "Requests refused by admission control", ("route", "reason"))
+SWEEP_SECONDS = Histogram("ezra_sweep_seconds", "Time to delete one batch of expired uploads")
+
+
+def stage(route: str, name: str) -> _Timer:
+    """
+    `with stage("upload", "pad"): ...` times one stage into ezra_stage_seconds.
+    """
+    return STAGE_SECONDS.labels(route=route, stage=name).time()
+
+
+# Rendering
+
+def snapshot(registry: list = REGISTRY) -> dict:
+    return {m.name: m.snapshot() for m in registry}
+
+
+def _merge(into: dict, other: dict, include_gauges: bool, registry: list = REGISTRY):
+    kinds = {m.name: m.kind for m in registry}
+    for name, samples in other.items():
+        kind = kinds.get(name)
+        if kind is None or (kind == "gauge" and not include_gauges):
+            continue
+        merged = {tuple(key): value for key, value in into.get(name, [])}
+        for key, value in samples:
+            key = tuple(key)
+            if key not in merged:
+                merged[key] = value
+            elif kind == "histogram":
+                counts, total = merged[key]
+                merged[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+            else:
+                merged[key] = merged[key] + value
+        into[name] = [[list(key), value] for key, value in merged.items()]
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(data: dict = None, registry: list = REGISTRY) -> str:
+    """
+    The Prometheus text exposition of `data` (default: this process, plus the other
+    workers' snapshots when METRICS_DIR is set).
+    """
+    data = collect(registry) if data is None else data
+    lines = []
+    for metric in registry:
+        samples = data.get(metric.name, [])
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, value in sorted(samples):
+            if metric.kind == "histogram":
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(metric.bounds + (float("inf"),), counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{float(bound)!r}"'
+                    lines.append(f"{metric.name}_bucket{_format_labels(metric.labelnames, key, le)} {cumulative}")
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f"{metric.name}_sum{labels} {_format_value(float(total))}")
+                lines.append(f"{metric.name}_count{labels} {cumulative}")
+            else:
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, key)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# Multi-process snapshots
+
+RETIRED_SNAPSHOT = "retired.json"
+
+# The process that last wrote a snapshot; a new process finding its pid's file left by an
+# exited one folds it before overwriting it
+_snapshot_writer_pid = None
+
+
+def _snapshot_path() -> Path:
+    return Path(METRICS_DIR) / f"{os.getpid()}.json"
+
+
+def _write_json(path: Path, data: dict):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def write_snapshot(registry: list = REGISTRY):
+    global _snapshot_writer_pid
+    path = _snapshot_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if _snapshot_writer_pid != os.getpid():
+        retire_snapshot(path, registry)
+        _snapshot_writer_pid = os.getpid()
+    _write_json(path, snapshot(registry))
+
+
+def _pid_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # someone else's process
+    return True
+
+
+def retire_snapshot(path: Path, registry: list = REGISTRY):
+    """
+    Add an exited worker's counters and histograms to retired.json and delete its snapshot.
+    Workers fold under a lock file, so two scrapes never count the same snapshot twice.
+    """
+    directory = path.parent
+    with open(directory / "retired.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path) as f:
+                exited = json.load(f)
+        except FileNotFoundError:
+            return  # already folded by another worker
+        except ValueError:
+            exited = {}
+        retired_path = directory / RETIRED_SNAPSHOT
+        try:
+            with open(retired_path) as f:
+                retired = json.load(f)
+        except (FileNotFoundError, ValueError):
+            retired = {}
+        _merge(retired, exited, False, registry)
+        _write_json(retired_path, retired)
+        path.unlink()
+
+
+def _retire_exited(directory: Path, now: float, registry: list):
+    for path in directory.glob("*.json"):
+        if not path.stem.isdigit() or int(path.stem) == os.getpid():
+            continue
+        try:
+            stale = now - path.stat().st_mtime >= METRICS_RETIRE_AFTER
+        except OSError:
+            continue
+        # A live worker rewrites its snapshot every METRICS_FLUSH_INTERVAL; the pid check
+        # also keeps the snapshot of a worker that is merely stuck
+        if stale and not _pid_running(int(path.stem)):
+            retire_snapshot(path, registry)
+
+
+def collect(registry: list = REGISTRY) -> dict:
+    data = snapshot(registry)
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return data
+    now = time.time()
+    try:
+        _retire_exited(Path(METRICS_DIR), now, registry)
+    except OSError as e:
+        log("!", f"Could not fold exited workers' metrics: {e}")
+    own = _snapshot_path().name
+    with open(Path(METRICS_DIR) / "retired.lock", "a") as lock:
+        # Shared, so no snapshot is folded away between reading retired.json and reading it
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        for path in Path(METRICS_DIR).glob("*.json"):
+            if path.name == own:
+                continue
+            try:
+                with open(path) as f:
+                    other = json.load(f)
+                fresh = now - path.stat().st_mtime < 3 * METRICS_FLUSH_INTERVAL
+            except (OSError, ValueError):
+                continue
+            _merge(data, other, fresh, registry)
+    return data
+
+
+class SnapshotWriter:
+    """
+    Writes this process's snapshot to METRICS_DIR periodically and once more on stop.
+    """
+    def __init__(self, interval: float = METRICS_FLUSH_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                write_snapshot()
+            except OSError as e:
+                log("!", f"Could not write metrics snapshot: {e}")
+
+    def start(self):
+        if not METRICS_DIR or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(5)
+        self._thread = None
+        try:
+            write_snapshot()
+        except OSError:
+            pass
+
+
+snapshot_writer = SnapshotWriter()
@@ -0,0 +1,11 @@
+# Production entry point:
+#
+#   cd server && gunicorn -c gunicorn.conf.py wsgi:app
+#
+# With preload_app the parent imports this module once: the app is built, the schema is
+# applied and the verifier inputs are parsed before any worker is forked. This is the only
+# place an app is built at import; async_app.py serves this same one.
+from app import create_app, preload
+
+app = create_app()
+preload()
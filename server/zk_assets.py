@@ -0,0 +1,231 @@
+# Immutable circuit artifacts
+#
+# The browser downloads the proving artifacts (poseidon_preimage.wasm and .zkey) before it
+# can build a proof. They are megabytes in size and only change when the circuit is
+# rebuilt. Under /static they get Flask's default caching, so every visit revalidates them
+# and a rebuild can leave browsers with a stale mix of wasm and zkey.
+#
+# `python3 server/zk_assets.py` (run by build_zk.sh) copies each artifact to
+# static/zk/<name>.<hash>.<ext>, where the name includes a prefix of its SHA-256. The hash in
+# the URL means the content at a URL never changes, so /zk/ serves them with a one-year
+# `immutable` Cache-Control and the browser never asks again. A rebuild produces new
+# URLs. Next to each copy it writes a gzip variant, plus a brotli variant when the
+# brotli package is installed. It also writes manifest.json, which maps each artifact to
+# its hashed file. The index page reads the manifest to tell zkp_logic.js which URLs to
+# fetch, and their hashes, under which the browser's prover (zk_prover_worker.js) keeps
+# them in Cache Storage. Without a manifest (build_zk.sh never ran), the page falls back to
+# the /static URLs and the prover only relies on the HTTP cache.
+#
+# Range requests (and If-Range) are answered from the identity file, so an interrupted
+# download can resume. Full downloads get the smallest variant the client accepts.
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+from flask import abort, request, send_file
+
+from paths import STATIC_DIR, ZK_ASSET_DIR, ZK_ASSET_MANIFEST
+
+try:
+    import brotli
+except ImportError:  # optional; artifacts are still served gzipped
+    brotli = None
+
+ARTIFACT_NAMES = ("poseidon_preimage.wasm", "poseidon_preimage.zkey")
+URL_PREFIX = "/zk/"
+HASH_LENGTH = 16  # hex characters of the SHA-256 kept in the file name
+MAX_AGE = 365 * 24 * 3600
+
+# Built once per circuit, so spend the CPU on the smallest output
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+MIMETYPES = {".wasm": "application/wasm", ".zkey": "application/octet-stream"}
+
+
+# Building
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def hashed_name(name: str, digest: str) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def build_assets(source_dir: Path = STATIC_DIR, out_dir: Path = ZK_ASSET_DIR, prune: bool = False) -> dict:
+    """
+    Write the hashed copies, their compressed variants and manifest.json to `out_dir`.
+    Returns the manifest. Artifacts missing from `source_dir` are skipped.
+    """
+    source_dir, out_dir = Path(source_dir), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+
+    for name in ARTIFACT_NAMES:
+        source = source_dir / name
+        if not source.is_file():
+            print(f"[!] {source} not found, skipping")
+            continue
+        digest = _sha256_file(source)
+        filename = hashed_name(name, digest)
+        target = out_dir / filename
+        data = source.read_bytes()
+        encodings = []
+
+        if not target.is_file():
+            _write_atomic(target, data)
+        compressed = gzip.compress(data, GZIP_LEVEL, mtime=0)  # mtime=0 keeps the bytes stable
+        if len(compressed) < len(data):
+            _write_atomic(out_dir / (filename + ".gz"), compressed)
+            encodings.append("gzip")
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+            if len(compressed) < len(data):
+                _write_atomic(out_dir / (filename + ".br"), compressed)
+                encodings.append("br")
+
+        manifest[name] = {"file": filename, "sha256": digest, "size": len(data), "encodings": encodings}
+        print(f"[+] {name} -> {filename} ({', '.join(['identity', *encodings])})")
+
+    # The manifest goes last, so the page never points at files that aren't written yet
+    _write_atomic(out_dir / "manifest.json", json.dumps(manifest, indent=2).encode())
+
+    if prune:
+        keep = {"manifest.json"}
+        for entry in manifest.values():
+            keep.add(entry["file"])
+            keep.update(entry["file"] + suffix for _, suffix in ENCODINGS)
+        for path in out_dir.iterdir():
+            if path.is_file() and path.name not in keep:
+                path.unlink()
+                print(f"[-] Removed {path.name}")
+    return manifest
+
+
+# Serving
+
+_manifest_lock = threading.Lock()
+_manifest_cache = (None, None, {})  # (path, mtime_ns, manifest)
+
+
+def load_manifest(path: Path) -> dict:
+    """
+    The parsed manifest, or {} if there is none. Re-read only when the file changes.
+    """
+    global _manifest_cache
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    cached_path, cached_mtime, manifest = _manifest_cache
+    if cached_path == path and cached_mtime == mtime:
+        return manifest
+    with _manifest_lock:
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        _manifest_cache = (path, mtime, manifest)
+        return manifest
+
+
+def asset_urls() -> dict:
+    """
+    Artifact name -> the URL the client should fetch it from.
+    """
+    manifest = load_manifest(ZK_ASSET_MANIFEST)
+    return {
+        name: URL_PREFIX + manifest[name]["file"] if name in manifest else f"/static/{name}"
+        for name in ARTIFACT_NAMES
+    }
+
+
+def asset_hashes() -> dict:
+    """
+    Artifact name -> SHA-256 of its content, for the artifacts in the manifest. The browser's
+    prover keeps its cached copies under these.
+    """
+    manifest = load_manifest(ZK_ASSET_MANIFEST)
+    return {name: manifest[name]["sha256"] for name in ARTIFACT_NAMES if name in manifest}
+
+
+def _negotiate(encodings) -> str:
+    if request.range is not None:
+        return "identity"  # byte ranges always refer to the identity file
+    accepted = request.accept_encodings
+    best, best_quality = "identity", 0
+    for encoding, _ in ENCODINGS:
+        if encoding not in encodings:
+            continue
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def serve_asset(filename: str):
+    """
+    Respond with a hashed artifact listed in the manifest, or 404.
+    """
+    manifest = load_manifest(ZK_ASSET_MANIFEST)
+    entry = next((e for e in manifest.values() if e["file"] == filename), None)
+    if entry is None:
+        abort(404)
+
+    encoding = _negotiate(entry["encodings"])
+    suffix = dict(ENCODINGS).get(encoding, "")
+    path = ZK_ASSET_DIR / (filename + suffix)
+    if not path.is_file():
+        abort(404)
+
+    # The content hash is the ETag; variants get their own, as the bytes differ
+    etag = entry["sha256"][:32] + suffix.replace(".", "-")
+    mimetype = MIMETYPES.get(os.path.splitext(filename)[1], "application/octet-stream")
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True, max_age=MAX_AGE)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers["Accept-Ranges"] = "bytes"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write content-hashed copies of the circuit artifacts")
+    parser.add_argument("--source", type=Path, default=STATIC_DIR, help="directory with the built artifacts")
+    parser.add_argument("--out", type=Path, default=ZK_ASSET_DIR, help="output directory")
+    parser.add_argument("--prune", action="store_true", help="delete files of earlier builds")
+    args = parser.parse_args(argv)
+    manifest = build_assets(args.source, args.out, args.prune)
+    if not manifest:
+        print("[!] No artifacts found; run build_zk.sh first")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,11 +2,66 @@ import subprocess
 import os
 import random
 import json
+import queue
+import select
+import threading
+import atexit
+import hashlib
+import time
+from collections import OrderedDict
+
+from functools import lru_cache
+
+from poseidon import poseidon, load_constants
+from paths import NODE_MODULES_DIR, VERIFICATION_KEY_PATH, ZK_WORKER_PATH
+from telemetry import log, HASH_SECONDS, VERIFY_SECONDS
 
 ARTIFACTS_PATH =  os.path.abspath(os.path.join(os.path.dirname( __file__ ), "..", "artifacts"))
 
-def poseidon_hash(secret: int) -> int:
-    # Uses circomlibjs' async Poseidon factory
+# "worker" keeps resident Node verifiers around, "cli" spawns `snarkjs groth16 verify` per proof
+ZK_VERIFIER = os.getenv("ZK_VERIFIER", "worker")
+ZK_VERIFIER_WORKERS = int(os.getenv("ZK_VERIFIER_WORKERS", 2))
+ZK_VERIFIER_TIMEOUT = float(os.getenv("ZK_VERIFIER_TIMEOUT", 30))
+# Verified-proof cache; size 0 disables it
+PROOF_CACHE_SIZE = int(os.getenv("PROOF_CACHE_SIZE", 4096))
+PROOF_CACHE_TTL = float(os.getenv("PROOF_CACHE_TTL", 600))
+
+
+class ZKEngineError(RuntimeError):
+    """
+    Raised when a verification engine breaks (crash, timeout, garbled reply).
+    An invalid proof is not an engine error, it just verifies as False.
+    """
+
+
+def node_env() -> dict:
+    node_path = os.pathsep.join(p for p in (str(NODE_MODULES_DIR), os.environ.get("NODE_PATH", "")) if p)
+    return {**os.environ, "NODE_PATH": node_path}
+
+
+_HASH_SINGLE = HASH_SECONDS.labels(kind="single")
+_HASH_BATCH = HASH_SECONDS.labels(kind="batch")
+
+
+def poseidon_hash(secret: int) -> str:
+    """
+    Poseidon(secret) as a decimal string, computed in-process.
+    Bit-identical to circomlibjs, see poseidon_hash_node() for the reference.
+    """
+    with _HASH_SINGLE.time():
+        return str(poseidon([secret]))
+
+
+def poseidon_hash_batch(secrets: list) -> list:
+    """
+    Poseidon hashes for many secrets at once, in order.
+    """
+    with _HASH_BATCH.time():
+        return [str(poseidon([secret])) for secret in secrets]
+
+
+def poseidon_hash_node(secret: int) -> str:
+    # Reference implementation: circomlibjs' async Poseidon factory, one Node process per call
     script = f"""
     (async () => {{
         const circomlib = require("circomlibjs");
@@ -33,3 +88,340 @@ def poseidon_hash(secret: int) -> int:
         print("stderr:", e.stderr)
         raise
 
+
+class ZKWorker:
+    """
+    A single resident zk_worker.js process speaking newline-delimited JSON over stdin/stdout.
+    Only one request is in flight at a time; VerifierPool hands each worker to one caller.
+    The process is (re)started lazily, so a crashed worker costs one failed request.
+    """
+    def __init__(self, command: list, timeout: float = ZK_VERIFIER_TIMEOUT):
+        self.command = command
+        self.timeout = timeout
+        self.proc = None
+        self._next_id = 0
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        self.close()
+        try:
+            self.proc = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                bufsize=1,
+                env=node_env()
+            )
+        except OSError as e:
+            raise ZKEngineError(f"Could not start ZK worker: {e}") from e
+
+        if not self._read().get("ready"):
+            self.close()
+            raise ZKEngineError("ZK worker did not report ready")
+
+    def request(self, op: str, **payload):
+        if not self.alive():
+            self.start()
+
+        self._next_id += 1
+        message = {"id": self._next_id, "op": op, **payload}
+        try:
+            self.proc.stdin.write(json.dumps(message) + "\n")
+            self.proc.stdin.flush()
+        except OSError as e:
+            self.close()
+            raise ZKEngineError(f"ZK worker pipe closed: {e}") from e
+
+        reply = self._read()
+        if reply.get("id") != message["id"]:
+            self.close()
+            raise ZKEngineError("ZK worker replied out of order")
+        if not reply.get("ok"):
+            raise ZKEngineError(f"ZK worker error: {reply.get('error')}")
+        return reply.get("result")
+
+    def _read(self) -> dict:
+        readable, _, _ = select.select([self.proc.stdout], [], [], self.timeout)
+        if not readable:
+            self.close()
+            raise ZKEngineError(f"ZK worker timed out after {self.timeout}s")
+
+        line = self.proc.stdout.readline()
+        if not line:
+            self.close()
+            raise ZKEngineError("ZK worker exited unexpectedly")
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            self.close()
+            raise ZKEngineError(f"ZK worker sent garbage: {line!r}") from e
+
+    def close(self):
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+            proc.wait()
+        finally:
+            proc.stdout.close()
+
+
+class VerifierPool:
+    """
+    Fixed-size pool of ZKWorkers. The verification key is parsed once per worker at startup
+    instead of once per download, and no process is spawned on the hot path.
+    """
+    def __init__(self, size: int = ZK_VERIFIER_WORKERS, command: list = None, timeout: float = ZK_VERIFIER_TIMEOUT):
+        self.command = command or ["node", str(ZK_WORKER_PATH), str(VERIFICATION_KEY_PATH)]
+        self.workers = [ZKWorker(self.command, timeout) for _ in range(max(1, size))]
+        # LIFO so a warm worker is preferred over one that may still need starting
+        self._idle = queue.LifoQueue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def request(self, op: str, **payload):
+        worker = self._idle.get()
+        try:
+            return worker.request(op, **payload)
+        finally:
+            self._idle.put(worker)
+
+    def verify(self, proof: dict, public: list) -> bool:
+        return bool(self.request("verify", proof=proof, public=public))
+
+    def verify_batch(self, items: list) -> list:
+        """
+        Verify many {"proof": ..., "public": ...} items in one round trip.
+        The worker combines them into a single randomized pairing check. If the batch
+        request itself fails, each item is verified on its own instead.
+        """
+        if not items:
+            return []
+        try:
+            results = self.request("verify_batch", items=items)
+            if not isinstance(results, list) or len(results) != len(items):
+                raise ZKEngineError("ZK worker returned a malformed batch result")
+        except ZKEngineError as e:
+            log("!", f"Batch verification failed, verifying {len(items)} proof(s) one by one: {e}")
+            return [self.verify(item["proof"], item["public"]) for item in items]
+        return [bool(r) for r in results]
+
+    def warm_up(self):
+        """
+        Start every worker now rather than on first use.
+        """
+        for worker in self.workers:
+            if not worker.alive():
+                worker.start()
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+_verifier_pool = None
+_verifier_pool_lock = threading.Lock()
+
+
+def get_verifier_pool() -> VerifierPool:
+    global _verifier_pool
+    if _verifier_pool is None:
+        with _verifier_pool_lock:
+            if _verifier_pool is None:
+                _verifier_pool = VerifierPool()
+                atexit.register(_verifier_pool.close)
+    return _verifier_pool
+
+
+def close_verifier_pool():
+    """
+    Stop this process's Node workers, if it started any.
+    """
+    global _verifier_pool
+    with _verifier_pool_lock:
+        pool, _verifier_pool = _verifier_pool, None
+    if pool is not None:
+        pool.close()
+
+
+@lru_cache(maxsize=None)
+def load_verification_key() -> dict:
+    with open(VERIFICATION_KEY_PATH) as f:
+        return json.load(f)
+
+
+def preload_verifier():
+    """
+    Parse the verification key and the Poseidon constants now, so a bad key fails at startup
+    and forked workers inherit the parsed constants instead of each building them.
+    """
+    load_verification_key()
+    load_constants(2)
+
+
+def proof_digest(proof, public) -> str:
+    """
+    Stable digest of a proof and its public signals, independent of JSON key order and spacing.
+    """
+    canonical = json.dumps([proof, public], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ProofCache:
+    """
+    Bounded LRU of proof digest -> verification result, so a client retrying /download with
+    the same proof doesn't pay for another pairing check. Entries also expire after `ttl`
+    seconds and can be dropped per file_id when the file expires or is consumed.
+    Engine failures are never cached, only True/False results.
+    """
+    def __init__(self, size: int = PROOF_CACHE_SIZE, ttl: float = PROOF_CACHE_TTL, clock=time.monotonic):
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # digest -> (valid, file_id, expires)
+        self._by_file = {}  # file_id -> set of digests
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, digest: str):
+        """
+        The cached result for a digest, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[2] <= self.clock():
+                self._remove(digest)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, digest: str, file_id: str, valid: bool):
+        if self.size <= 0:
+            return
+        with self._lock:
+            if digest in self._entries:
+                self._remove(digest)
+            self._entries[digest] = (bool(valid), file_id, self.clock() + self.ttl)
+            self._by_file.setdefault(file_id, set()).add(digest)
+            while len(self._entries) > self.size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, digest: str):
+        _, file_id, _ = self._entries.pop(digest)
+        digests = self._by_file.get(file_id)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_file[file_id]
+
+    def evict_files(self, file_ids: list):
+        """
+        Forget every result for these files, e.g. once they are deleted or consumed.
+        """
+        with self._lock:
+            for file_id in file_ids:
+                for digest in list(self._by_file.get(file_id, ())):
+                    self._remove(digest)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_file.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _write_and_close(fd: int, data: bytes):
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+    except BrokenPipeError:
+        # The reader exited without reading everything; its exit status tells the story
+        pass
+
+
+def _json_pipe(value) -> int:
+    """
+    A pipe whose read end yields `value` as JSON. The write happens on a thread so a payload
+    larger than the pipe buffer can't block the caller.
+    """
+    read_fd, write_fd = os.pipe()
+    threading.Thread(target=_write_and_close, args=(write_fd, json.dumps(value).encode()), daemon=True).start()
+    return read_fd
+
+
+def verify_proof_cli(proof: dict, public: list) -> bool:
+    """
+    Reference verifier: one `snarkjs groth16 verify` process per proof.
+    The proof and public signals reach snarkjs through pipes (/dev/fd/N), never through files,
+    so concurrent calls can't see each other's inputs and nothing touches the disk.
+    """
+    proof_fd = _json_pipe(proof)
+    public_fd = _json_pipe(public)
+    try:
+        subprocess.run([
+            "snarkjs", "groth16", "verify",
+            str(VERIFICATION_KEY_PATH),
+            f"/dev/fd/{public_fd}",
+            f"/dev/fd/{proof_fd}"
+        ], check=True, pass_fds=(proof_fd, public_fd), timeout=ZK_VERIFIER_TIMEOUT)
+    except subprocess.CalledProcessError:
+        return False
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise ZKEngineError(f"snarkjs verify failed to run: {e}") from e
+    finally:
+        # Closing the read ends also unblocks any writer the child never drained
+        os.close(proof_fd)
+        os.close(public_fd)
+    return True
+
+
+def verify_proof(proof: dict, public: list) -> bool:
+    """
+    Check a Groth16 proof against the server's verification key.
+    Returns False for an invalid proof and raises if the engine itself fails.
+    """
+    start = time.perf_counter()
+    result = "error"
+    try:
+        if ZK_VERIFIER == "cli":
+            valid = verify_proof_cli(proof, public)
+        else:
+            valid = get_verifier_pool().verify(proof, public)
+        result = "valid" if valid else "invalid"
+        return valid
+    finally:
+        VERIFY_SECONDS.labels(backend=ZK_VERIFIER, result=result).observe(time.perf_counter() - start)
+
+
+def verify_proof_batch(items: list) -> list:
+    """
+    Check many {"proof": ..., "public": ...} items, returning one bool per item in order.
+    """
+    if ZK_VERIFIER == "cli":
+        return [verify_proof_cli(item["proof"], item["public"]) for item in items]
+    return get_verifier_pool().verify_batch(items)
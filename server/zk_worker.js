@@ -0,0 +1,168 @@
+// Long-lived Groth16 verification worker.
+//
+// Spawned by zk_utils.VerifierPool. The verification key is parsed once at
+// startup, then requests are read from stdin as one JSON object per line:
+//
+//   {"id": 1, "op": "verify", "proof": {...}, "public": ["..."]}
+//   {"id": 2, "op": "verify_batch", "items": [{"proof": {...}, "public": ["..."]}, ...]}
+//
+// and answered on stdout, one JSON object per line:
+//
+//   {"id": 1, "ok": true, "result": true}
+//   {"id": 2, "ok": true, "result": [true, false, ...]}
+//   {"id": 1, "ok": false, "error": "..."}
+//
+// stdout is reserved for the protocol, so anything else is logged to stderr.
+
+const fs = require("fs");
+const path = require("path");
+const crypto = require("crypto");
+const readline = require("readline");
+const snarkjs = require("snarkjs");
+// Use the same ffjavascript build that snarkjs itself runs on
+const { buildBn128, utils, Scalar } = require(require.resolve("ffjavascript", {
+  paths: [path.dirname(require.resolve("snarkjs"))]
+}));
+
+console.log = console.error;
+
+const vkeyPath = process.argv[2];
+if (!vkeyPath) {
+  console.error("usage: node zk_worker.js <verification_key.json>");
+  process.exit(2);
+}
+const vkey = JSON.parse(fs.readFileSync(vkeyPath, "utf8"));
+const vk = utils.unstringifyBigInts(vkey);
+
+function reply(msg) {
+  process.stdout.write(JSON.stringify(msg) + "\n");
+}
+
+// Any error while checking a proof is a rejection, same as the snarkjs CLI
+async function verify(publicSignals, proof) {
+  try {
+    return await snarkjs.groth16.verify(vkey, publicSignals, proof);
+  } catch (err) {
+    console.error(`[zk_worker] verify failed: ${err && err.message || err}`);
+    return false;
+  }
+}
+
+// Parse and sanity-check one proof the way snarkjs does before pairing.
+// Returns null for anything snarkjs would reject without reaching the pairing check.
+function parseProof(curve, item) {
+  try {
+    const proof = utils.unstringifyBigInts(item.proof);
+    const publicSignals = utils.unstringifyBigInts(item.public);
+    if (!Array.isArray(publicSignals) || publicSignals.length !== vk.IC.length - 1) return null;
+    if (!publicSignals.every(s => typeof s === "bigint" && Scalar.lt(s, curve.r))) return null;
+
+    const A = curve.G1.fromObject(proof.pi_a);
+    const B = curve.G2.fromObject(proof.pi_b);
+    const C = curve.G1.fromObject(proof.pi_c);
+    if (!curve.G1.isValid(A) || !curve.G2.isValid(B) || !curve.G1.isValid(C)) return null;
+
+    let cpub = curve.G1.fromObject(vk.IC[0]);
+    publicSignals.forEach((s, i) => {
+      cpub = curve.G1.add(cpub, curve.G1.timesScalar(curve.G1.fromObject(vk.IC[i + 1]), s));
+    });
+    return { A, B, C, cpub };
+  } catch (err) {
+    return null;
+  }
+}
+
+// 128-bit non-zero blinding scalar
+function randomScalar() {
+  let r = 0n;
+  while (r === 0n) r = BigInt("0x" + crypto.randomBytes(16).toString("hex"));
+  return r;
+}
+
+// Groth16 batch verification with a random linear combination of the pairing equations:
+//
+//   prod_i e(-r_i*A_i, B_i) * e(sum_i r_i*pub_i, gamma) * e(sum_i r_i*C_i, delta) * e((sum_i r_i)*alpha, beta) == 1
+//
+// n proofs cost n+3 Miller loops and one final exponentiation instead of 4n and n.
+// If the combined check fails, each proof is re-checked on its own so one bad proof
+// cannot make the rest of the batch fail.
+async function verifyBatch(items) {
+  const curve = await buildBn128();
+  const G1 = curve.G1;
+  const results = items.map(() => false);
+
+  const parsed = [];
+  items.forEach((item, index) => {
+    const p = parseProof(curve, item);
+    if (p) parsed.push({ index, ...p });
+  });
+  if (parsed.length === 0) return results;
+
+  let accPub = G1.zero;
+  let accC = G1.zero;
+  let rSum = 0n;
+  const pairs = [];
+  for (const p of parsed) {
+    const r = randomScalar();
+    pairs.push(G1.toAffine(G1.timesScalar(G1.neg(p.A), r)), p.B);
+    accPub = G1.add(accPub, G1.timesScalar(p.cpub, r));
+    accC = G1.add(accC, G1.timesScalar(p.C, r));
+    rSum += r;
+  }
+  pairs.push(
+    G1.toAffine(accPub), curve.G2.fromObject(vk.vk_gamma_2),
+    G1.toAffine(accC), curve.G2.fromObject(vk.vk_delta_2),
+    G1.toAffine(G1.timesScalar(G1.fromObject(vk.vk_alpha_1), rSum % curve.r)), curve.G2.fromObject(vk.vk_beta_2)
+  );
+
+  if (await curve.pairingEq(...pairs)) {
+    for (const p of parsed) results[p.index] = true;
+    return results;
+  }
+
+  for (const p of parsed) {
+    results[p.index] = await verify(items[p.index].public, items[p.index].proof);
+  }
+  return results;
+}
+
+async function handle(req) {
+  switch (req.op) {
+    case "ping":
+      return true;
+    case "verify":
+      return await verify(req.public, req.proof);
+    case "verify_batch":
+      if (!Array.isArray(req.items)) throw new Error("verify_batch needs an items array");
+      return await verifyBatch(req.items);
+    default:
+      throw new Error(`Unknown op: ${req.op}`);
+  }
+}
+
+// Requests are answered strictly in order, one at a time
+let queue = Promise.resolve();
+
+const rl = readline.createInterface({ input: process.stdin, terminal: false });
+rl.on("line", (line) => {
+  if (!line.trim()) return;
+  queue = queue.then(async () => {
+    let req;
+    try {
+      req = JSON.parse(line);
+    } catch (err) {
+      reply({ id: null, ok: false, error: `Bad request: ${err.message}` });
+      return;
+    }
+    try {
+      reply({ id: req.id, ok: true, result: await handle(req) });
+    } catch (err) {
+      reply({ id: req.id, ok: false, error: String(err && err.message || err) });
+    }
+  });
+});
+rl.on("close", () => {
+  queue.then(() => process.exit(0));
+});
+
+reply({ id: null, ok: true, ready: true });
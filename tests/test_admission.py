@@ -0,0 +1,122 @@
+import unittest
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from admission import TokenBucket, RateLimiter, EngineGate, Overloaded
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_burst_then_refill(self):
+        bucket = TokenBucket(rate=2, burst=3, now=0)
+        for _ in range(3):
+            self.assertEqual(bucket.take(0), 0)
+        self.assertAlmostEqual(bucket.take(0), 0.5)
+
+        # Half a second buys one token back, and never more than the burst
+        self.assertEqual(bucket.take(0.5), 0)
+        bucket.take(100)
+        self.assertAlmostEqual(bucket.tokens, 2)
+
+
+class RateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_client_bucket_answers_429(self):
+        limiter = RateLimiter(client_rate=1, client_burst=2, global_rate=0, clock=self.clock)
+        limiter.check("10.0.0.1")
+        limiter.check("10.0.0.1")
+        with self.assertRaises(Overloaded) as raised:
+            limiter.check("10.0.0.1")
+        self.assertEqual(raised.exception.status, 429)
+        self.assertEqual(raised.exception.reason, "client_rate")
+        self.assertEqual(raised.exception.retry_after, 1)
+
+        # Other clients have their own bucket
+        limiter.check("10.0.0.2")
+        self.clock.now += 1
+        limiter.check("10.0.0.1")
+
+    def test_global_bucket_answers_503_and_refunds_client(self):
+        limiter = RateLimiter(client_rate=1, client_burst=1, global_rate=0.5, global_burst=1, clock=self.clock)
+        limiter.check("a")
+        with self.assertRaises(Overloaded) as raised:
+            limiter.check("b")
+        self.assertEqual(raised.exception.status, 503)
+        self.assertEqual(raised.exception.retry_after, 2)
+
+        # "b" was refused by the global bucket, so it still has its own token
+        self.clock.now += 2
+        limiter.check("b")
+
+    def test_tracks_bounded_number_of_clients(self):
+        limiter = RateLimiter(client_rate=1, client_burst=1, global_rate=0, max_clients=2, clock=self.clock)
+        for address in ("a", "b", "c"):
+            limiter.check(address)
+        self.assertEqual(len(limiter._clients), 2)
+        # "a" was forgotten, so it starts with a full bucket again
+        limiter.check("a")
+
+
+class EngineGateTests(unittest.TestCase):
+    def test_queue_full_is_refused(self):
+        gate = EngineGate("test", concurrency=1, queue_size=1, timeout=5)
+        entered, release = threading.Event(), threading.Event()
+
+        def hold():
+            with gate.admit():
+                entered.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        entered.wait()
+        waiter = threading.Thread(target=hold)
+        waiter.start()
+        try:
+            # One call inside, one waiting for it: the next one is refused outright
+            while gate.admitted < 2:
+                time.sleep(0.001)
+            self.assertEqual(gate.queue_depth(), 1)
+            self.assertTrue(gate.saturated())
+            with self.assertRaises(Overloaded) as raised:
+                with gate.admit():
+                    pass
+            self.assertEqual(raised.exception.reason, "queue_full")
+            self.assertEqual(raised.exception.status, 503)
+        finally:
+            release.set()
+            holder.join()
+            waiter.join()
+        self.assertEqual(gate.admitted, 0)
+
+    def test_queue_timeout(self):
+        gate = EngineGate("test", concurrency=1, queue_size=4, timeout=0.05)
+        with gate.admit():
+            with self.assertRaises(Overloaded) as raised:
+                with gate.admit():
+                    pass
+        self.assertEqual(raised.exception.reason, "queue_timeout")
+        self.assertEqual(gate.admitted, 0)
+        self.assertGreater(gate.avg_seconds, 0)
+
+    def test_disabled_gate_never_refuses(self):
+        gate = EngineGate("test", concurrency=1, queue_size=0, timeout=0.05)
+        with gate.admit(enabled=False):
+            with gate.admit(enabled=False):
+                self.assertEqual(gate.queue_depth(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import asyncio
+import os
+import sys
+from http import HTTPStatus
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+sys.path.insert(0, os.path.dirname(__file__))
+
+try:
+    import quart
+except ImportError:  # async server dependencies are optional
+    quart = None
+
+import test_routes
+
+if quart is not None:
+    from async_app import create_asgi_app, is_async_path, ASYNC_PATHS
+
+
+def asgi_as_wsgi(asgi_app):
+    """
+    Drive an ASGI app from a WSGI call, one event loop per request, so werkzeug's test
+    client (the same API as app.test_client()) can talk to it.
+    """
+    def wsgi_app(environ, start_response):
+        body = environ["wsgi.input"].read(int(environ.get("CONTENT_LENGTH") or 0))
+        headers = [
+            (key[5:].replace("_", "-").lower().encode(), value.encode())
+            for key, value in environ.items() if key.startswith("HTTP_")
+        ]
+        for key, name in (("CONTENT_TYPE", b"content-type"), ("CONTENT_LENGTH", b"content-length")):
+            if environ.get(key):
+                headers.append((name, environ[key].encode()))
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": environ["REQUEST_METHOD"], "scheme": "http",
+            "path": environ["PATH_INFO"], "raw_path": environ["PATH_INFO"].encode(),
+            "query_string": environ["QUERY_STRING"].encode(), "root_path": "",
+            "headers": headers, "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+            "extensions": {},
+        }
+        messages = []
+
+        async def run():
+            received = asyncio.Event()
+
+            async def receive():
+                if not received.is_set():
+                    received.set()
+                    return {"type": "http.request", "body": body, "more_body": False}
+                await asyncio.Future()  # the client never disconnects
+
+            async def send(message):
+                messages.append(message)
+
+            await asgi_app(scope, receive, send)
+
+        asyncio.run(run())
+        start = messages[0]
+        start_response(
+            f"{start['status']} {HTTPStatus(start['status']).phrase}",
+            [(k.decode(), v.decode()) for k, v in start["headers"]]
+        )
+        return [m.get("body", b"") for m in messages[1:]]
+
+    return wsgi_app
+
+
+@unittest.skipIf(quart is None, "Quart and Hypercorn not installed (requirements-async.txt)")
+class AsyncRouteTests(test_routes.FlaskRouteTests):
+    """
+    Every Flask route test, run against the async server: /upload, the upload session
+    routes, /download and /poseidon hit the Quart handlers, the rest falls through to the
+    Flask app.
+    """
+    def setUp(self):
+        super().setUp()
+        self.server = create_asgi_app(test_routes.app)
+        self.client = Client(asgi_as_wsgi(self.server), Response)
+
+    def test_async_paths_use_quart(self):
+        self.assertEqual(ASYNC_PATHS, {"/upload", "/download", "/poseidon"})
+        for path in ("/upload/session", "/upload/session/" + "0" * 32 + "/3", "/upload/session/" + "0" * 32 + "/finalize"):
+            self.assertTrue(is_async_path(path))
+        self.assertFalse(is_async_path("/upload/sessions"))
+        for rule in self.server.async_app.url_map.iter_rules():
+            if rule.endpoint != "static":
+                self.assertTrue(is_async_path(rule.rule.split("<")[0].rstrip("/")), rule.rule)
+
+
+if __name__ == "__main__":
+    unittest.main()
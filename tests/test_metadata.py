@@ -0,0 +1,185 @@
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+import json
+from unittest.mock import patch
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from metadata import MetadataStore
+import convert_sidecars
+
+
+class MetadataStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.temp_dir.name) / "db" / "expirations.db"
+        self.store = MetadataStore(self.db_path, busy_timeout_ms=1234)
+        self.store.init_schema()
+
+    def tearDown(self):
+        self.store.close_all()
+        self.temp_dir.cleanup()
+
+    def test_connection_settings(self):
+        """Test that connections use WAL journaling and the configured busy timeout"""
+        conn = self.store.connection()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 1234)
+
+    def test_connection_pooled_per_thread(self):
+        """Test that a thread reuses its connection and other threads get their own"""
+        self.assertIs(self.store.connection(), self.store.connection())
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.store.connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], self.store.connection())
+
+    def test_connection_closed_when_thread_exits(self):
+        """Test that short-lived threads don't leave their connections open"""
+        self.store.connection()
+        for _ in range(50):
+            threads = [threading.Thread(target=self.store.get_file, args=("missing",)) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertLessEqual(self.store.open_connections(), 11)
+        self.assertEqual(self.store.open_connections(), 1)
+
+    def test_close_all_reopens(self):
+        first = self.store.connection()
+        self.store.close_all()
+        self.assertIsNot(self.store.connection(), first)
+        self.store.record_file("after_close", 10, False, 1)
+        self.assertIsNotNone(self.store.get_file("after_close"))
+
+    def test_file_round_trip(self):
+        self.store.record_file("abc", 100, True, 42)
+        self.assertEqual(
+            self.store.get_file("abc"),
+            {"file_id": "abc", "expires_at": 100, "delete_on_download": 1, "ciphertext_length": 42, "consumed_at": None}
+        )
+        self.assertIsNone(self.store.get_file("missing"))
+
+    def test_expired_and_delete(self):
+        self.store.record_file("old", 10, False, 1)
+        self.store.record_file("new", 1000, False, 1)
+
+        self.assertEqual(self.store.expired_file_ids(500), ["old"])
+        self.store.delete_files(["old"])
+        self.assertEqual([row["file_id"] for row in self.store.all_files()], ["new"])
+
+    def test_delete_expired_keeps_refreshed_rows(self):
+        self.store.record_file("old", 10, False, 1)
+        self.store.record_file("refreshed", 20, False, 1)
+        self.store.record_file("refreshed", 5000, False, 1)
+
+        self.assertEqual(self.store.delete_expired(["old", "refreshed", "missing"], 500), ["old"])
+        self.assertEqual([row["file_id"] for row in self.store.all_files()], ["refreshed"])
+
+    def test_proof_stored_in_row(self):
+        proof = {"pi_a": ["1", "2", "1"], "protocol": "groth16"}
+        self.store.record_file("with_proof", 100, False, 1, proof=proof, public=["7"])
+        self.store.record_file("without_proof", 100, False, 1)
+
+        self.assertEqual(self.store.get_proof("with_proof"), (proof, ["7"]))
+        self.assertIsNone(self.store.get_proof("without_proof"))
+        # Stored without whitespace
+        raw = self.store.execute("SELECT proof FROM expirations WHERE file_id = 'with_proof'").fetchone()[0]
+        self.assertNotIn(" ", raw)
+
+    def test_consume_file_once(self):
+        self.store.record_file("once", 5000, True, 1)
+
+        self.assertTrue(self.store.consume_file("once", 100, 220))
+        self.assertFalse(self.store.consume_file("once", 101, 221))
+        self.assertFalse(self.store.consume_file("missing", 100, 220))
+
+        record = self.store.get_file("once")
+        self.assertEqual((record["consumed_at"], record["expires_at"]), (100, 220))
+
+    def test_transaction_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with self.store.transaction():
+                self.store.record_file("rolled_back", 10, False, 1)
+                raise RuntimeError("boom")
+        self.assertIsNone(self.store.get_file("rolled_back"))
+
+    def test_sessions(self):
+        self.store.create_session("s1", 100, 5000)
+        self.store.create_session("s2", 900)
+
+        self.assertEqual(self.store.get_session("s1"),
+                         {"upload_id": "s1", "created_at": 100, "expected_size": 5000, "finalizing_at": None})
+        self.assertEqual(self.store.stale_session_ids(500), ["s1"])
+
+        # Only one request gets to finalize a session
+        self.assertTrue(self.store.begin_finalize("s2", 950))
+        self.assertFalse(self.store.begin_finalize("s2", 960))
+        self.assertEqual(self.store.get_session("s2")["finalizing_at"], 950)
+        self.assertFalse(self.store.begin_finalize("missing", 950))
+        self.store.delete_session("s1")
+        self.assertIsNone(self.store.get_session("s1"))
+
+    def test_init_schema_upgrades_old_database(self):
+        """Test that a database from before ciphertext_length existed gains the column"""
+        old_path = Path(self.temp_dir.name) / "old.db"
+        with sqlite3.connect(old_path) as db:
+            db.execute("CREATE TABLE expirations (file_id TEXT PRIMARY KEY, expires_at INTEGER NOT NULL, delete_on_download INTEGER DEFAULT 0)")
+            db.execute("INSERT INTO expirations VALUES ('legacy', 10, 0)")
+
+        old_store = MetadataStore(old_path)
+        try:
+            old_store.init_schema()
+            self.assertEqual(old_store.get_file("legacy")["ciphertext_length"], None)
+        finally:
+            old_store.close_all()
+
+
+class ConvertSidecarsTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.upload_dir = Path(self.temp_dir.name) / "uploads"
+        (self.upload_dir / "ab" / "cd").mkdir(parents=True)
+        self.store = MetadataStore(Path(self.temp_dir.name) / "expirations.db")
+        self.store.init_schema()
+        self.patcher = patch.object(convert_sidecars, "store", self.store)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.store.close_all()
+        self.temp_dir.cleanup()
+
+    def write_sidecars(self, directory, file_id):
+        (directory / f"{file_id}.proof.json").write_text(json.dumps({"protocol": "groth16", "id": file_id}))
+        (directory / f"{file_id}.public.json").write_text(json.dumps([file_id]))
+
+    def test_convert_moves_sidecars_into_rows(self):
+        self.store.record_file("flat", 100, False, 1)
+        self.store.record_file("sharded", 100, False, 1)
+        self.write_sidecars(self.upload_dir, "flat")
+        self.write_sidecars(self.upload_dir / "ab" / "cd", "sharded")
+        self.write_sidecars(self.upload_dir, "expired")
+        (self.upload_dir / "flat.ezra").write_bytes(b"data")
+
+        counts = convert_sidecars.convert(self.upload_dir, batch_size=2)
+
+        self.assertEqual(counts, {"converted": 2, "orphaned": 1})
+        self.assertEqual(self.store.get_proof("flat"), ({"protocol": "groth16", "id": "flat"}, ["flat"]))
+        self.assertEqual(self.store.get_proof("sharded")[1], ["sharded"])
+        remaining = sorted(p.name for p in self.upload_dir.rglob("*") if p.is_file())
+        self.assertEqual(remaining, ["flat.ezra"])
+
+        # Re-running finds nothing left to do
+        self.assertEqual(convert_sidecars.convert(self.upload_dir), {"converted": 0, "orphaned": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from metadata import MetadataStore
+from packstore import PackStore, PACK_SLOT_SIZE
+from sweeper import ExpirySweeper
+
+
+class PackStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.upload_dir = Path(self.temp_dir.name) / "uploads"
+        self.upload_dir.mkdir()
+        self.store = MetadataStore(Path(self.temp_dir.name) / "expirations.db")
+        self.store.init_schema()
+        self.packs = PackStore(self.store, self.upload_dir, slots=4)
+
+    def tearDown(self):
+        self.store.close_all()
+        self.temp_dir.cleanup()
+
+    def put(self, file_id, content=None):
+        content = content if content is not None else file_id.encode() * 10
+        staged = self.upload_dir / f"{file_id}.part"
+        staged.write_bytes(content)
+        path, offset = self.packs.put(file_id, staged)
+        staged.unlink()
+        return path, offset
+
+    def read(self, file_id, length):
+        path, offset = self.packs.locate(file_id)
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def test_fits_smallest_bucket_only(self):
+        self.assertTrue(self.packs.fits(0))
+        self.assertTrue(self.packs.fits(PACK_SLOT_SIZE - 1))
+        self.assertFalse(self.packs.fits(PACK_SLOT_SIZE))
+
+    def test_slots_fill_packs_in_order(self):
+        for i in range(5):
+            self.put(f"file{i}")
+
+        self.assertEqual(self.packs.stats(), {"packs": 2, "slots_used": 5, "slots": 8})
+        first, offset = self.packs.locate("file3")
+        self.assertEqual(offset, 3 * PACK_SLOT_SIZE)
+        second, offset = self.packs.locate("file4")
+        self.assertNotEqual(first, second)
+        self.assertEqual(offset, 0)
+        # Packs are created at full size, so they don't reveal how many slots are in use
+        self.assertEqual(second.stat().st_size, 4 * PACK_SLOT_SIZE)
+        self.assertEqual(self.read("file2", 50), b"file2" * 10)
+
+    def test_release_zeroes_and_reuses_slot(self):
+        self.put("old", b"secret ciphertext")
+        path, offset = self.packs.locate("old")
+
+        self.assertEqual(self.packs.release(["old", "never_packed"]), 1)
+        self.assertIsNone(self.packs.locate("old"))
+        with open(path, "rb") as f:
+            f.seek(offset)
+            self.assertEqual(f.read(PACK_SLOT_SIZE), bytes(PACK_SLOT_SIZE))
+
+        # The freed slot is handed to the next upload
+        self.assertEqual(self.put("new"), (path, offset))
+
+    def test_read_follows_compaction(self):
+        for i in range(5):
+            self.put(f"file{i}")
+        self.packs.release(["file0"])
+        before = self.packs.locate("file4")
+
+        self.assertEqual(self.packs.compact(), 1)
+        path, offset, data = self.packs.read("file4", 50)
+        self.assertNotEqual((path, offset), before)
+        self.assertEqual(data, b"file4" * 10)
+
+        self.packs.release(["file4"])
+        self.assertIsNone(self.packs.read("file4", 50))
+
+    def test_reupload_keeps_slot_and_clears_tail(self):
+        self.put("same", b"x" * 100)
+        location = self.packs.locate("same")
+        self.assertEqual(self.put("same", b"y" * 10), location)
+        self.assertEqual(self.read("same", 100), b"y" * 10 + bytes(90))
+
+    def test_compact_empties_sparse_pack(self):
+        for i in range(8):
+            self.put(f"file{i}")
+        # Leave one upload in each pack
+        self.packs.release([f"file{i}" for i in (1, 2, 3, 4, 5, 6)])
+        second, _ = self.packs.locate("file7")
+
+        self.assertEqual(self.packs.compact(), 1)
+
+        self.assertEqual(self.packs.stats(), {"packs": 1, "slots_used": 2, "slots": 4})
+        self.assertFalse(second.exists())
+        self.assertEqual(self.read("file0", 50), b"file0" * 10)
+        self.assertEqual(self.read("file7", 50), b"file7" * 10)
+        # Nothing left to do
+        self.assertEqual(self.packs.compact(), 0)
+
+    def test_compact_drops_empty_packs(self):
+        for i in range(5):
+            self.put(f"file{i}")
+        self.packs.release(["file4"])
+        second = self.packs.path(2)
+        self.assertTrue(second.exists())
+
+        self.assertEqual(self.packs.compact(), 0)
+        self.assertFalse(second.exists())
+        self.assertEqual(self.packs.stats()["packs"], 1)
+
+        # Pack ids are never reused, so a deleted pack's file name can't come back
+        for i in range(5, 9):
+            self.put(f"file{i}")
+        self.assertEqual(self.packs.locate("file8")[0], self.packs.path(3))
+
+    def test_sweeper_frees_expired_slots(self):
+        sweeper = ExpirySweeper(self.store, self.upload_dir, packs=self.packs)
+        self.put("expired")
+        self.store.record_file("expired", 100, False, 70)
+        self.put("kept")
+        self.store.record_file("kept", 10_000, False, 40)
+
+        self.assertEqual(sweeper.sweep_all(now=1000), 1)
+        self.assertIsNone(self.packs.locate("expired"))
+        self.assertEqual(self.read("kept", 40), b"kept" * 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from paths import upload_path, legacy_upload_path, find_upload_file, upload_file_paths
+from migrate_upload_layout import migrate, parse_upload_name
+
+
+class UploadLayoutTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.upload_dir = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_upload_path_is_sharded(self):
+        path = upload_path("12345", "ezra", self.upload_dir, depth=2)
+        relative = path.relative_to(self.upload_dir)
+
+        self.assertEqual(len(relative.parts), 3)
+        self.assertTrue(all(len(part) == 2 for part in relative.parts[:2]))
+        self.assertEqual(relative.name, "12345.ezra")
+        # Every file of one upload shares a directory
+        self.assertEqual(upload_path("12345", "proof.json", self.upload_dir, depth=2).parent, path.parent)
+
+    def test_depth_zero_is_flat(self):
+        self.assertEqual(upload_path("12345", "ezra", self.upload_dir, depth=0), self.upload_dir / "12345.ezra")
+
+    def test_shards_spread_decimal_ids(self):
+        """Test that ids sharing leading digits still land in different shards"""
+        shards = {upload_path(f"21888{i:05d}", "ezra", self.upload_dir, depth=1).parent.name for i in range(500)}
+        self.assertGreater(len(shards), 200)
+
+    def test_find_prefers_flat_then_sharded(self):
+        self.assertIsNone(find_upload_file("abc", "ezra", self.upload_dir))
+
+        sharded = upload_path("abc", "ezra", self.upload_dir)
+        sharded.parent.mkdir(parents=True)
+        sharded.write_bytes(b"new")
+        self.assertEqual(find_upload_file("abc", "ezra", self.upload_dir), sharded)
+
+        legacy_upload_path("abc", "ezra", self.upload_dir).write_bytes(b"old")
+        self.assertEqual(find_upload_file("abc", "ezra", self.upload_dir), self.upload_dir / "abc.ezra")
+
+    def test_upload_file_paths_covers_both_layouts(self):
+        candidates = upload_file_paths("abc", self.upload_dir)
+        self.assertIn(upload_path("abc", "ezra", self.upload_dir), candidates)
+        self.assertIn(self.upload_dir / "abc.ezra", candidates)
+
+    def test_parse_upload_name(self):
+        self.assertEqual(parse_upload_name("123.proof.json"), ("123", "proof.json"))
+        self.assertEqual(parse_upload_name("123.ezra"), ("123", "ezra"))
+        self.assertIsNone(parse_upload_name("abcd.part"))
+        self.assertIsNone(parse_upload_name(".gitkeep"))
+
+    def test_migrate_moves_flat_files(self):
+        for suffix in ("ezra", "proof.json", "public.json"):
+            (self.upload_dir / f"111.{suffix}").write_bytes(suffix.encode())
+        (self.upload_dir / "session.part").write_bytes(b"partial")
+
+        # A re-upload already in the sharded layout wins over its stale flat copy
+        fresh = upload_path("222", "ezra", self.upload_dir)
+        fresh.parent.mkdir(parents=True)
+        fresh.write_bytes(b"fresh")
+        (self.upload_dir / "222.ezra").write_bytes(b"stale")
+
+        counts = migrate(self.upload_dir)
+
+        self.assertEqual(counts, {"moved": 3, "stale": 1, "skipped": 1})
+        self.assertEqual(upload_path("111", "proof.json", self.upload_dir).read_bytes(), b"proof.json")
+        self.assertEqual(fresh.read_bytes(), b"fresh")
+        self.assertEqual(sorted(p.name for p in self.upload_dir.iterdir() if p.is_file()), ["session.part"])
+
+    def test_migrate_dry_run_changes_nothing(self):
+        (self.upload_dir / "111.ezra").write_bytes(b"x")
+        self.assertEqual(migrate(self.upload_dir, dry_run=True)["moved"], 1)
+        self.assertTrue((self.upload_dir / "111.ezra").exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
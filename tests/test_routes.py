@@ -5,19 +5,33 @@ import json
 import sys
 import base64
 import sqlite3
-from unittest.mock import patch, MagicMock
+import shutil
+import gzip
+import hashlib
+import io
+import fcntl
+import threading
+from contextlib import redirect_stdout
+from unittest.mock import patch
 from pathlib import Path
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server'))) 
 
-from app import app
-from paths import UPLOAD_DIR, DB_DIR, ensure_directories
+from app import create_app, app_state, canary_context, limiter, verify_gate
+from packstore import PACK_SLOT_SIZE
+from storage import ContainerHeader, CONTAINER_HEADER_SIZE
+from pages import PageCache
+import zk_assets
+from paths import UPLOAD_DIR, DB_DIR, ensure_directories, upload_path
 from dotenv import load_dotenv
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', 'server/', '.env')
 load_dotenv(dotenv_path)
 ensure_directories()
 
+app = create_app()
+store, packs, proof_cache = app_state(app).store, app_state(app).packs, app_state(app).proof_cache
+
 class FlaskRouteTests(unittest.TestCase):
     def setUp(self):
         app.config["TESTING"] = True
@@ -33,16 +47,9 @@ class FlaskRouteTests(unittest.TestCase):
         os.makedirs(DB_DIR, exist_ok=True)
         os.makedirs(UPLOAD_DIR, exist_ok=True)
         
-        schema = """
-        CREATE TABLE IF NOT EXISTS expirations (
-            file_id TEXT PRIMARY KEY,
-            expires_at INTEGER NOT NULL,
-            delete_on_download INTEGER DEFAULT 0
-        );
-        """
-        with sqlite3.connect(DB_DIR / "expirations.db") as db:
-            db.execute(schema)
-            db.commit()
+        store.init_schema()
+        proof_cache.clear()
+        limiter.clear()
 
     def tearDown(self):
         os.unlink(self.test_file.name)
@@ -51,17 +58,23 @@ class FlaskRouteTests(unittest.TestCase):
         if os.path.exists(UPLOAD_DIR):
             for file in os.listdir(UPLOAD_DIR):
                 file_path = os.path.join(UPLOAD_DIR, file)
-                if os.path.basename(file_path) != ".gitkeep":
+                if os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+                elif os.path.basename(file_path) != ".gitkeep":
                     os.unlink(file_path)
         
-        # Clean up database
-        if os.path.exists(DB_DIR / "expirations.db"):
-            os.unlink(DB_DIR / "expirations.db")
+        # Clean up database (and its WAL files) once no pooled connection holds it open
+        store.close_all()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(f"{DB_DIR / 'expirations.db'}{suffix}"):
+                os.unlink(f"{DB_DIR / 'expirations.db'}{suffix}")
 
     def test_index_route(self):
         response = self.client.get("/")
         self.assertEqual(response.status_code, 200)
         self.assertIn(b"<!DOCTYPE html>", response.data)
+        self.assertIn(b"window.EZRA_ZK_ASSET_HASHES", response.data)
+        self.assertEqual(self.client.get("/static/zk_prover_worker.js").status_code, 200)
 
     def test_about_route(self):
         response = self.client.get("/about")
@@ -71,6 +84,120 @@ class FlaskRouteTests(unittest.TestCase):
         response = self.client.get("/canary")
         self.assertEqual(response.status_code, 200)
 
+    def test_page_conditional_requests(self):
+        response = self.client.get("/about")
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        last_modified = response.headers["Last-Modified"]
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+
+        response = self.client.get("/about", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+
+        response = self.client.get("/about", headers={"If-Modified-Since": last_modified})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get("/about", headers={"If-None-Match": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_page_precompressed(self):
+        plain = self.client.get("/")
+        response = self.client.get("/", headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertNotEqual(response.headers["ETag"], plain.headers["ETag"])
+
+        # The identity ETag still validates a cached gzip copy, and vice versa
+        response = self.client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_page_rerenders_when_source_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            canary_file = os.path.join(tmp, "canary.txt.asc")
+            with open(canary_file, "w") as f:
+                f.write("Last Updated: January 1, 2025")
+
+            def context():
+                with patch("app.CANARY_PATH", canary_file):
+                    return canary_context()
+
+            cache = PageCache()
+            cache.register("canary.html", context=context, sources=[canary_file])
+            with app.test_request_context("/"):
+                first = cache.get("canary.html")
+                self.assertIs(cache.get("canary.html"), first)
+
+                with open(canary_file, "w") as f:
+                    f.write("Last Updated: February 2, 2026")
+                stat = os.stat(canary_file)
+                os.utime(canary_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+                second = cache.get("canary.html")
+        self.assertIsNot(second, first)
+        self.assertNotEqual(second.etags["identity"], first.etags["identity"])
+        self.assertIn(b"February 2, 2026", second.bodies["identity"])
+
+    def _build_zk_assets(self, tmp):
+        source = Path(tmp) / "src"
+        source.mkdir()
+        (source / "poseidon_preimage.wasm").write_bytes(b"\0asm" + b"wasm body " * 1000)
+        (source / "poseidon_preimage.zkey").write_bytes(b"zkey body " * 1000)
+        out = Path(tmp) / "zk"
+        with redirect_stdout(io.StringIO()):
+            manifest = zk_assets.build_assets(source, out)
+        return out, manifest
+
+    def test_zk_asset_immutable(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out, manifest = self._build_zk_assets(tmp)
+            with patch.object(zk_assets, "ZK_ASSET_DIR", out), \
+                 patch.object(zk_assets, "ZK_ASSET_MANIFEST", out / "manifest.json"):
+                urls = zk_assets.asset_urls()
+                self.assertEqual(urls["poseidon_preimage.wasm"], "/zk/" + manifest["poseidon_preimage.wasm"]["file"])
+                # The browser's prover caches the artifacts under their content hash
+                self.assertEqual(zk_assets.asset_hashes()["poseidon_preimage.zkey"],
+                                 hashlib.sha256(b"zkey body " * 1000).hexdigest())
+
+                response = self.client.get(urls["poseidon_preimage.wasm"])
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.mimetype, "application/wasm")
+                self.assertEqual(response.data, b"\0asm" + b"wasm body " * 1000)
+                self.assertIn("immutable", response.headers["Cache-Control"])
+                self.assertIn("max-age=31536000", response.headers["Cache-Control"])
+                self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+
+                # Resuming an interrupted download
+                response = self.client.get(urls["poseidon_preimage.zkey"], headers={"Range": "bytes=10-19"})
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response.data, b"zkey body ")
+                self.assertEqual(response.headers["Content-Range"], "bytes 10-19/10000")
+
+                response = self.client.get(urls["poseidon_preimage.zkey"], headers={"Accept-Encoding": "gzip"})
+                self.assertEqual(response.headers["Content-Encoding"], "gzip")
+                self.assertIn("Accept-Encoding", response.headers["Vary"])
+                self.assertEqual(gzip.decompress(response.data), b"zkey body " * 1000)
+
+                # A range always refers to the identity bytes, even if gzip is accepted
+                response = self.client.get(urls["poseidon_preimage.zkey"],
+                                           headers={"Accept-Encoding": "gzip", "Range": "bytes=0-3"})
+                self.assertEqual(response.status_code, 206)
+                self.assertNotIn("Content-Encoding", response.headers)
+                self.assertEqual(response.data, b"zkey")
+
+                # Only files named in the manifest are served
+                self.assertEqual(self.client.get("/zk/manifest.json").status_code, 404)
+                self.assertEqual(self.client.get("/zk/poseidon_preimage.0000000000000000.wasm").status_code, 404)
+
+    def test_zk_asset_urls_fall_back_to_static(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+             patch.object(zk_assets, "ZK_ASSET_MANIFEST", Path(tmp) / "manifest.json"):
+            self.assertEqual(zk_assets.asset_urls()["poseidon_preimage.zkey"], "/static/poseidon_preimage.zkey")
+            self.assertEqual(zk_assets.asset_hashes(), {})
+            self.assertEqual(self.client.get("/zk/poseidon_preimage.wasm").status_code, 404)
+
     def test_poseidon_endpoint(self):
         # Test valid base64 secret
         secret = b"test_secret_32_bytes_padded_here"
@@ -97,6 +224,66 @@ class FlaskRouteTests(unittest.TestCase):
                                      content_type="application/json")
         self.assertEqual(response.status_code, 500)
 
+    def test_poseidon_batch_endpoint(self):
+        secrets = [b"test_secret_32_bytes_padded_here", b"another_secret"]
+        secrets_b64 = [base64.b64encode(s).decode() for s in secrets]
+
+        response = self.client.post("/poseidon/batch", json={"secrets_b64": secrets_b64})
+        self.assertEqual(response.status_code, 200)
+        hashes = response.get_json()["hashes"]
+        self.assertEqual(len(hashes), 2)
+
+        # Same answers as the single-secret endpoint
+        for secret_b64, hashed in zip(secrets_b64, hashes):
+            single = self.client.post("/poseidon", json={"secret_b64": secret_b64})
+            self.assertEqual(single.get_json()["hash"], hashed)
+
+    def test_poseidon_endpoints_can_be_disabled(self):
+        secret = base64.b64encode(b"a").decode()
+        with patch.dict(app.config, {"POSEIDON_ENDPOINT_ENABLED": False}):
+            self.assertEqual(self.client.post("/poseidon", json={"secret_b64": secret}).status_code, 404)
+            self.assertEqual(self.client.post("/poseidon/batch", json={"secrets_b64": [secret]}).status_code, 404)
+
+        # The page loads the client-side hasher
+        page = self.client.get("/").get_data(as_text=True)
+        self.assertIn("poseidon.js", page)
+        self.assertEqual(self.client.get("/static/poseidon_constants.js").status_code, 200)
+
+    def test_poseidon_batch_invalid_input(self):
+        response = self.client.post("/poseidon/batch", json={})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post("/poseidon/batch", json={"secrets_b64": ["AAAA", "not_valid_base64!!!"]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"index 1", response.data)
+
+        too_many = ["AAAA"] * (app.config["MAX_BATCH_SIZE"] + 1)
+        response = self.client.post("/poseidon/batch", json={"secrets_b64": too_many})
+        self.assertEqual(response.status_code, 400)
+
+    @patch("app.verify_proof_batch", return_value=[True, False])
+    def test_verify_batch_endpoint(self, mock_verify):
+        fake_proof = {
+            "pi_a": ["1", "2", "1"],
+            "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+            "pi_c": ["5", "6", "1"],
+            "protocol": "groth16",
+            "curve": "bn128"
+        }
+        items = [{"proof": fake_proof, "public": ["1"]}, {"proof": fake_proof, "public": ["2"]}]
+
+        response = self.client.post("/verify/batch", json={"items": items})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"valid": [True, False]})
+        mock_verify.assert_called_once_with(items)
+
+    @patch("app.verify_proof_batch")
+    def test_verify_batch_malformed_item(self, mock_verify):
+        response = self.client.post("/verify/batch", json={"items": [{"proof": {"pi_a": []}, "public": ["1"]}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"index 0", response.data)
+        mock_verify.assert_not_called()
+
     def test_upload_missing_file(self):
         response = self.client.post("/upload", data={}, content_type="multipart/form-data")
         self.assertEqual(response.status_code, 400)
@@ -155,9 +342,141 @@ class FlaskRouteTests(unittest.TestCase):
             
             # Verify files were created
             file_id = result["file_id"]
-            self.assertTrue(os.path.exists(UPLOAD_DIR / f"{file_id}.ezra"))
-            self.assertTrue(os.path.exists(UPLOAD_DIR / f"{file_id}.proof.json"))
-            self.assertTrue(os.path.exists(UPLOAD_DIR / f"{file_id}.public.json"))
+            self.assertTrue(os.path.exists(upload_path(file_id, "ezra")))
+
+            # The proof is kept in the upload's row, not in sidecar files
+            self.assertFalse(os.path.exists(upload_path(file_id, "proof.json")))
+            self.assertEqual(store.get_proof(file_id), (fake_proof, ["123456789"]))
+
+    def _session_form(self, file_id):
+        fake_proof = {
+            "pi_a": ["1", "2", "1"],
+            "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+            "pi_c": ["5", "6", "1"],
+            "protocol": "groth16",
+            "curve": "bn128"
+        }
+        return {
+            "secret": base64.b64encode(b"test_secret_32_bytes_here_______").decode(),
+            "zk_proof": json.dumps(fake_proof),
+            "zk_public": json.dumps([file_id]),
+            "expire_hours": "24",
+            "delete_after_download": "false"
+        }
+
+    @patch.dict(app.config, {"UPLOAD_CHUNK_SIZE": 8})
+    def test_chunked_upload_session(self):
+        payload = b"0123456789abcdefXYZ"  # 8 + 8 + 3 bytes
+
+        response = self.client.post("/upload/session", json={"size": len(payload)})
+        self.assertEqual(response.status_code, 200)
+        session = response.get_json()
+        upload_id = session["upload_id"]
+        self.assertEqual(session["chunk_size"], 8)
+
+        response = self.client.put(f"/upload/session/{upload_id}/0", data=payload[0:8])
+        self.assertEqual(response.get_json(), {"received": 8, "next_chunk": 1})
+
+        # Skipping ahead is refused, resending a stored chunk is acknowledged
+        response = self.client.put(f"/upload/session/{upload_id}/2", data=payload[16:])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()["next_chunk"], 1)
+        response = self.client.put(f"/upload/session/{upload_id}/0", data=payload[0:8])
+        self.assertEqual(response.status_code, 200)
+
+        # Finalizing before every byte arrived is refused
+        response = self.client.post(f"/upload/session/{upload_id}/finalize", data=self._session_form("1001"))
+        self.assertEqual(response.status_code, 409)
+
+        self.client.put(f"/upload/session/{upload_id}/1", data=payload[8:16])
+        response = self.client.put(f"/upload/session/{upload_id}/2", data=payload[16:])
+        self.assertEqual(response.get_json()["received"], len(payload))
+
+        response = self.client.get(f"/upload/session/{upload_id}")
+        self.assertEqual(response.get_json()["received"], len(payload))
+
+        response = self.client.post(f"/upload/session/{upload_id}/finalize", data=self._session_form("1001"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"file_id": "1001"})
+
+        # Stored padded, with the real length recorded and the session gone
+        ezra_path = upload_path("1001", "ezra")
+        self.assertEqual(ezra_path.stat().st_size, 1024 * 1024)
+        self.assertEqual(ezra_path.read_bytes()[:len(payload)], payload)
+        self.assertFalse((UPLOAD_DIR / f"{upload_id}.part").exists())
+        with sqlite3.connect(DB_DIR / "expirations.db") as db:
+            row = db.execute("SELECT ciphertext_length FROM expirations WHERE file_id = ?", ("1001",)).fetchone()
+        self.assertEqual(row[0], len(payload))
+        self.assertEqual(self.client.get(f"/upload/session/{upload_id}").status_code, 404)
+
+    @patch.dict(app.config, {"UPLOAD_CHUNK_SIZE": 8})
+    def test_chunked_upload_rejects_oversized_chunk(self):
+        upload_id = self.client.post("/upload/session", json={}).get_json()["upload_id"]
+        response = self.client.put(f"/upload/session/{upload_id}/0", data=b"x" * 9)
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunked_upload_unknown_session(self):
+        self.assertEqual(self.client.get("/upload/session/" + "0" * 32).status_code, 404)
+        self.assertEqual(self.client.put("/upload/session/../../etc/0", data=b"x").status_code, 404)
+        response = self.client.post("/upload/session/" + "0" * 32 + "/finalize", data=self._session_form("1002"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_chunked_upload_abort(self):
+        upload_id = self.client.post("/upload/session", json={}).get_json()["upload_id"]
+        self.assertTrue((UPLOAD_DIR / f"{upload_id}.part").exists())
+
+        self.assertEqual(self.client.delete(f"/upload/session/{upload_id}").status_code, 204)
+        self.assertFalse((UPLOAD_DIR / f"{upload_id}.part").exists())
+
+    @patch.dict(app.config, {"UPLOAD_CHUNK_SIZE": 8})
+    def test_chunked_upload_refuses_chunks_once_finalizing(self):
+        upload_id = self.client.post("/upload/session", json={}).get_json()["upload_id"]
+        self.client.put(f"/upload/session/{upload_id}/0", data=b"01234567")
+        refused = []
+
+        def store_with_late_chunk(staged, meta, state):
+            # A chunk arriving while the upload is being stored
+            refused.append(self.client.put(f"/upload/session/{upload_id}/1", data=b"x").status_code)
+            refused.append(self.client.delete(f"/upload/session/{upload_id}").status_code)
+            return meta["file_id"]
+
+        with patch("app.store_upload", side_effect=store_with_late_chunk):
+            response = self.client.post(f"/upload/session/{upload_id}/finalize", data=self._session_form("1015"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(refused, [409, 409])
+
+        # Afterwards the session is gone, and a late chunk doesn't bring its file back
+        self.assertEqual(self.client.put(f"/upload/session/{upload_id}/1", data=b"x").status_code, 404)
+        self.assertFalse((UPLOAD_DIR / f"{upload_id}.part").exists())
+
+    @patch.dict(app.config, {"UPLOAD_CHUNK_SIZE": 8})
+    def test_chunked_upload_waiting_chunk_sees_session_gone(self):
+        """Test that a chunk held up by the session lock doesn't write into a finished session"""
+        upload_id = self.client.post("/upload/session", json={}).get_json()["upload_id"]
+        part_path = UPLOAD_DIR / f"{upload_id}.part"
+        statuses = []
+
+        with open(part_path, "r+b") as held:
+            fcntl.flock(held, fcntl.LOCK_EX)
+            put = threading.Thread(target=lambda: statuses.append(
+                app.test_client().put(f"/upload/session/{upload_id}/0", data=b"x").status_code))
+            put.start()
+            put.join(0.2)
+            self.assertTrue(put.is_alive())
+            # What a finalize does before it lets go of the lock
+            part_path.unlink()
+            store.delete_session(upload_id)
+        put.join(5)
+
+        self.assertEqual(statuses, [404])
+        self.assertFalse(part_path.exists())
+
+    def test_chunked_upload_never_recreates_part_file(self):
+        upload_id = self.client.post("/upload/session", json={}).get_json()["upload_id"]
+        (UPLOAD_DIR / f"{upload_id}.part").unlink()
+
+        self.assertEqual(self.client.put(f"/upload/session/{upload_id}/0", data=b"x").status_code, 404)
+        self.assertFalse((UPLOAD_DIR / f"{upload_id}.part").exists())
 
     def test_upload_too_many_files(self):
         secret = base64.b64encode(b"test_secret_32_bytes_here_______").decode()
@@ -179,12 +498,10 @@ class FlaskRouteTests(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn(b"Too many files", response.data)
 
-    @patch("subprocess.run")
-    def test_download_success(self, mock_subprocess):
-        # Mock successful proof verification
-        mock_subprocess.return_value = None
+    @patch("app.verify_proof", return_value=True)
+    def test_download_success(self, mock_verify):
         
-        file_id = "test_file_id_123"
+        file_id = "1008"
         
         # Create fake encrypted file
         ezra_path = UPLOAD_DIR / f"{file_id}.ezra"
@@ -220,6 +537,358 @@ class FlaskRouteTests(unittest.TestCase):
         ciphertext = base64.b64decode(data["ciphertext"])
         self.assertEqual(ciphertext, b"fake_encrypted_content_here")
 
+    @patch("app.verify_proof", return_value=True)
+    def test_download_binary_uses_stored_length(self, mock_verify):
+        file_id = "1009"
+
+        # Ciphertext that legitimately ends in zero bytes, followed by padding
+        ciphertext = b"\x01\x02ciphertext\x00\x00"
+        with open(UPLOAD_DIR / f"{file_id}.ezra", "wb") as f:
+            f.write(ciphertext + b"\x00" * 4096)
+
+        with sqlite3.connect(DB_DIR / "expirations.db") as db:
+            db.execute(
+                "INSERT INTO expirations (file_id, expires_at, delete_on_download, ciphertext_length) VALUES (?, ?, ?, ?)",
+                (file_id, 9999999999, 0, len(ciphertext))
+            )
+
+        fake_proof = {
+            "pi_a": ["1", "2", "1"],
+            "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+            "pi_c": ["5", "6", "1"],
+            "protocol": "groth16",
+            "curve": "bn128"
+        }
+
+        response = self.client.post("/download",
+                                     json={"proof": fake_proof, "public": [file_id]},
+                                     headers={"Accept": "application/octet-stream"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/octet-stream")
+        self.assertEqual(response.headers["Content-Length"], str(len(ciphertext)))
+        self.assertEqual(response.data, ciphertext)
+
+        # The JSON mode honours the stored length as well
+        response = self.client.post("/download",
+                                     json={"proof": fake_proof, "public": [file_id]})
+        self.assertEqual(base64.b64decode(response.get_json()["ciphertext"]), ciphertext)
+
+    def test_upload_checks_v2_container(self):
+        header = ContainerHeader(4096, 5000, b"\x07" * 8)
+        container = header.pack() + os.urandom(header.length - CONTAINER_HEADER_SIZE)
+
+        data = {"file": (io.BytesIO(container[:-1]), "test.ezra"), **self._session_form("1003")}
+        response = self.client.post("/upload", data=data, content_type="multipart/form-data")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"Invalid .ezra container", response.data)
+
+        # Chunked uploads are checked at finalize, and the rejected session is dropped
+        upload_id = self.client.post("/upload/session", json={"size": len(container) - 1}).get_json()["upload_id"]
+        self.client.put(f"/upload/session/{upload_id}/0", data=container[:-1])
+        response = self.client.post(f"/upload/session/{upload_id}/finalize", data=self._session_form("1003"))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f"/upload/session/{upload_id}").status_code, 404)
+
+        data = {"file": (io.BytesIO(container), "test.ezra"), **self._session_form("1003")}
+        response = self.client.post("/upload", data=data, content_type="multipart/form-data")
+        self.assertEqual(response.status_code, 200)
+        with sqlite3.connect(DB_DIR / "expirations.db") as db:
+            (length,) = db.execute("SELECT ciphertext_length FROM expirations WHERE file_id = '1003'").fetchone()
+        self.assertEqual(length, len(container))
+
+    @patch("app.verify_proof", return_value=True)
+    def test_packed_upload_round_trip(self, mock_verify):
+        """Test that small uploads go into pack slots and download unchanged"""
+        contents = {"1004": b"\x01small ciphertext\x00", "1005": b"\x02" * 1000}
+        with patch.dict(app.config, {"PACK_STORE_ENABLED": True}):
+            for file_id, content in contents.items():
+                data = self._session_form(file_id)
+                data["file"] = (io.BytesIO(content), "test.ezra")
+                response = self.client.post("/upload", data=data, content_type="multipart/form-data")
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(upload_path(file_id, "ezra").exists())
+
+            (pack_a, offset_a), (pack_b, offset_b) = packs.locate("1004"), packs.locate("1005")
+            self.assertEqual(pack_a, pack_b)
+            self.assertEqual(offset_b - offset_a, PACK_SLOT_SIZE)
+            # Packs only ever grow in whole padded slots
+            self.assertEqual(pack_a.stat().st_size % PACK_SLOT_SIZE, 0)
+
+            proof = json.loads(self._session_form("1002")["zk_proof"])
+            for file_id, content in contents.items():
+                response = self.client.post("/download", json={"proof": proof, "public": [file_id]},
+                                            headers={"Accept": "application/octet-stream"})
+                self.assertEqual(response.data, content)
+                response = self.client.post("/download", json={"proof": proof, "public": [file_id]})
+                self.assertEqual(base64.b64decode(response.get_json()["ciphertext"]), content)
+
+            # Re-uploaded past the smallest bucket, the upload moves out of its slot
+            data = self._session_form("1004")
+            data["file"] = (io.BytesIO(b"\x03" * PACK_SLOT_SIZE), "test.ezra")
+            response = self.client.post("/upload", data=data, content_type="multipart/form-data")
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(packs.locate("1004"))
+            self.assertTrue(upload_path("1004", "ezra").exists())
+
+    @patch("app.verify_proof", return_value=True)
+    def test_packed_download_survives_slot_release(self, mock_verify):
+        """Test that a one-time download of a packed upload isn't cut short by its slot being freed"""
+        # Several response chunks, so most of it is read after the release
+        content = b"\x04packed once" * 30000
+        with patch.dict(app.config, {"PACK_STORE_ENABLED": True}):
+            data = self._session_form("1016")
+            data["file"] = (io.BytesIO(content), "test.ezra")
+            data["delete_after_download"] = "true"
+            self.client.post("/upload", data=data, content_type="multipart/form-data")
+
+            proof = json.loads(self._session_form("1016")["zk_proof"])
+            response = self.client.post("/download", json={"proof": proof, "public": ["1016"]},
+                                        headers={"Accept": "application/octet-stream"}, buffered=False)
+            # The sweeper zeroing the slot while the response is still being sent
+            self.assertEqual(packs.release(["1016"]), 1)
+            self.assertEqual(response.get_data(), content)
+            response.close()
+
+    @patch("app.verify_proof", return_value=True)
+    def test_packed_download_during_compaction(self, mock_verify):
+        """Test that a compaction moving the slot after the download looked it up is harmless"""
+        contents = {"1017": b"\x05first", "1018": b"\x06second", "1019": b"\x07third"}
+        with patch.dict(app.config, {"PACK_STORE_ENABLED": True}), patch.object(packs, "slots", 2):
+            for file_id, content in contents.items():
+                data = self._session_form(file_id)
+                data["file"] = (io.BytesIO(content), "test.ezra")
+                self.client.post("/upload", data=data, content_type="multipart/form-data")
+            # 1019 is alone in the second pack, and the first has a free slot for it
+            packs.release(["1017"])
+            before = packs.locate("1019")
+
+            locate = packs.locate
+
+            def locate_then_compact(file_id):
+                found = locate(file_id)
+                if packs.locate is locate_then_compact:
+                    packs.locate = locate
+                    self.assertEqual(packs.compact(), 1)
+                return found
+
+            packs.locate = locate_then_compact
+            try:
+                proof = json.loads(self._session_form("1019")["zk_proof"])
+                response = self.client.post("/download", json={"proof": proof, "public": ["1019"]},
+                                            headers={"Accept": "application/octet-stream"})
+            finally:
+                packs.__dict__.pop("locate", None)
+
+            self.assertNotEqual(packs.locate("1019"), before)
+            self.assertFalse(before[0].exists())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, contents["1019"])
+
+    @patch("app.verify_proof", return_value=True)
+    def test_download_once_then_gone(self, mock_verify):
+        file_id = "1010"
+        with open(UPLOAD_DIR / f"{file_id}.ezra", "wb") as f:
+            f.write(b"burn after reading")
+
+        with sqlite3.connect(DB_DIR / "expirations.db") as db:
+            db.execute(
+                "INSERT INTO expirations (file_id, expires_at, delete_on_download, ciphertext_length) VALUES (?, ?, ?, ?)",
+                (file_id, 9999999999, 1, 18)
+            )
+
+        fake_proof = {
+            "pi_a": ["1", "2", "1"],
+            "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+            "pi_c": ["5", "6", "1"],
+            "protocol": "groth16",
+            "curve": "bn128"
+        }
+
+        response = self.client.post("/download", json={"proof": fake_proof, "public": [file_id]})
+        self.assertEqual(response.status_code, 200)
+
+        # The pending delete is persisted as an expiry within the grace period
+        record = store.get_file(file_id)
+        self.assertIsNotNone(record["consumed_at"])
+        self.assertLessEqual(record["expires_at"], record["consumed_at"] + app.config["DOWNLOAD_DELETE_DELAY"])
+
+        # A repeat download is refused without verifying the proof again
+        mock_verify.reset_mock()
+        response = self.client.post("/download", json={"proof": fake_proof, "public": [file_id]})
+        self.assertEqual(response.status_code, 410)
+        mock_verify.assert_not_called()
+
+    @patch("app.verify_proof", return_value=True)
+    def test_download_retry_uses_proof_cache(self, mock_verify):
+        file_id = "1011"
+        with open(UPLOAD_DIR / f"{file_id}.ezra", "wb") as f:
+            f.write(b"cached")
+
+        fake_proof = {
+            "pi_a": ["1", "2", "1"],
+            "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+            "pi_c": ["5", "6", "1"],
+            "protocol": "groth16",
+            "curve": "bn128"
+        }
+        hits_before = proof_cache.stats()["hits"]
+        for _ in range(3):
+            response = self.client.post("/download", json={"proof": fake_proof, "public": [file_id]})
+            self.assertEqual(response.status_code, 200)
+
+        # Only the first request ran the verifier
+        self.assertEqual(mock_verify.call_count, 1)
+        self.assertEqual(proof_cache.stats()["hits"] - hits_before, 2)
+
+        # Deleting the file drops its cached result
+        proof_cache.evict_files([file_id])
+        self.assertEqual(proof_cache.stats()["size"], 0)
+
+    @patch("app.verify_proof", side_effect=RuntimeError("engine down"))
+    def test_engine_errors_not_cached(self, mock_verify):
+        fake_proof = {
+            "pi_a": ["1", "2", "1"],
+            "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+            "pi_c": ["5", "6", "1"],
+            "protocol": "groth16",
+            "curve": "bn128"
+        }
+        for _ in range(2):
+            response = self.client.post("/download", json={"proof": fake_proof, "public": ["1002"]})
+            self.assertEqual(response.status_code, 500)
+        self.assertEqual(mock_verify.call_count, 2)
+
+    def test_rate_limit_answers_429(self):
+        secret = base64.b64encode(b"a").decode()
+        with patch.object(limiter, "client_burst", 2):
+            limiter.clear()
+            for _ in range(2):
+                self.assertEqual(self.client.post("/poseidon", json={"secret_b64": secret}).status_code, 200)
+            response = self.client.post("/poseidon", json={"secret_b64": secret})
+            self.assertEqual(response.status_code, 429)
+            self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+
+            # Unlimited routes don't spend tokens, and the limit can be switched off
+            self.assertEqual(self.client.get("/about").status_code, 200)
+            with patch.dict(app.config, {"ADMISSION_ENABLED": False}):
+                self.assertEqual(self.client.post("/poseidon", json={"secret_b64": secret}).status_code, 200)
+
+    @patch("app.verify_proof_batch", return_value=[True])
+    def test_full_verify_queue_answers_503(self, mock_verify):
+        fake_proof = {
+            "pi_a": ["1", "2", "1"],
+            "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+            "pi_c": ["5", "6", "1"],
+            "protocol": "groth16",
+            "curve": "bn128"
+        }
+        with patch.object(verify_gate, "admitted", verify_gate.capacity):
+            response = self.client.post("/verify/batch", json={"items": [{"proof": fake_proof, "public": ["1"]}]})
+            with patch.dict(app.config, {"METRICS_ENABLED": True}):
+                metrics = self.client.get("/metrics").get_data(as_text=True)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+        mock_verify.assert_not_called()
+        self.assertIn('ezra_requests_shed_total{route="/verify/batch",reason="queue_full"}', metrics)
+        self.assertIn("ezra_verify_queue_depth", metrics)
+
+        # An app built with admission off doesn't gate verification
+        ungated = create_app({"ADMISSION_ENABLED": False, "TESTING": True})
+        with patch.object(verify_gate, "admitted", verify_gate.capacity):
+            response = ungated.test_client().post("/verify/batch", json={"items": [{"proof": fake_proof, "public": ["1"]}]})
+        self.assertEqual(response.status_code, 200)
+        mock_verify.assert_called_once()
+
+    def test_create_app_applies_overrides(self):
+        """Test that factory-built apps are independent and routes read their own config"""
+        small = create_app({"MAX_BATCH_SIZE": 1, "TESTING": True})
+        self.assertIsNot(small, app)
+
+        secrets_b64 = [base64.b64encode(b"a").decode(), base64.b64encode(b"b").decode()]
+        response = small.test_client().post("/poseidon/batch", json={"secrets_b64": secrets_b64})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"Maximum batch size is 1", response.data)
+
+        response = self.client.post("/poseidon/batch", json={"secrets_b64": secrets_b64})
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_app_builds_its_own_state(self):
+        """Test that apps with different directories don't share a store, sweeper or proof cache"""
+        with tempfile.TemporaryDirectory() as tmp:
+            other = create_app({"UPLOAD_DIR": Path(tmp) / "uploads", "DB_DIR": Path(tmp) / "db",
+                                "MAX_FILE_COUNT": 1, "TESTING": True})
+            state = app_state(other)
+            try:
+                self.assertEqual(state.store.path, Path(tmp) / "db" / "expirations.db")
+                self.assertIsNot(state.sweeper, app_state(app).sweeper)
+                self.assertIsNot(state.proof_cache, proof_cache)
+                self.assertEqual(state.packs.upload_dir, Path(tmp) / "uploads")
+
+                files = {"file": [(io.BytesIO(b"a"), "a.ezra"), (io.BytesIO(b"b"), "b.ezra")]}
+                response = other.test_client().post("/upload", data={**files, **self._session_form("1006")},
+                                                    content_type="multipart/form-data")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(b"Maximum allowed is 1", response.data)
+
+                response = other.test_client().post("/upload", data={"file": (io.BytesIO(b"x" * 10), "x.ezra"),
+                                                                     **self._session_form("1006")},
+                                                    content_type="multipart/form-data")
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNotNone(state.store.get_file("1006"))
+                self.assertIsNone(store.get_file("1006"))
+                self.assertTrue(upload_path("1006", "ezra", Path(tmp) / "uploads").exists())
+            finally:
+                state.store.close_all()
+
+    def test_stats_disabled_by_default(self):
+        self.assertEqual(self.client.get("/stats").status_code, 404)
+        with patch.dict(app.config, {"STATS_ENABLED": True}):
+            response = self.client.get("/stats")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("hits", response.get_json()["proof_cache"])
+
+    def test_metrics_endpoint(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+        with open(self.test_file.name, "rb") as f:
+            data = {"file": (f, "test.ezra"), **self._session_form("1007")}
+            self.assertEqual(self.client.post("/upload", data=data, content_type="multipart/form-data").status_code, 200)
+
+        with patch.dict(app.config, {"METRICS_ENABLED": True}):
+            response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith("text/plain"))
+        text = response.get_data(as_text=True)
+        self.assertIn('ezra_stage_seconds_count{route="upload",stage="pad"}', text)
+        self.assertIn('ezra_request_seconds_count{route="/upload",status="200"}', text)
+        self.assertIn("ezra_bytes_stored_total", text)
+
+    def test_upload_records_ciphertext_length(self):
+        secret = base64.b64encode(b"test_secret_32_bytes_here_______").decode()
+        fake_proof = {
+            "pi_a": ["1", "2", "1"],
+            "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+            "pi_c": ["5", "6", "1"],
+            "protocol": "groth16",
+            "curve": "bn128"
+        }
+
+        with open(self.test_file.name, "rb") as f:
+            data = {
+                "file": (f, "test.ezra"),
+                "secret": secret,
+                "zk_proof": json.dumps(fake_proof),
+                "zk_public": json.dumps(["555"]),
+                "expire_hours": "24",
+            }
+            response = self.client.post("/upload", data=data, content_type="multipart/form-data")
+        self.assertEqual(response.status_code, 200)
+
+        with sqlite3.connect(DB_DIR / "expirations.db") as db:
+            row = db.execute("SELECT ciphertext_length FROM expirations WHERE file_id = ?", ("555",)).fetchone()
+        self.assertEqual(row[0], len(b"Encrypted test content"))
+
     def test_download_invalid_proof_structure(self):
         bad_cases = [
             {"proof": "not_a_dict", "public": ["id"]},
@@ -234,9 +903,25 @@ class FlaskRouteTests(unittest.TestCase):
                                          content_type="application/json")
             self.assertEqual(response.status_code, 400)
 
-    @patch("subprocess.run", side_effect=Exception("snarkjs failed"))
-    def test_download_proof_verification_error(self, mock_subprocess):
-        file_id = "error_test"
+    def test_file_id_must_be_decimal(self):
+        """Test that a public[0] that isn't a decimal string is refused before any path is built"""
+        fake_proof = {"pi_a": [], "pi_b": [], "pi_c": [], "protocol": "groth16", "curve": "bn128"}
+        for public in ([123], [["1"]], [{"id": "1"}], ["../../etc/passwd"], ["12ab"], [""], ["1" * 79]):
+            response = self.client.post("/download", json={"proof": fake_proof, "public": public})
+            self.assertEqual(response.status_code, 400, public)
+
+            form = {**self._session_form("1"), "zk_public": json.dumps(public)}
+            with open(self.test_file.name, "rb") as f:
+                response = self.client.post("/upload", data={"file": (f, "test.ezra"), **form},
+                                            content_type="multipart/form-data")
+            self.assertEqual(response.status_code, 400, public)
+        self.assertEqual(self.client.post("/upload", data={
+            "file": (io.BytesIO(b"x"), "test.ezra"), **self._session_form("1"), "zk_public": "{}"
+        }, content_type="multipart/form-data").status_code, 400)
+
+    @patch("app.verify_proof", side_effect=Exception("snarkjs failed"))
+    def test_download_proof_verification_error(self, mock_verify):
+        file_id = "1012"
         
         # Create file
         with open(UPLOAD_DIR / f"{file_id}.ezra", "wb") as f:
@@ -256,10 +941,29 @@ class FlaskRouteTests(unittest.TestCase):
         
         self.assertEqual(response.status_code, 500)
 
-    @patch("subprocess.run")
-    def test_download_file_not_found(self, mock_subprocess):
-        mock_subprocess.return_value = None
-        
+    @patch("app.verify_proof", return_value=False)
+    def test_download_invalid_proof(self, mock_verify):
+        file_id = "1013"
+
+        with open(UPLOAD_DIR / f"{file_id}.ezra", "wb") as f:
+            f.write(b"content")
+
+        fake_proof = {
+            "pi_a": ["1", "2", "1"],
+            "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+            "pi_c": ["5", "6", "1"],
+            "protocol": "groth16",
+            "curve": "bn128"
+        }
+
+        response = self.client.post("/download",
+                                     json={"proof": fake_proof, "public": [file_id]},
+                                     content_type="application/json")
+
+        self.assertEqual(response.status_code, 403)
+
+    @patch("app.verify_proof", return_value=True)
+    def test_download_file_not_found(self, mock_verify):
         fake_proof = {
             "pi_a": ["1", "2", "1"],
             "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
@@ -269,7 +973,7 @@ class FlaskRouteTests(unittest.TestCase):
         }
         
         response = self.client.post("/download", 
-                                     json={"proof": fake_proof, "public": ["nonexistent"]},
+                                     json={"proof": fake_proof, "public": ["1014"]},
                                      content_type="application/json")
         
         self.assertEqual(response.status_code, 404)
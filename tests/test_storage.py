@@ -4,16 +4,30 @@ import tempfile
 from pathlib import Path
 from zipfile import ZipFile
 import io
+import struct
 import sys
+import tracemalloc
+from unittest.mock import patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server'))) 
-from storage import create_ezra_archive, pad_file_to_exact_size, timestomp, pad_file_reasonably
+import storage
+from storage import create_ezra_archive, iter_ezra_archive, write_ezra_archive, pad_file_to_exact_size, timestomp, pad_file_reasonably, padded_size, unpadded_length, iter_file_chunks
+from storage import (ContainerHeader, ContainerError, parse_container_header, validate_container, container_length,
+                     iter_container_segments, CONTAINER_HEADER_SIZE, SEGMENT_TAG_SIZE)
 
 from dotenv import load_dotenv
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', 'server/', '.env')
 load_dotenv(dotenv_path)
 
 
+def make_container(plaintext_length: int, segment_size: int = 4096) -> bytes:
+    """
+    A version 2 container with random bytes in place of the sealed segments; the server never decrypts them.
+    """
+    header = ContainerHeader(segment_size, plaintext_length, b"\x01" * 8)
+    return header.pack() + os.urandom(header.length - CONTAINER_HEADER_SIZE)
+
+
 class StorageTests(unittest.TestCase):
     def setUp(self):
         self.temp_dir = tempfile.TemporaryDirectory()
@@ -68,6 +82,105 @@ class StorageTests(unittest.TestCase):
             names = zipf.namelist()
             self.assertIn("special-file_123.dat", names)
 
+    def _archive_inputs(self):
+        compressible = Path(self.temp_dir.name) / "text.txt"
+        compressible.write_bytes(b"EZRA " * 100000)
+        ciphertext = Path(self.temp_dir.name) / "container.ezra"
+        ciphertext.write_bytes(os.urandom(300000))
+        empty = Path(self.temp_dir.name) / "empty.dat"
+        empty.write_bytes(b"")
+        return [compressible, ciphertext, empty, self.test_file1]
+
+    def _assert_archive(self, zip_bytes, paths):
+        with ZipFile(io.BytesIO(zip_bytes), 'r') as zipf:
+            self.assertIsNone(zipf.testzip())
+            self.assertEqual(zipf.namelist(), [p.name for p in paths])
+            for path in paths:
+                self.assertEqual(zipf.read(path.name), path.read_bytes())
+            return {info.filename: info for info in zipf.infolist()}
+
+    def test_archive_compression(self):
+        """Test that members are deflated with a compression level, serially and in parallel"""
+        paths = self._archive_inputs()
+        stored = create_ezra_archive(paths)
+        self._assert_archive(stored, paths)
+
+        serial = create_ezra_archive(paths, compresslevel=6)
+        infos = self._assert_archive(serial, paths)
+        self.assertEqual(infos["text.txt"].compress_type, 8)
+        self.assertLess(len(serial), len(stored))
+
+        parallel = create_ezra_archive(paths, compresslevel=6, workers=3)
+        infos = self._assert_archive(parallel, paths)
+        self.assertEqual(infos["text.txt"].compress_type, 8)
+        # Ciphertext doesn't shrink, so the parallel writer stores it instead
+        self.assertEqual(infos["container.ezra"].compress_type, 0)
+        self.assertEqual(infos["container.ezra"].compress_size, 300000)
+
+    def test_archive_streams_in_chunks(self):
+        """Test that a large member is never held in memory as a whole"""
+        big = Path(self.temp_dir.name) / "big.ezra"
+        with open(big, "wb") as f:
+            for _ in range(16):
+                f.write(os.urandom(1024 * 1024))
+
+        for workers in (1, 2):
+            tracemalloc.start()
+            try:
+                total = sum(len(chunk) for chunk in iter_ezra_archive([big], compresslevel=1, workers=workers))
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertGreater(total, 16 * 1024 * 1024)
+            self.assertLess(peak, storage.ARCHIVE_SPOOL_SIZE + 4 * 1024 * 1024)
+
+    def test_archive_zip64(self):
+        """Test the ZIP64 records, with the limits lowered so small files cross them"""
+        paths = self._archive_inputs()
+        with patch.object(storage, "ZIP64_LIMIT", 1000), patch.object(storage, "ZIP_FILECOUNT_LIMIT", 2):
+            for level, workers in ((None, 1), (6, 1), (6, 2)):
+                self._assert_archive(create_ezra_archive(paths, level, workers), paths)
+
+    def test_archive_member_headers(self):
+        """Test that stored members have their CRC and sizes up front, and that a ZIP64 local header is repeated centrally"""
+        paths = [self.test_file1, self.test_file2]
+        stored = create_ezra_archive(paths)
+        for path, info in zip(paths, self._assert_archive(stored, paths).values()):
+            self.assertEqual(info.compress_type, 0)
+            self.assertFalse(info.flag_bits & 0x08)
+            # The local header's CRC, compressed size and size, from byte 14 on
+            self.assertEqual(struct.unpack_from("<III", stored, info.header_offset + 14),
+                             (info.CRC, info.file_size, info.file_size))
+
+        # 1000 bytes may deflate past the (lowered) limit, so the local header uses ZIP64 even
+        # though the sizes turn out smaller
+        near = Path(self.temp_dir.name) / "near.txt"
+        near.write_bytes(b"EZRA " * 200)
+        with patch.object(storage, "ZIP64_LIMIT", 1000):
+            deflated = create_ezra_archive([near, self.test_file1], compresslevel=6)
+        infos = self._assert_archive(deflated, [near, self.test_file1])
+        self.assertEqual(infos["near.txt"].compress_type, 8)
+        self.assertTrue(infos["near.txt"].flag_bits & 0x08)
+        self.assertEqual(struct.unpack_from("<HH", infos["near.txt"].extra), (1, 16))
+        self.assertEqual(infos["test1.txt"].extra, b"")
+
+    def test_write_archive_to_fd(self):
+        """Test writing an archive to a file object and to a raw file descriptor"""
+        paths = self._archive_inputs()
+        expected = create_ezra_archive(paths, compresslevel=6)
+
+        out = io.BytesIO()
+        self.assertEqual(write_ezra_archive(paths, out, compresslevel=6), len(expected))
+        self.assertEqual(out.getvalue(), expected)
+
+        target = Path(self.temp_dir.name) / "out.zip"
+        fd = os.open(target, os.O_WRONLY | os.O_CREAT)
+        try:
+            write_ezra_archive(paths, fd, compresslevel=6)
+        finally:
+            os.close(fd)
+        self.assertEqual(target.read_bytes(), expected)
+
     def test_pad_file_to_exact_size(self):
         """Test padding a file to exact target size"""
         pad_path = Path(self.temp_dir.name) / "padme.txt"
@@ -143,6 +256,122 @@ class StorageTests(unittest.TestCase):
         pad_file_reasonably(exact_10mb)
         self.assertEqual(exact_10mb.stat().st_size, 15 * 1024 * 1024)
 
+    def test_pad_file_modes_produce_zero_padding(self):
+        """Test that every padding mode yields the same bytes on read"""
+        for mode in ("fallocate", "write", "sparse"):
+            path = Path(self.temp_dir.name) / f"{mode}.ezra"
+            path.write_bytes(b"tiny")
+
+            pad_file_to_exact_size(path, 3 * 1024 * 1024 + 5, mode=mode)
+
+            self.assertEqual(path.stat().st_size, 3 * 1024 * 1024 + 5, mode)
+            content = path.read_bytes()
+            self.assertEqual(content[:4], b"tiny", mode)
+            self.assertEqual(content[4:].count(0), len(content) - 4, mode)
+
+    def test_pad_file_to_exact_size_rejects_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            pad_file_to_exact_size(self.test_file1, 100, mode="bogus")
+
+    def test_pad_file_reasonably_returns_real_length(self):
+        """Test that padding reports the unpadded length for the caller to record"""
+        path = Path(self.temp_dir.name) / "real_length.ezra"
+        path.write_bytes(b"x" * 1234)
+
+        self.assertEqual(pad_file_reasonably(path), 1234)
+        self.assertEqual(path.stat().st_size, 1024 * 1024)
+
+    def test_padded_size_buckets(self):
+        self.assertEqual(padded_size(0), 1024 * 1024)
+        self.assertEqual(padded_size(1024 * 1024), 2 * 1024 * 1024)
+        self.assertEqual(padded_size(10 * 1024 * 1024), 15 * 1024 * 1024)
+
+    def test_unpadded_length_across_chunks(self):
+        """Test that trailing padding is found even when it spans several read chunks"""
+        path = Path(self.temp_dir.name) / "padded.ezra"
+        path.write_bytes(b"data" + b"\x00" * 10000)
+        self.assertEqual(unpadded_length(path, chunk_size=1024), 4)
+
+        path.write_bytes(b"\x00" * 3000)
+        self.assertEqual(unpadded_length(path, chunk_size=1024), 0)
+
+    def test_container_header_layout(self):
+        header = ContainerHeader(4096, 10000, b"\x01" * 8)
+        raw = header.pack()
+        self.assertEqual(len(raw), CONTAINER_HEADER_SIZE)
+        self.assertEqual(raw[:5], b"EZRA\x02")
+        self.assertEqual(parse_container_header(raw), header)
+
+        # 4096 + 4096 + 1808 plaintext bytes, each segment with its tag
+        self.assertEqual(header.segments, 3)
+        self.assertEqual(header.length, 32 + 10000 + 3 * SEGMENT_TAG_SIZE)
+        self.assertEqual(header.segment_span(1), (32 + 4112, 4112))
+        self.assertEqual(header.segment_span(2), (32 + 2 * 4112, 1808 + SEGMENT_TAG_SIZE))
+        self.assertEqual(header.nonce(2), b"\x01" * 8 + b"\x00\x00\x00\x02")
+        # An empty archive is still one (empty) segment, which authenticates the header
+        self.assertEqual(ContainerHeader(4096, 0, b"\x00" * 8).length, 32 + SEGMENT_TAG_SIZE)
+
+    def test_parse_container_header_rejects_bad_fields(self):
+        raw = bytearray(ContainerHeader(4096, 10, b"\x00" * 8).pack())
+        # No magic: a version 1 container, which starts with its random IV
+        self.assertIsNone(parse_container_header(b"\x9a" * 12 + b"ciphertext"))
+
+        for index, value in ((4, 3), (5, 1), (10, 0), (31, 1)):
+            bad = bytearray(raw)
+            bad[index] = value
+            with self.assertRaises(ContainerError):
+                parse_container_header(bytes(bad))
+        with self.assertRaises(ContainerError):
+            parse_container_header(bytes(raw[:20]))
+
+    def test_validate_container_checks_size(self):
+        path = Path(self.temp_dir.name) / "upload.ezra"
+        container = make_container(10000)
+        path.write_bytes(container)
+        self.assertEqual(validate_container(path).plaintext_length, 10000)
+
+        path.write_bytes(container[:-1])
+        with self.assertRaises(ContainerError):
+            validate_container(path)
+        path.write_bytes(container + b"\x00")
+        with self.assertRaises(ContainerError):
+            validate_container(path)
+
+        path.write_bytes(os.urandom(12) + b"legacy ciphertext")
+        self.assertIsNone(validate_container(path))
+
+    def test_container_length_from_header(self):
+        """Test that a v2 container ending in zero bytes isn't mistaken for padding"""
+        path = Path(self.temp_dir.name) / "zeros.ezra"
+        container = make_container(5000)[:-SEGMENT_TAG_SIZE] + bytes(SEGMENT_TAG_SIZE)
+        path.write_bytes(container)
+        pad_file_reasonably(path)
+
+        self.assertEqual(container_length(path), len(container))
+        self.assertLess(unpadded_length(path), len(container))
+
+    def test_iter_container_segments(self):
+        path = Path(self.temp_dir.name) / "segments.ezra"
+        container = make_container(10000)
+        path.write_bytes(b"slot" + container)
+
+        segments = list(iter_container_segments(path, offset=4))
+        self.assertEqual([(index, len(sealed)) for index, _, sealed in segments], [(0, 4112), (1, 4112), (2, 1824)])
+        self.assertEqual(b"".join(sealed for _, _, sealed in segments), container[CONTAINER_HEADER_SIZE:])
+        self.assertEqual(segments[1][1], b"\x01" * 8 + b"\x00\x00\x00\x01")
+
+        path.write_bytes(b"slot" + container[:-1])
+        with self.assertRaises(ContainerError):
+            list(iter_container_segments(path, offset=4))
+
+    def test_iter_file_chunks_stops_at_length(self):
+        """Test that chunked reads stop at the requested length"""
+        path = Path(self.temp_dir.name) / "chunks.ezra"
+        path.write_bytes(b"abcdefghij" + b"\x00" * 100)
+
+        chunks = list(iter_file_chunks(path, 10, chunk_size=3))
+        self.assertEqual(chunks, [b"abc", b"def", b"ghi", b"j"])
+
     def test_timestomp_sets_epoch(self):
         """Test that timestomping sets mtime and atime to epoch (0)"""
         timestomp([self.test_file1])
@@ -0,0 +1,175 @@
+import unittest
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from metadata import MetadataStore
+from paths import upload_path
+from sweeper import ExpirySweeper
+
+
+class ExpirySweeperTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.upload_dir = Path(self.temp_dir.name) / "uploads"
+        self.upload_dir.mkdir()
+        self.store = MetadataStore(Path(self.temp_dir.name) / "expirations.db")
+        self.store.init_schema()
+        self.sweeper = ExpirySweeper(self.store, self.upload_dir, horizon=60, batch_size=4, session_ttl=100)
+
+    def tearDown(self):
+        self.sweeper.stop()
+        self.store.close_all()
+        self.temp_dir.cleanup()
+
+    def add_upload(self, file_id, expires_at):
+        path = upload_path(file_id, "ezra", self.upload_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+        self.store.record_file(file_id, expires_at, False, 1)
+
+    def test_expiry_index_used(self):
+        """Test that the expiry query is an index range scan, not a table scan"""
+        plan = self.store.execute(
+            "EXPLAIN QUERY PLAN SELECT file_id, expires_at FROM expirations WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+            (0, 1)
+        ).fetchall()
+        self.assertIn("idx_expirations_expires_at", " ".join(row[-1] for row in plan))
+
+    def test_sweep_all_removes_only_expired(self):
+        for i in range(10):
+            self.add_upload(f"old{i}", 100 + i)
+        self.add_upload("fresh", 10_000)
+
+        removed = self.sweeper.sweep_all(now=1000)
+
+        # More than one batch of 4 was needed
+        self.assertEqual(removed, 10)
+        self.assertEqual([row["file_id"] for row in self.store.all_files()], ["fresh"])
+        self.assertEqual(sorted(p.name for p in self.upload_dir.rglob("*") if p.is_file()), ["fresh.ezra"])
+
+    def test_on_delete_called_with_swept_ids(self):
+        deleted = []
+        self.sweeper.on_delete = deleted.extend
+        self.add_upload("gone", 100)
+        self.add_upload("kept", 10_000)
+
+        self.sweeper.sweep_all(now=1000)
+        self.assertEqual(deleted, ["gone"])
+
+    def test_replaced_row_not_deleted(self):
+        """Test that an entry whose expiry moved later is re-checked before deleting"""
+        self.add_upload("moved", 100)
+        self.sweeper.refill(50)
+        self.store.record_file("moved", 5000, False, 1)
+
+        self.assertEqual(self.sweeper.sweep_due(200), 0)
+        self.assertIsNotNone(self.store.get_file("moved"))
+        self.assertTrue(upload_path("moved", "ezra", self.upload_dir).exists())
+
+    def test_recreated_upload_keeps_files_and_slot(self):
+        """Test that an upload re-created after its old expiry was queued loses nothing"""
+        self.add_upload("reused", 100)
+        staged = self.upload_dir / "reused.stage"
+        staged.write_bytes(b"packed")
+        self.sweeper.packs.put("reused", staged)
+        self.sweeper.refill(50)
+        # Re-uploaded: a new row with a later expiry
+        self.store.record_file("reused", 5000, False, 1)
+
+        self.assertEqual(self.sweeper.sweep_due(200), 0)
+        self.assertEqual(self.store.get_file("reused")["expires_at"], 5000)
+        self.assertTrue(upload_path("reused", "ezra", self.upload_dir).exists())
+        self.assertIsNotNone(self.sweeper.packs.locate("reused"))
+
+    def test_schedule_within_window(self):
+        self.sweeper.refill(0)
+        self.add_upload("soon", 30)
+        self.add_upload("later", 500)
+        self.sweeper.schedule("soon", 30)
+        self.sweeper.schedule("later", 500)
+
+        # Only the expiry inside the loaded window is held in memory
+        self.assertEqual(self.sweeper._heap, [(30, "soon")])
+        self.assertEqual(self.sweeper.sweep_due(30), 1)
+        self.assertIsNone(self.store.get_file("soon"))
+
+    def test_stale_sessions_removed(self):
+        self.store.create_session("stale", 0)
+        self.store.create_session("live", 950)
+        (self.upload_dir / "stale.part").write_bytes(b"x")
+        (self.upload_dir / "live.part").write_bytes(b"x")
+
+        self.assertEqual(self.sweeper.sweep_sessions(1000), 1)
+        self.assertIsNone(self.store.get_session("stale"))
+        self.assertFalse((self.upload_dir / "stale.part").exists())
+        self.assertTrue((self.upload_dir / "live.part").exists())
+
+    def test_orphaned_staging_files_removed(self):
+        """Test that old .part files without a session go, and recent or live ones stay"""
+        now = int(time.time())
+        self.store.create_session("live", now)
+        for name in ("orphan.part", "live.part", "fresh.part", "123.ezra"):
+            (self.upload_dir / name).write_bytes(b"x")
+        for name in ("orphan.part", "live.part", "123.ezra"):
+            os.utime(self.upload_dir / name, (now - 500, now - 500))
+
+        self.assertEqual(self.sweeper.sweep_staging(now), 1)
+        self.assertEqual(sorted(p.name for p in self.upload_dir.iterdir()), ["123.ezra", "fresh.part", "live.part"])
+
+    def test_background_thread_deletes_on_expiry(self):
+        self.sweeper.start()
+        expires_at = int(time.time()) + 1
+        self.add_upload("ticking", expires_at)
+        self.sweeper.schedule("ticking", expires_at)
+
+        deadline = time.time() + 5
+        while self.store.get_file("ticking") is not None and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertIsNone(self.store.get_file("ticking"))
+        self.assertFalse(upload_path("ticking", "ezra", self.upload_dir).exists())
+
+    def test_one_second_horizon_does_not_busy_loop(self):
+        refills = []
+        expiring_before = self.store.expiring_before
+
+        def counted(cutoff, limit):
+            refills.append(cutoff)
+            return expiring_before(cutoff, limit)
+
+        self.store.expiring_before = counted
+        sweeper = ExpirySweeper(self.store, self.upload_dir, horizon=1, batch_size=4)
+        sweeper.start()
+        time.sleep(1.5)
+        sweeper.stop()
+        # About one refill a second, not one per loop iteration
+        self.assertLessEqual(len(refills), 4)
+
+    def test_truncated_window_does_not_refill_early(self):
+        """Test that more than a batch of rows in one future second doesn't busy-loop the refills"""
+        refills = []
+        expiring_before = self.store.expiring_before
+
+        def counted(cutoff, limit):
+            refills.append(cutoff)
+            return expiring_before(cutoff, limit)
+
+        self.store.expiring_before = counted
+        expires_at = int(time.time()) + 2
+        for i in range(10):
+            self.add_upload(f"crowd{i}", expires_at)
+        self.sweeper.start()
+
+        deadline = time.time() + 6
+        while self.store.all_files() and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.store.all_files(), [])
+        # One refill per batch of 4, plus the first and last reads
+        self.assertLessEqual(len(refills), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+import telemetry
+from telemetry import Metric, Counter, Histogram, Gauge, render, snapshot, collect, write_snapshot, log
+
+
+class MetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.registry = []
+        self.requests = Counter("test_requests_total", "Requests", ("route",), registry=self.registry)
+        self.latency = Histogram("test_latency_seconds", "Latency", buckets=(0.1, 1), registry=self.registry)
+
+    def test_counter_labels(self):
+        self.requests.labels(route="/upload").inc()
+        self.requests.labels(route="/upload").inc(2)
+        self.requests.labels(route="/download").inc()
+
+        text = render(snapshot(self.registry), self.registry)
+        self.assertIn("# TYPE test_requests_total counter", text)
+        self.assertIn('test_requests_total{route="/upload"} 3', text)
+        self.assertIn('test_requests_total{route="/download"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in (0.05, 0.1, 0.5, 3):
+            self.latency.observe(value)
+
+        text = render(snapshot(self.registry), self.registry)
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{le="1.0"} 3', text)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn("test_latency_seconds_count 4", text)
+        self.assertIn("test_latency_seconds_sum 3.65", text)
+
+    def test_timer(self):
+        with self.latency.time():
+            pass
+        counts, total = snapshot(self.registry)["test_latency_seconds"][0][1]
+        self.assertEqual(counts[0], 1)
+        self.assertLess(total, 0.1)
+
+    def test_gauge_reads_at_scrape_time(self):
+        value = [1]
+        Gauge("test_entries", "Entries", lambda: value[0], registry=self.registry)
+        value[0] = 7
+        self.assertIn("test_entries 7.0", render(snapshot(self.registry), self.registry))
+
+    def test_merges_other_worker_snapshots(self):
+        """Test that a scrape adds the snapshots other workers wrote to METRICS_DIR"""
+        with tempfile.TemporaryDirectory() as tmp, patch.object(telemetry, "METRICS_DIR", tmp):
+            self.requests.labels(route="/upload").inc(2)
+            self.latency.observe(0.5)
+            # Pretend another worker wrote the same values
+            other = snapshot(self.registry)
+            with open(os.path.join(tmp, "999999.json"), "w") as f:
+                json.dump(other, f)
+            # Our own snapshot file is ignored in favour of the live values
+            write_snapshot(self.registry)
+
+            data = collect(self.registry)
+
+        self.assertEqual(data["test_requests_total"], [[["/upload"], 4]])
+        counts, total = data["test_latency_seconds"][0][1]
+        self.assertEqual(sum(counts), 2)
+        self.assertAlmostEqual(total, 1.0)
+
+    def test_exited_worker_snapshots_are_folded(self):
+        """Test that old snapshots of exited workers end up in one file and still count once"""
+        exited = [subprocess.Popen([sys.executable, "-c", "pass"]) for _ in range(2)]
+        for proc in exited:
+            proc.wait()
+        self.requests.labels(route="/upload").inc()
+        self.latency.observe(0.5)
+        old = time.time() - 2 * telemetry.METRICS_RETIRE_AFTER
+
+        with tempfile.TemporaryDirectory() as tmp, patch.object(telemetry, "METRICS_DIR", tmp):
+            # Two exited workers and one that is running (our parent) but has gone quiet
+            for pid in (exited[0].pid, exited[1].pid, os.getppid()):
+                path = os.path.join(tmp, f"{pid}.json")
+                with open(path, "w") as f:
+                    json.dump(snapshot(self.registry), f)
+                os.utime(path, (old, old))
+
+            first = collect(self.registry)
+            files = sorted(os.listdir(tmp))
+            second = collect(self.registry)
+
+        self.assertEqual(files, [f"{os.getppid()}.json", "retired.json", "retired.lock"])
+        self.assertEqual(first["test_requests_total"], [[["/upload"], 4]])
+        self.assertEqual(second, first)
+
+    def test_metric_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Metric("test_metric", "Metric", registry=self.registry)
+
+
+class LogTests(unittest.TestCase):
+    def test_text_format(self):
+        out = io.StringIO()
+        with patch.object(telemetry, "LOG_FORMAT", "text"), redirect_stdout(out):
+            log("UPLOAD", "Stored file with ID: 1", file_id="1")
+        self.assertEqual(out.getvalue(), "[UPLOAD] Stored file with ID: 1\n")
+
+    def test_json_format(self):
+        out = io.StringIO()
+        with patch.object(telemetry, "LOG_FORMAT", "json"), redirect_stdout(out):
+            log("UPLOAD", "Stored file with ID: 1", file_id="1", bytes=22)
+            log("!", "Sweeper error: boom")
+        first, second = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(first["event"], "upload")
+        self.assertEqual(first["file_id"], "1")
+        self.assertEqual(first["bytes"], 22)
+        self.assertEqual(second["level"], "warning")
+
+
+if __name__ == "__main__":
+    unittest.main()
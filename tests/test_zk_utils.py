@@ -3,9 +3,16 @@ from unittest.mock import patch, MagicMock
 import subprocess
 import sys
 import os
+import shutil
+import tempfile
+import textwrap
+import json
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server'))) 
-from zk_utils import poseidon_hash
+from zk_utils import (poseidon_hash, poseidon_hash_batch, poseidon_hash_node, VerifierPool, ZKEngineError,
+                      ProofCache, proof_digest, verify_proof_cli)
+from paths import NODE_MODULES_DIR
+from poseidon import poseidon, js_constants, POSEIDON_JS_CONSTANTS_PATH
 
 from dotenv import load_dotenv
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', 'server/', '.env')
@@ -21,7 +28,7 @@ class ZKTests(unittest.TestCase):
         mock_result.stdout = "1234567890\n"
         mock_run.return_value = mock_result
 
-        hash_val = poseidon_hash(123456)
+        hash_val = poseidon_hash_node(123456)
         
         self.assertEqual(hash_val, "1234567890")
         mock_run.assert_called_once()
@@ -45,7 +52,7 @@ class ZKTests(unittest.TestCase):
         mock_run.side_effect = error
 
         with self.assertRaises(subprocess.CalledProcessError):
-            poseidon_hash(999)
+            poseidon_hash_node(999)
 
     @patch("zk_utils.subprocess.run")
     def test_poseidon_hash_strips_whitespace(self, mock_run):
@@ -54,7 +61,7 @@ class ZKTests(unittest.TestCase):
         mock_result.stdout = "  9876543210  \n\n"
         mock_run.return_value = mock_result
 
-        hash_val = poseidon_hash(42)
+        hash_val = poseidon_hash_node(42)
         
         self.assertEqual(hash_val, "9876543210")
 
@@ -62,7 +69,7 @@ class ZKTests(unittest.TestCase):
         """Integration test - actually runs Node.js if available"""
         try:
             # This will only work if node and circomlibjs are installed
-            hash_val = poseidon_hash(123)
+            hash_val = poseidon_hash_node(123)
             
             # Basic sanity checks
             self.assertIsInstance(hash_val, str)
@@ -70,12 +77,286 @@ class ZKTests(unittest.TestCase):
             self.assertGreater(len(hash_val), 0)
             
             # Same input should give same output (deterministic)
-            hash_val2 = poseidon_hash(123)
+            hash_val2 = poseidon_hash_node(123)
             self.assertEqual(hash_val, hash_val2)
+
+            # The in-process hasher must agree with circomlibjs bit for bit
+            self.assertEqual(poseidon_hash(123), hash_val)
+            secret = int.from_bytes(b"test_secret_32_bytes_padded_here", "big")
+            self.assertEqual(poseidon_hash(secret), poseidon_hash_node(secret))
             
         except (subprocess.CalledProcessError, FileNotFoundError) as e:
             self.skipTest(f"Node.js or circomlibjs not available: {e}")
 
+    def test_poseidon_hash_known_vectors(self):
+        """Test the in-process hasher against circomlibjs' published test vectors"""
+        self.assertEqual(
+            poseidon_hash(1),
+            "18586133768512220936620570745912940619677854269274689475585506675881198879027"
+        )
+        self.assertEqual(
+            str(poseidon([1, 2])),
+            "7853200120776062878684798364095072458815029376092732009249414926327459813530"
+        )
+
+    def test_poseidon_hash_batch_matches_single(self):
+        """Test that batch hashing returns the same hashes, in order"""
+        secrets = [1, 123, 2**255 + 7]
+        self.assertEqual(poseidon_hash_batch(secrets), [poseidon_hash(s) for s in secrets])
+
+    def test_poseidon_hash_reduces_into_field(self):
+        """Test that 256-bit secrets are reduced mod p like circomlibjs' F.e()"""
+        p = 21888242871839275222246405745257275088548364400416034343698204186575808495617
+        self.assertEqual(poseidon_hash(p + 123), poseidon_hash(123))
+
+    def test_browser_constants_up_to_date(self):
+        """Test that static/poseidon_constants.js matches the circuit's constants"""
+        self.assertEqual(POSEIDON_JS_CONSTANTS_PATH.read_text(), js_constants())
+
+    def test_browser_poseidon_matches(self):
+        """Test that static/poseidon.js hashes like the server"""
+        if not shutil.which("node"):
+            self.skipTest("Node.js not available")
+        secrets = [1, 123, 2**255 + 7]
+        script = textwrap.dedent(f"""
+            globalThis.window = globalThis;
+            require({json.dumps(str(POSEIDON_JS_CONSTANTS_PATH))});
+            require({json.dumps(str(POSEIDON_JS_CONSTANTS_PATH.with_name("poseidon.js")))});
+            for (const x of {json.dumps([str(s) for s in secrets])}) console.log(window.poseidonHash([BigInt(x)]).toString());
+        """)
+        result = subprocess.run(["node", "-e", script], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.split(), [poseidon_hash(s) for s in secrets])
+
+    @patch("zk_utils.subprocess.run")
+    def test_poseidon_hash_spawns_no_process(self, mock_run):
+        """Test that the in-process hasher never shells out to Node"""
+        hash_val = poseidon_hash(123456)
+
+        self.assertTrue(hash_val.isdigit())
+        mock_run.assert_not_called()
+
+
+# Speaks the zk_worker.js protocol; accepts proofs whose pi_a[0] is "1", exits on a proof
+# whose pi_a[0] is "crash", and fails any batch holding a proof whose pi_a[0] is "nobatch"
+FAKE_WORKER = textwrap.dedent("""
+    import json, sys
+    print(json.dumps({"id": None, "ok": True, "ready": True}), flush=True)
+    for line in sys.stdin:
+        req = json.loads(line)
+        if req["op"] == "verify" and req["proof"]["pi_a"][0] == "crash":
+            sys.exit(1)
+        if req["op"] == "verify":
+            result = req["proof"]["pi_a"][0] == "1"
+            print(json.dumps({"id": req["id"], "ok": True, "result": result}), flush=True)
+        elif req["op"] == "verify_batch" and any(item["proof"]["pi_a"][0] == "nobatch" for item in req["items"]):
+            print(json.dumps({"id": req["id"], "ok": False, "error": "pairing failed"}), flush=True)
+        elif req["op"] == "verify_batch":
+            result = [item["proof"]["pi_a"][0] == "1" for item in req["items"]]
+            print(json.dumps({"id": req["id"], "ok": True, "result": result}), flush=True)
+        else:
+            print(json.dumps({"id": req["id"], "ok": False, "error": "bad op"}), flush=True)
+""")
+
+
+class VerifierPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.worker_path = os.path.join(self.temp_dir.name, "fake_worker.py")
+        with open(self.worker_path, "w") as f:
+            f.write(FAKE_WORKER)
+        self.pool = VerifierPool(size=2, command=[sys.executable, self.worker_path], timeout=5)
+
+    def tearDown(self):
+        self.pool.close()
+        self.temp_dir.cleanup()
+
+    def test_verify_accepts_and_rejects(self):
+        self.assertTrue(self.pool.verify({"pi_a": ["1"]}, ["42"]))
+        self.assertFalse(self.pool.verify({"pi_a": ["2"]}, ["42"]))
+
+    def test_verify_batch_single_round_trip(self):
+        items = [
+            {"proof": {"pi_a": ["1"]}, "public": ["1"]},
+            {"proof": {"pi_a": ["2"]}, "public": ["2"]},
+            {"proof": {"pi_a": ["1"]}, "public": ["3"]},
+        ]
+        self.assertEqual(self.pool.verify_batch(items), [True, False, True])
+        self.assertEqual(self.pool.verify_batch([]), [])
+
+        # The whole batch went to one worker as one request
+        self.assertEqual(sum(w._next_id for w in self.pool.workers), 1)
+
+    def test_verify_batch_falls_back_to_single_proofs(self):
+        """Test that a batch the worker fails on is answered by verifying each proof on its own"""
+        items = [
+            {"proof": {"pi_a": ["1"]}, "public": ["1"]},
+            {"proof": {"pi_a": ["nobatch"]}, "public": ["2"]},
+            {"proof": {"pi_a": ["1"]}, "public": ["3"]},
+        ]
+        self.assertEqual(self.pool.verify_batch(items), [True, False, True])
+        # The failed batch, then one request per proof
+        self.assertEqual(sum(w._next_id for w in self.pool.workers), 4)
+
+    def test_verify_batch_respawns_exited_worker(self):
+        pool = VerifierPool(size=1, command=[sys.executable, self.worker_path], timeout=5)
+        try:
+            self.assertEqual(pool.verify_batch([{"proof": {"pi_a": ["1"]}, "public": ["1"]}]), [True])
+            worker = pool.workers[0]
+            first = worker.proc
+            first.kill()
+            first.wait()
+
+            # The exited process is noticed and replaced before the next request is sent
+            self.assertEqual(pool.verify_batch([{"proof": {"pi_a": ["2"]}, "public": ["1"]}]), [False])
+            self.assertTrue(worker.alive())
+            self.assertNotEqual(worker.proc.pid, first.pid)
+        finally:
+            pool.close()
+
+    def test_worker_is_reused(self):
+        self.pool.verify({"pi_a": ["1"]}, ["42"])
+        started = [w for w in self.pool.workers if w.alive()]
+        self.assertEqual(len(started), 1)
+        pid = started[0].proc.pid
+
+        # Sequential requests keep hitting the same warm process
+        self.pool.verify({"pi_a": ["1"]}, ["42"])
+        self.assertEqual([w.proc.pid for w in self.pool.workers if w.alive()], [pid])
+
+    def test_worker_error_raises(self):
+        with self.assertRaises(ZKEngineError):
+            self.pool.request("unknown")
+
+    def test_crashed_worker_restarts(self):
+        with self.assertRaises(ZKEngineError):
+            self.pool.verify({"pi_a": ["crash"]}, ["42"])
+        self.assertTrue(self.pool.verify({"pi_a": ["1"]}, ["42"]))
+
+    def test_missing_binary_raises(self):
+        pool = VerifierPool(size=1, command=["/nonexistent/ezra-node"])
+        with self.assertRaises(ZKEngineError):
+            pool.verify({"pi_a": ["1"]}, ["42"])
+
+    def test_snarkjs_worker_integration(self):
+        """Integration test - runs zk_worker.js if Node.js and snarkjs are available"""
+        if not shutil.which("node") or not (NODE_MODULES_DIR / "snarkjs").exists():
+            self.skipTest("Node.js or snarkjs not available")
+
+        pool = VerifierPool(size=1)
+        try:
+            bogus = {
+                "pi_a": ["1", "2", "1"],
+                "pi_b": [["1", "2"], ["3", "4"], ["1", "0"]],
+                "pi_c": ["5", "6", "1"],
+                "protocol": "groth16",
+                "curve": "bn128"
+            }
+            self.assertFalse(pool.verify(bogus, ["123"]))
+        finally:
+            pool.close()
+
+
+# Stands in for the snarkjs CLI: accepts when the proof says so and the public signals match it
+FAKE_SNARKJS = textwrap.dedent("""\
+    #!{python}
+    import json, sys
+    _, _, _, vkey, public_path, proof_path = sys.argv
+    with open(public_path) as f:
+        public = json.load(f)
+    with open(proof_path) as f:
+        proof = json.load(f)
+    sys.exit(0 if proof.get("ok") and proof.get("for") == public else 1)
+""")
+
+
+class VerifyProofCliTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        script = os.path.join(self.temp_dir.name, "snarkjs")
+        with open(script, "w") as f:
+            f.write(FAKE_SNARKJS.format(python=sys.executable))
+        os.chmod(script, 0o755)
+        self.env = patch.dict(os.environ, {"PATH": self.temp_dir.name + os.pathsep + os.environ.get("PATH", "")})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.temp_dir.cleanup()
+
+    def test_inputs_passed_through_pipes(self):
+        self.assertTrue(verify_proof_cli({"ok": True, "for": ["7"]}, ["7"]))
+        self.assertFalse(verify_proof_cli({"ok": True, "for": ["7"]}, ["8"]))
+        self.assertFalse(verify_proof_cli({"ok": False}, ["7"]))
+
+    def test_large_payload_does_not_block(self):
+        public = [str(i) for i in range(50_000)]
+        self.assertTrue(verify_proof_cli({"ok": True, "for": public}, public))
+
+    def test_concurrent_calls_isolated(self):
+        """Test that concurrent verifications never see each other's inputs"""
+        from concurrent.futures import ThreadPoolExecutor
+        cases = [({"ok": True, "for": [str(i)]}, [str(i if i % 2 else i + 1)]) for i in range(16)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda case: verify_proof_cli(*case), cases))
+        self.assertEqual(results, [i % 2 == 1 for i in range(16)])
+
+    def test_no_files_left_behind(self):
+        artifacts = os.path.join(os.path.dirname(__file__), "..", "artifacts")
+        before = sorted(os.listdir(artifacts))
+        verify_proof_cli({"ok": True, "for": ["1"]}, ["1"])
+        self.assertEqual(sorted(os.listdir(artifacts)), before)
+        self.assertFalse(os.path.exists(os.path.join(artifacts, "tmp_proof.json")))
+
+
+class ProofCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = ProofCache(size=2, ttl=60, clock=lambda: self.now)
+
+    def test_digest_ignores_key_order(self):
+        self.assertEqual(proof_digest({"a": 1, "b": 2}, ["1"]), proof_digest({"b": 2, "a": 1}, ["1"]))
+        self.assertNotEqual(proof_digest({"a": 1}, ["1"]), proof_digest({"a": 1}, ["2"]))
+
+    def test_hit_and_miss_counters(self):
+        self.assertIsNone(self.cache.get("d1"))
+        self.cache.put("d1", "file1", True)
+        self.cache.put("d2", "file2", False)
+
+        self.assertTrue(self.cache.get("d1"))
+        # A cached rejection is a hit too, not a miss
+        self.assertIs(self.cache.get("d2"), False)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (2, 1, 2))
+
+    def test_lru_eviction(self):
+        self.cache.put("d1", "file1", True)
+        self.cache.put("d2", "file2", True)
+        self.cache.get("d1")
+        self.cache.put("d3", "file3", True)
+
+        self.assertIsNone(self.cache.get("d2"))
+        self.assertTrue(self.cache.get("d1"))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_ttl_expiry(self):
+        self.cache.put("d1", "file1", True)
+        self.now = 61
+        self.assertIsNone(self.cache.get("d1"))
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_evict_files(self):
+        self.cache.put("d1", "file1", True)
+        self.cache.put("d2", "file2", True)
+        self.cache.evict_files(["file1"])
+
+        self.assertIsNone(self.cache.get("d1"))
+        self.assertTrue(self.cache.get("d2"))
+
+    def test_size_zero_disables(self):
+        cache = ProofCache(size=0)
+        cache.put("d1", "file1", True)
+        self.assertIsNone(cache.get("d1"))
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file